@@ -1,9 +1,82 @@
-from ultralytics import YOLO
-from PIL import Image
-import requests
+import io
+import json
 import random
+import threading
+
+# The Google Static Maps provider comes from the solar-panel-pipeline package (`pip install .` in the repo root)
+from pipeline.model_registry import file_checksum
+from pipeline.tile_providers import GoogleStaticMapsProvider
+
+from inference_server import MicroBatcher
+from result_cache import ResultCache, address_key, image_key
+
+# ultralytics (and with it torch), PIL and requests are imported on first use so importing this module stays cheap
+MODEL_PATH = 'detector.pt'
+# Confidence the batched model runs at; each request then keeps only the detections above its own threshold, so
+# no request may ask for less than this
+BATCH_CONF = 0.05
+# Confidence a detection needs to count in the app
+DEFAULT_CONF = 0.45
+_model = None
+_model_lock = threading.Lock()
+_batcher = None
+_result_cache = None
+_model_version = None
+
+
+def get_model():
+    """
+    Return the detector model, loading it on the first call.
+
+    Returns:
+    ultralytics.YOLO: The loaded model, shared by all callers in the process.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            from ultralytics import YOLO
+            _model = YOLO(MODEL_PATH)
+        return _model
+
+
+def get_batcher():
+    """
+    Return the process-wide micro-batcher that groups concurrent requests into one model call.
+
+    Returns:
+    inference_server.MicroBatcher: Shared by the Gradio handlers and the HTTP/JSON endpoint.
+    """
+    global _batcher
+    with _model_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(lambda images: get_model()(images, conf=BATCH_CONF), max_batch_size=8,
+                                    max_wait=0.01)
+        return _batcher
+
+
+def get_result_cache():
+    """
+    Return the process-wide cache of rendered results, configured by the RESULT_CACHE_* environment variables.
+
+    Returns:
+    result_cache.ResultCache: Shared by `solar_panel_predict` and `detector`.
+    """
+    global _result_cache
+    with _model_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache.from_env()
+        return _result_cache
 
-model = YOLO('detector.pt')
+
+def model_version():
+    """
+    Returns:
+    str: Short checksum of the weights, part of every cache key so new weights never serve old results.
+    """
+    global _model_version
+    if _model_version is None:
+        _model_version = file_checksum(MODEL_PATH)[:16]
+    return _model_version
 
 
 def satellite_image_params(address, api_key, zoom, size):
@@ -19,14 +92,7 @@ def satellite_image_params(address, api_key, zoom, size):
     Returns:
     dict: A dictionary of parameters for the API request.
     """
-    params = {
-        "center": address,
-        "zoom": str(zoom),
-        "size": size,
-        "maptype": "satellite",
-        "key": api_key
-    }
-    return params
+    return GoogleStaticMapsProvider(api_key, zoom=zoom, size=size).params(address)
 
 
 def fetch_satellite_image(address, api_key, zoom=18, size="640x640"):
@@ -42,20 +108,14 @@ def fetch_satellite_image(address, api_key, zoom=18, size="640x640"):
     Returns:
     str: File name of the saved satellite image or None if the request fails.
     """
-    base_url = "https://maps.googleapis.com/maps/api/staticmap?"
-    params = satellite_image_params(address, api_key, zoom=zoom, size=size)
-    try:
-        response = requests.get(base_url, params=params)
-    except requests.exceptions.RequestException as e:
-        print(e)
+    image_data = GoogleStaticMapsProvider(api_key, zoom=zoom, size=size).fetch_address(address)
+    if image_data is None:
         return None
-    if response.status_code == 200:
-        image_data = response.content
-        img_name = f"{'_'.join(address.split()[-2:])}.jpg"
-        with open(img_name, "wb") as file:
-            file.write(image_data)
-        print("Image was downloaded successfully")
-        return img_name
+    img_name = f"{'_'.join(address.split()[-2:])}.jpg"
+    with open(img_name, "wb") as file:
+        file.write(image_data)
+    print("Image was downloaded successfully")
+    return img_name
 
 
 def plot_results(im_array, save_image=False, img_path="results.jpg"):
@@ -70,13 +130,51 @@ def plot_results(im_array, save_image=False, img_path="results.jpg"):
      Returns:
      PIL.Image: The converted PIL image.
      """
+    from PIL import Image
+
     im = Image.fromarray(im_array[..., ::-1])  # RGB PIL image
     if save_image:
         im.save(img_path)  # save image
     return im
 
 
-def solar_panel_predict(image, conf=0.45):
+def _check_conf(conf):
+    if conf < BATCH_CONF:
+        raise ValueError(f"conf must be at least {BATCH_CONF}, the confidence the model runs at")
+
+
+def _detect(image, conf, render=True):
+    """
+    Run the model on `image` and, with `render`, draw its detections above `conf`.
+
+    Returns:
+    bytes: Whether anything was detected and the annotated image (empty without `render`), encoded for the result
+    cache.
+    """
+    result = get_batcher().predict(image)
+    keep = result.boxes.conf >= conf
+    image_bytes = b""
+    if render:
+        buf = io.BytesIO()
+        plot_results(result[keep].plot()).save(buf, format="JPEG", quality=95)
+        image_bytes = buf.getvalue()
+    header = json.dumps({"has_solar": bool(keep.any())}).encode()
+    return header + b"\n" + image_bytes
+
+
+def _decode(data):
+    """Inverse of `_detect`'s encoding: returns (PIL image or None, has_solar)."""
+    header, _, image = data.partition(b"\n")
+    im = None
+    if image:
+        from PIL import Image
+
+        im = Image.open(io.BytesIO(image))
+        im.load()
+    return im, json.loads(header)["has_solar"]
+
+
+def solar_panel_predict(image, conf=DEFAULT_CONF, render=True):
     """
     Analyzes an image to detect solar panels and returns an annotated image along with a relevant message.
 
@@ -86,11 +184,21 @@ def solar_panel_predict(image, conf=0.45):
 
     Parameters:
     image: The input image for solar panel detection.
-    conf: Confidence threshold for detection, default is 0.5.
+    conf: Confidence threshold for detection, at least BATCH_CONF; default is DEFAULT_CONF.
+    render: Whether to draw the annotated image; without it the image returned is None.
 
     Returns:
     Tuple of (annotated image, prediction message)
     """
+    _check_conf(conf)
+    # the same picture (e.g. an example image clicked again) is served from the result cache without the model
+    data = get_result_cache().get_or_compute(image_key(image, conf, render, model_version()),
+                                             lambda: _detect(image, conf, render))
+    im, has_solar = _decode(data)
+    return im, _sentence(has_solar)
+
+
+def _sentence(has_solar):
     negative_setences = [
         "No solar panels yet?\nYour roof is a blank canvas waiting for a green masterpiece! 🎨🌱",
         "It's lonely up here without solar panels.\nImagine the sun-powered parties you're missing! 🌞🎉",
@@ -104,34 +212,36 @@ def solar_panel_predict(image, conf=0.45):
         "You've got solar power!\nNow your roof is cooler than a polar bear in sunglasses. 🐻‍❄️🕶️",
         "Green alert: Your roof is now a climate hero's cape!\nSolar panels are saving the day, one ray at a time. 🦸‍♂️🌞",
         "Solar panels spotted: Your roof is now officially a member of the Renewable Energy Rockstars Club! ⭐🌱"]
+    return random.choice(positive_sentences if has_solar else negative_setences)
 
-    results = model(image, stream=True, conf=conf)
-    for result in results:
-        annotated_image = result.plot()
-        im = plot_results(annotated_image)
-
-        r = result.boxes
-        confi = r.conf.numpy().tolist()
-        if not confi:
-            prediction = random.choice(negative_setences)
-        else:
-            prediction = random.choice(positive_sentences)
-        return im, prediction
 
-
-def detector(address, api_key, zoom=18, size="640x640"):
+def detector(address, api_key, zoom=18, size="640x640", conf=DEFAULT_CONF, render=True):
     """
     Detects solar panels in a satellite image fetched based on the given address.
 
+    Results are cached by the normalized address, zoom and size, so a popular address costs neither a Google API
+    call nor a model run the second time.
+
     Parameters:
     address (str): The address to fetch the satellite image of.
     api_key (str): Google Maps API key.
     zoom (int): Zoom level for the image.
     size (str): Size of the image.
+    conf (float): Confidence threshold for detection, at least BATCH_CONF.
+    render (bool): Whether to draw the annotated image; without it the image returned is None.
 
     Returns:
     tuple: Prediction text and detected image.
     """
-    img_name = fetch_satellite_image(address, api_key, zoom=zoom, size=size)
-    im, prediction = solar_panel_predict(img_name)
-    return im, prediction
+    _check_conf(conf)
+
+    def fetch_and_detect():
+        img_name = fetch_satellite_image(address, api_key, zoom=zoom, size=size)
+        return _detect(img_name, conf, render) if img_name is not None else None
+
+    data = get_result_cache().get_or_compute(address_key(address, zoom, size, conf, render, model_version()),
+                                             fetch_and_detect)
+    if data is None:
+        raise ValueError(f"Could not fetch a satellite image for '{address}'")
+    im, has_solar = _decode(data)
+    return im, _sentence(has_solar)
@@ -1,6 +1,9 @@
 import gradio as gr
 import os
-from SolarPanelDetector import solar_panel_predict, detector
+import threading
+from SolarPanelDetector import BATCH_CONF, solar_panel_predict, detector, get_model, get_batcher, get_result_cache
+from inference_server import serve
+from result_cache import CACHE_LOG_INTERVAL_ENV
 
 # Custom CSS for styling the app
 custom_css = """
@@ -68,4 +71,20 @@ with gr.Blocks(theme="HaleyCH/HaleyCH_Theme", title="Solar Panel Detector", css=
     )
 
 if __name__ == "__main__":
+    # Load the model in the background so the UI comes up immediately and the first click rarely waits for it
+    threading.Thread(target=get_model, daemon=True).start()
+    # JSON endpoint for programmatic clients; it shares the batcher with the UI and skips rendering. It has no
+    # authentication, so it only starts when asked for and listens on localhost unless INFERENCE_HOST says otherwise
+    if os.environ.get("INFERENCE_API", "").lower() in ("1", "true", "yes"):
+        server = serve(get_batcher(), host=os.environ.get("INFERENCE_HOST", "127.0.0.1"),
+                       port=int(os.environ.get("INFERENCE_PORT", 8000)), min_conf=BATCH_CONF,
+                       extra_metrics={"result_cache": get_result_cache().stats})
+        host, port = server.server_address[:2]
+        print(f"Inference API listening on {host}:{port} (POST /predict, GET /metrics)")
+    # Report the result cache's hit rate and memory use so it can be sized, with or without the API
+    log_interval = float(os.environ.get(CACHE_LOG_INTERVAL_ENV, 300))
+    if log_interval > 0:
+        get_result_cache().log_stats(log_interval)
+    # let concurrent clicks reach the batcher instead of running one at a time
+    app.queue(default_concurrency_limit=16)
     app.launch()
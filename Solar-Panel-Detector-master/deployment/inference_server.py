@@ -0,0 +1,323 @@
+import asyncio
+import bisect
+import collections
+import io
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket catches everything slower
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class LatencyHistogram:
+    """
+    Thread-safe latency histogram with fixed buckets, plus the raw samples of a sliding window for percentiles.
+
+    Parameters:
+    window (int): Number of most recent samples kept for the percentile estimates.
+    """
+
+    def __init__(self, window=10000):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._recent = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+            self._recent.append(seconds)
+
+    def snapshot(self):
+        """
+        Returns:
+        dict: count, mean, p50/p95/p99 (seconds) and cumulative bucket counts keyed by their upper bound.
+        """
+        with self._lock:
+            recent = sorted(self._recent)
+            counts = list(self.counts)
+            total, total_sum = self.total, self.sum
+
+        def percentile(q):
+            return recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+
+        cumulative, buckets = 0, {}
+        for bound, count in zip(LATENCY_BUCKETS + ["+Inf"], counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": total,
+            "mean": total_sum / total if total else 0.0,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests into micro-batches and runs each batch with one model call.
+
+    A collector thread waits for a free worker, takes the first waiting request, then keeps gathering until
+    `max_batch_size` requests are in hand or `max_wait` seconds have passed, and hands the batch to a pool of
+    `workers` threads. If a batch's model call fails, its images are retried one at a time, so one unreadable input
+    fails only its own request. Because batches are only formed once a worker can take them, requests that arrive while the
+    model is busy pile up into the next batch instead of into a backlog of small ones. Callers get a
+    Future (or await `predict_async`), so under load many requests share one forward pass instead of queueing
+    behind each other, while a lone request waits at most `max_wait`.
+
+    Parameters:
+    predict_batch (callable): Takes a list of images and returns one result per image, in order.
+    max_batch_size (int): Largest number of images per model call.
+    max_wait (float): Longest time in seconds the first request of a batch waits for company.
+    workers (int): Number of batches that may run at the same time.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=8, max_wait=0.01, workers=1):
+        if max_batch_size < 1 or workers < 1:
+            raise ValueError("max_batch_size and workers must be >= 1")
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.latency = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+        self.inference = LatencyHistogram()
+        self.batch_sizes = {}
+        self._requests = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="infer")
+        self._free_workers = threading.Semaphore(workers)
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name="batch-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, image):
+        """
+        Queue one image for prediction.
+
+        Returns:
+        concurrent.futures.Future: Resolves to the model's result for `image`.
+        """
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._requests.put((image, future, time.perf_counter()))
+        return future
+
+    def predict(self, image, timeout=None):
+        """Blocking form of `submit`."""
+        return self.submit(image).result(timeout)
+
+    async def predict_async(self, image):
+        """Awaitable form of `submit`, for async handlers such as Gradio's."""
+        return await asyncio.wrap_future(self.submit(image))
+
+    def _collect(self):
+        while True:
+            self._free_workers.acquire()
+            first = self._requests.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    # past the deadline, still take requests that are already waiting
+                    item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._requests.put(None)  # let the outer loop see the shutdown after this batch
+                    break
+                batch.append(item)
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            self._run_batch(batch)
+        finally:
+            self._free_workers.release()
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        for _, _, queued in batch:
+            self.queue_wait.observe(started - queued)
+        self._infer(batch)
+
+    def _infer(self, batch):
+        """Run `batch` with one model call; if that fails, retry its images one by one so a bad input fails alone."""
+        started = time.perf_counter()
+        try:
+            results = list(self.predict_batch([image for image, _, _ in batch]))
+            if len(results) != len(batch):
+                raise RuntimeError(f"model returned {len(results)} results for {len(batch)} images")
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+            else:
+                for item in batch:
+                    self._infer([item])
+            return
+        finished = time.perf_counter()
+        self.inference.observe(finished - started)
+        with self._stats_lock:
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+        for (_, future, queued), result in zip(batch, results):
+            self.latency.observe(finished - queued)
+            future.set_result(result)
+
+    def metrics(self):
+        """
+        Returns:
+        dict: Histograms of end-to-end latency, queue wait and per-batch inference time, and a batch size count.
+        """
+        with self._stats_lock:
+            batch_sizes = {str(k): v for k, v in sorted(self.batch_sizes.items())}
+        return {
+            "latency": self.latency.snapshot(),
+            "queue_wait": self.queue_wait.snapshot(),
+            "inference": self.inference.snapshot(),
+            "batch_sizes": batch_sizes,
+        }
+
+    def close(self):
+        """Finish the requests already queued and stop the collector and workers."""
+        if not self._closed:
+            self._closed = True
+            self._requests.put(None)
+            self._collector.join()
+            self._pool.shutdown(wait=True)
+
+
+def detections_json(result, min_conf=0.0):
+    """
+    Convert an ultralytics result to plain JSON-serializable detections, without rendering anything.
+
+    Parameters:
+    result: An ultralytics `Results` object (or anything with `boxes.xyxy`, `boxes.conf` and `boxes.cls`).
+    min_conf (float): Detections below this confidence are dropped.
+
+    Returns:
+    dict: `has_solar`, `confidence` (the best score) and a list of `detections` with bbox, confidence and class.
+    """
+
+    import numpy as np
+
+    def as_array(values):
+        if hasattr(values, "cpu"):
+            values = values.cpu().numpy()
+        return np.asarray(values, dtype=np.float32)
+
+    # threshold the arrays and convert them to lists once, rather than going box by box
+    boxes = result.boxes
+    conf = as_array(boxes.conf).reshape(-1)
+    keep = conf >= min_conf
+    bbox = as_array(boxes.xyxy).reshape(-1, 4)[keep].tolist()
+    classes = as_array(boxes.cls).reshape(-1)[keep].astype(np.int64).tolist()
+    confs = conf[keep].tolist()
+    return {
+        "has_solar": bool(confs),
+        "confidence": max(confs, default=0.0),
+        "detections": [{"bbox": box, "confidence": c, "class": cls} for box, c, cls in zip(bbox, confs, classes)],
+    }
+
+
+def _decode_request_image(body, content_type):
+    """Return a PIL image from a raw image body or a JSON body holding a base64 `image` field."""
+    import base64
+    from PIL import Image
+
+    options = {}
+    if content_type.startswith("application/json"):
+        options = json.loads(body)
+        body = base64.b64decode(options.pop("image"))
+    image = Image.open(io.BytesIO(body))
+    image.load()
+    return image.convert("RGB"), options
+
+
+def make_handler(batcher, default_conf=0.45, extra_metrics=None, min_conf=0.0):
+    """
+    Build an HTTP handler class serving `batcher`.
+
+    `min_conf` is the confidence the batcher's model runs at; a request asking for less is rejected with 400, since
+    the detections between the two were never produced.
+
+    `extra_metrics` maps names to callables whose results are added to the /metrics reply (e.g. cache stats).
+
+    Endpoints:
+    POST /predict: body is the encoded image (any content type) or JSON `{"image": <base64>, "conf": <float>}`;
+        replies with the detections as JSON. No annotated image is rendered.
+    GET /metrics: latency histograms and batch sizes as JSON.
+    GET /health: `{"status": "ok"}`.
+    """
+
+    class InferenceHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                metrics = batcher.metrics()
+                for name, get in (extra_metrics or {}).items():
+                    metrics[name] = get()
+                self._reply(200, metrics)
+            elif self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._reply(404, {"error": f"unknown path {self.path}"})
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                image, options = _decode_request_image(body, self.headers.get("Content-Type", ""))
+                conf = float(options.get("conf", default_conf))
+            except Exception as e:
+                self._reply(400, {"error": f"could not read request: {e}"})
+                return
+            if conf < min_conf:
+                self._reply(400, {"error": f"conf must be at least {min_conf}"})
+                return
+            try:
+                result = batcher.predict(image)
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, detections_json(result, conf))
+
+        def log_message(self, format, *args):
+            pass  # one line per request would drown the console under load
+
+    return InferenceHandler
+
+
+def serve(batcher, host="127.0.0.1", port=8000, default_conf=0.45, extra_metrics=None, min_conf=0.0):
+    """
+    Start the HTTP/JSON endpoint for `batcher` in a background thread.
+
+    The endpoint has no authentication, so it only listens on localhost unless `host` says otherwise.
+
+    Returns:
+    ThreadingHTTPServer: The running server; call `shutdown()` to stop it. `server_address` holds the bound port.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, default_conf, extra_metrics, min_conf))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="inference-http", daemon=True).start()
+    return server
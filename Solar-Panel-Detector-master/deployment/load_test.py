@@ -0,0 +1,107 @@
+"""Load test for the batching inference endpoint.
+
+By default it starts the HTTP/JSON endpoint in-process on a mock model whose cost is a fixed per-call overhead plus a
+smaller per-image cost (the shape of GPU inference), once without batching and once with micro-batching, and fires
+concurrent clients at each. Pass --url to load-test an already running server (e.g. the one `app.py` starts) instead.
+
+    python load_test.py --clients 16 --requests 400
+    python load_test.py --url http://localhost:8000 --clients 16
+"""
+import argparse
+import io
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from inference_server import MicroBatcher, serve
+
+
+class MockBoxes:
+    def __init__(self):
+        self.xyxy = [[10.0, 10.0, 50.0, 40.0]]
+        self.conf = [0.9]
+        self.cls = [0]
+
+
+class MockResult:
+    def __init__(self):
+        self.boxes = MockBoxes()
+
+
+class MockModel:
+    """Sleeps `call_overhead + per_image * len(images)` seconds per call and returns one detection per image."""
+
+    def __init__(self, call_overhead=0.02, per_image=0.002):
+        self.call_overhead = call_overhead
+        self.per_image = per_image
+
+    def __call__(self, images, **kwargs):
+        time.sleep(self.call_overhead + self.per_image * len(images))
+        return [MockResult() for _ in images]
+
+
+def sample_image_bytes(size=(640, 640)):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", size, (90, 110, 70)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def run_load(url, body, clients, requests):
+    """Send `requests` POST /predict calls from `clients` threads; return wall time and sorted client latencies."""
+
+    def one(_):
+        start = time.perf_counter()
+        request = urllib.request.Request(f"{url}/predict", data=body, headers={"Content-Type": "image/jpeg"})
+        with urllib.request.urlopen(request) as response:
+            json.loads(response.read())
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = sorted(pool.map(one, range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label, wall, latencies, metrics=None):
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    print(f"{label:<12} {len(latencies) / wall:8.1f} req/s  p50 {pct(0.5):7.1f} ms  p95 {pct(0.95):7.1f} ms  "
+          f"p99 {pct(0.99):7.1f} ms")
+    if metrics:
+        print(f"{'':<12} batch sizes {metrics['batch_sizes']}, server p99 {metrics['latency']['p99'] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the batching inference endpoint.")
+    parser.add_argument("--url", default=None, help="Target a running server instead of the built-in mock")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients (default: 16)")
+    parser.add_argument("--requests", type=int, default=400, help="Total requests per run (default: 400)")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Mock server batch size (default: 8)")
+    parser.add_argument("--max-wait", type=float, default=0.01, help="Mock server batch wait in seconds")
+    args = parser.parse_args()
+
+    body = sample_image_bytes()
+    if args.url:
+        wall, latencies = run_load(args.url.rstrip("/"), body, args.clients, args.requests)
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/metrics") as response:
+            report("server", wall, latencies, json.loads(response.read()))
+        return
+
+    for label, batch_size in [("unbatched", 1), ("batched", args.max_batch_size)]:
+        batcher = MicroBatcher(MockModel(), max_batch_size=batch_size, max_wait=args.max_wait)
+        server = serve(batcher, host="127.0.0.1", port=0)
+        try:
+            wall, latencies = run_load(f"http://127.0.0.1:{server.server_address[1]}", body, args.clients,
+                                       args.requests)
+            report(label, wall, latencies, batcher.metrics())
+        finally:
+            server.shutdown()
+            batcher.close()
+
+
+if __name__ == "__main__":
+    main()
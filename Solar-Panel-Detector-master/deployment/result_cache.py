@@ -0,0 +1,242 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# The on-disk tile cache comes from the solar-panel-pipeline package (`pip install .` in the repo root)
+from pipeline.tile_cache import TileCache, _normalize_size, parse_coordinates
+
+# Environment variables configuring the app's result cache
+CACHE_ENTRIES_ENV = "RESULT_CACHE_ENTRIES"
+CACHE_MAX_MB_ENV = "RESULT_CACHE_MAX_MB"
+CACHE_TTL_ENV = "RESULT_CACHE_TTL"
+CACHE_DIR_ENV = "RESULT_CACHE_DIR"
+CACHE_DISK_MB_ENV = "RESULT_CACHE_DISK_MB"
+CACHE_LOG_INTERVAL_ENV = "RESULT_CACHE_LOG_INTERVAL"
+
+_EXPIRY = struct.Struct("<d")
+
+
+def image_key(image, *parts):
+    """
+    Cache key for an image, from a hash of its decoded pixels, so the same picture hits whether it arrives as a
+    file path, a PIL image or a NumPy array.
+
+    Parameters:
+    image: File path, PIL image or HxWx3 array.
+    parts: Anything else the result depends on (confidence threshold, model version).
+
+    Returns:
+    str: A hex key.
+    """
+    from PIL import Image
+
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as im:
+            image = im.convert("RGB")
+    if isinstance(image, Image.Image):
+        image = image.convert("RGB")
+        h.update(f"{(image.height, image.width, 3)}".encode())  # the shape of the same pixels as an array
+        h.update(image.tobytes())
+    else:
+        h.update(f"{image.shape}".encode())
+        h.update(image.tobytes())
+    return _key("image", h.hexdigest(), *parts)
+
+
+def address_key(address, zoom, size, *parts):
+    """
+    Cache key for an address: case and whitespace are normalized and "lat,lon" strings are rounded to 5 decimal
+    places (about 1 m), so equivalent spellings share an entry.
+
+    Returns:
+    str: A hex key.
+    """
+    coords = parse_coordinates(address)
+    if coords is not None:
+        location = f"{round(coords[0], 5) + 0.0:.5f},{round(coords[1], 5) + 0.0:.5f}"
+    else:
+        location = " ".join(str(address).lower().split())
+    return _key("address", location, int(zoom), _normalize_size(size), *parts)
+
+
+def _key(*parts):
+    return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded in-process LRU cache of rendered results with a time-to-live, optionally backed by an on-disk store.
+
+    Values are bytes, so memory use is measured exactly. Entries are evicted least recently used first once there are
+    more than `max_entries` or they take more than `max_bytes`, and are dropped when older than `ttl` seconds.
+    With `directory`, every entry is also written to a `pipeline.tile_cache.TileCache` there (atomic writes, LRU
+    eviction at `disk_max_bytes`), so several app workers share their results and a restarted worker starts warm.
+    `get_or_compute` runs `compute` once per key even when many requests for it arrive together; the others wait
+    for its result. `log_stats` prints the cache's stats periodically.
+
+    Parameters:
+    max_entries (int): Most entries kept in memory.
+    max_bytes (int): Most bytes of values kept in memory.
+    ttl (float): Seconds an entry stays valid; None or 0 keeps entries until evicted.
+    directory (str): Optional directory of the shared on-disk store.
+    disk_max_bytes (int): Size budget of the on-disk store.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=128 * 1024 ** 2, ttl=24 * 3600, directory=None,
+                 disk_max_bytes=1024 ** 3):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = TileCache(directory, max_bytes=disk_max_bytes) if directory else None
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+        self._counts = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured by the RESULT_CACHE_* environment variables."""
+        return cls(max_entries=int(os.environ.get(CACHE_ENTRIES_ENV, 256)),
+                   max_bytes=int(float(os.environ.get(CACHE_MAX_MB_ENV, 128)) * 1024 ** 2),
+                   ttl=float(os.environ.get(CACHE_TTL_ENV, 24 * 3600)),
+                   directory=os.environ.get(CACHE_DIR_ENV) or None,
+                   disk_max_bytes=int(float(os.environ.get(CACHE_DISK_MB_ENV, 1024)) * 1024 ** 2))
+
+    def get(self, key):
+        """
+        Returns:
+        bytes: The value stored under `key`, or None if there is none or it expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if not expires or expires > now:
+                    self._entries.move_to_end(key)
+                    self._counts["hits"] += 1
+                    return value
+                self._drop(key)
+                self._counts["expired"] += 1
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                (expires,) = _EXPIRY.unpack_from(data)
+                if not expires or expires > now:
+                    value = data[_EXPIRY.size:]
+                    with self._lock:
+                        self._counts["disk_hits"] += 1
+                        self._insert(key, value, expires)
+                    return value
+        with self._lock:
+            self._counts["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        """Store the bytes `value` under `key` in memory and, if configured, on disk."""
+        expires = time.time() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._insert(key, value, expires)
+        if self.disk is not None:
+            self.disk.put(key, _EXPIRY.pack(expires) + value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the value for `key`, calling `compute()` to produce it on a miss. A None result is not cached.
+
+        Concurrent callers asking for the same key share one in-flight lookup: the first one looks the key up and
+        computes it on a miss, the others wait for its result (and count as hits).
+        """
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+            else:
+                self._counts["hits"] += 1
+        if not owner:
+            return future.result()
+        try:
+            # Looked up only once the key is claimed: a value an earlier owner just computed was stored before its
+            # claim was released, so it is found here instead of being computed again
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                if value is not None:
+                    self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def _insert(self, key, value, expires):
+        if key in self._entries:
+            self._drop(key)
+        if self.max_entries <= 0 or len(value) > self.max_bytes:
+            return
+        self._entries[key] = (expires, value)
+        self._bytes += len(value)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self._counts["evictions"] += 1
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+        dict: hits (memory and disk), misses, hit_rate, evictions, expired entries, and the entries and bytes held
+        in memory against their limits, plus the on-disk store's stats when one is configured.
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            stats.update(entries=len(self._entries), max_entries=self.max_entries, bytes=self._bytes,
+                         max_bytes=self.max_bytes)
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+    def log_stats(self, interval, stop=None):
+        """
+        Print `stats()` every `interval` seconds from a daemon thread.
+
+        Parameters:
+        interval (float): Seconds between reports.
+        stop (threading.Event): Optional event that ends the reports once set.
+
+        Returns:
+        threading.Thread: The started reporting thread.
+        """
+        stop = stop or threading.Event()
+
+        def report():
+            while not stop.wait(interval):
+                stats = self.stats()
+                print(f"Result cache: hit rate {stats['hit_rate']:.1%} ({stats['hits']} memory, "
+                      f"{stats['disk_hits']} disk, {stats['misses']} misses), {stats['entries']}/"
+                      f"{stats['max_entries']} entries, {stats['bytes'] / 1024 ** 2:.1f}/"
+                      f"{stats['max_bytes'] / 1024 ** 2:.0f} MB, {stats['evictions']} evictions, "
+                      f"{stats['expired']} expired")
+
+        thread = threading.Thread(target=report, daemon=True)
+        thread.start()
+        return thread
@@ -1,5 +1,3 @@
-from ultralytics import YOLO
-from PIL import Image
 import argparse
 import random
 def get_args():
@@ -10,9 +8,23 @@ def get_args():
     return args
 
 
-# Load the model
+# The model (and ultralytics/torch with it) is loaded on first use, so `--help` and imports stay fast
 model_path = '../models/final-mosaic-augmentation.pt'
-model = YOLO(model_path)
+_model = None
+
+
+def get_model():
+    """
+    Load the model on the first call and return the same instance afterwards.
+
+    Returns:
+    ultralytics.YOLO: The loaded model.
+    """
+    global _model
+    if _model is None:
+        from ultralytics import YOLO
+        _model = YOLO(model_path)
+    return _model
 
 def plot_results(im_array, save_image=False, img_path="results.jpg"):
     """
@@ -26,6 +38,8 @@ def plot_results(im_array, save_image=False, img_path="results.jpg"):
     Returns:
     PIL.Image.Image: The converted PIL image.
     """
+    from PIL import Image
+
     im = Image.fromarray(im_array[..., ::-1])  # RGB PIL image
     if save_image:
         im.save(img_path)  # save image
@@ -61,7 +75,7 @@ def solar_panel_predict(image, conf=0.45):
         "Green alert: Your roof is now a climate hero's cape!\nSolar panels are saving the day, one ray at a time. 🦸‍♂️🌞",
         "Solar panels spotted: Your roof is now officially a member of the Renewable Energy Rockstars Club! ⭐🌱"]
 
-    results = model(image, stream=True, conf=conf)
+    results = get_model()(image, stream=True, conf=conf)
     for result in results:
         annotated_image = result.plot()
         im = plot_results(annotated_image)
@@ -88,6 +102,8 @@ def image_predction(image_path, conf=0.5):
     The function currently has a hardcoded image path, which should be replaced with the 'image_path' argument
     for dynamic functionality.
     """
+    from PIL import Image
+
     image = Image.open(image_path)
     prediction, im = solar_panel_predict(image, conf=conf)
     im.show()
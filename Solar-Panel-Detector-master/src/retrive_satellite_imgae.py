@@ -1,29 +1,25 @@
-import requests
+# The Google Static Maps provider and the on-disk tile cache come from the solar-panel-pipeline package
+# (`pip install .` in the repo root)
+from pipeline.tile_cache import get_default_cache
+from pipeline.tile_providers import GoogleStaticMapsProvider
 
 
 def satellite_image_params(address, api_key, zoom, size):
-    params = {
-        "center": address,
-        "zoom": str(zoom),
-        "size": size,
-        "maptype": "satellite",
-        "key": api_key
-    }
-    return params
+    return GoogleStaticMapsProvider(api_key, zoom=zoom, size=size).params(address)
+
+
+def _save_image(address, image_data):
+    img_name = f"{'_'.join(address.split()[-2:])}.jpg"
+    with open(img_name, "wb") as file:
+        file.write(image_data)
+    return img_name
 
 
 def fetch_satellite_image(address, api_key, zoom=18, size="640x640"):
-    base_url = "https://maps.googleapis.com/maps/api/staticmap?"
-    params = satellite_image_params(address, api_key, zoom=zoom, size=size)
-    try:
-        response = requests.get(base_url, params=params)
-    except requests.exceptions.RequestException as e:
-        print(e)
+    provider = GoogleStaticMapsProvider(api_key, zoom=zoom, size=size)
+    image_data = provider.fetch_address(address, cache=get_default_cache())
+    if image_data is None:
         return None
-    if response.status_code == 200:
-        image_data = response.content
-        img_name = f"{'_'.join(address.split()[-2:])}.jpg"
-        with open(img_name, "wb") as file:
-            file.write(image_data)
-        print("Image was downloaded successfully")
-        return img_name
+    img_name = _save_image(address, image_data)
+    print("Image was retrieved successfully")
+    return img_name
@@ -0,0 +1,144 @@
+"""Compare CPU inference throughput of the model backends (PyTorch, ONNX Runtime, ONNX Runtime int8).
+
+Every backend runs the same synthetic scenes through `detector.run_batch_inference`, so the numbers include the
+preprocessing and post-processing the pipeline pays for. Detections are checked against the first backend that ran:
+the benchmark reports how many of its boxes each other backend reproduces (IoU >= 0.5, same class).
+
+Usage:
+    python benchmarks/bench_backends.py --weights model/best.pt --images 64 --batch-size 8
+    python benchmarks/bench_backends.py --synthetic --images 64
+
+`--synthetic` benchmarks only the ONNX backends on a small random YOLO-shaped network instead of real weights, for
+machines without ultralytics/PyTorch; its absolute numbers say nothing about the real model.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import numpy as np  # noqa: E402
+
+from generate_sample_image import make_sample_image  # noqa: E402
+
+
+def synthetic_yolo_onnx(path, classes=1, size=640, seed=0):
+    """Write a small random network with YOLOv8's input/output layout: (N, 3, size, size) -> (N, 4 + classes, A).
+
+    Box centres come out in [0, size) and sides in [0, 64) pixels; class scores are sigmoids. The batch axis is
+    dynamic, like the pipeline's own export.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(seed)
+    channels = 4 + classes
+    w1 = (rng.standard_normal((16, 3, 8, 8)) * 0.1).astype(np.float32)
+    w2 = (rng.standard_normal((channels, 16, 4, 4)) * 0.1).astype(np.float32)
+    scale = np.array([size, size, 64, 64] + [1] * classes, dtype=np.float32).reshape(1, channels, 1)
+    initializers = [
+        numpy_helper.from_array(w1, "w1"),
+        numpy_helper.from_array(w2, "w2"),
+        numpy_helper.from_array(np.array([0, channels, -1], dtype=np.int64), "shape"),
+        numpy_helper.from_array(scale, "scale"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["images", "w1"], ["c1"], kernel_shape=[8, 8], strides=[8, 8]),
+        helper.make_node("Relu", ["c1"], ["r1"]),
+        helper.make_node("Conv", ["r1", "w2"], ["c2"], kernel_shape=[4, 4], strides=[4, 4]),
+        helper.make_node("Reshape", ["c2", "shape"], ["flat"]),
+        helper.make_node("Sigmoid", ["flat"], ["sig"]),
+        helper.make_node("Mul", ["sig", "scale"], ["output0"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "synthetic_yolo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, size, size])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", channels, "anchors"])],
+        initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)], ir_version=8)
+    onnx.save(model, path)
+    return path
+
+
+def matched_fraction(reference, other, iou_threshold=0.5):
+    """Fraction of `reference`'s boxes that `other` also found (same class, IoU >= `iou_threshold`)."""
+    from pipeline.tiling import box_iou
+
+    found = total = 0
+    for ref, oth in zip(reference, other):
+        a, b = ref[0].boxes, oth[0].boxes
+        total += len(a)
+        if len(a) and len(b):
+            iou = box_iou(a.xyxy, b.xyxy) * (a.cls[:, None] == b.cls[None, :])
+            found += int((iou.max(axis=1) >= iou_threshold).sum())
+    return found / total if total else 1.0
+
+
+def run(weights=None, images=64, batch_size=8, repeat=3, synthetic=False):
+    from pipeline import detector
+    from pipeline.onnx_backend import OnnxDetector, quantize_int8
+
+    scenes = [np.asarray(make_sample_image(seed=seed))[..., ::-1].copy() for seed in range(images)]
+    with tempfile.TemporaryDirectory() as tmp:
+        if synthetic:
+            fp32 = synthetic_yolo_onnx(os.path.join(tmp, "synthetic.onnx"))
+            int8 = quantize_int8(fp32, os.path.join(tmp, "synthetic.int8.onnx"))
+            models = {"onnx": lambda: OnnxDetector(fp32), "onnx-int8": lambda: OnnxDetector(int8)}
+        else:
+            models = {backend: (lambda backend=backend: detector.load_model(weights, backend=backend))
+                      for backend in detector.BACKENDS}
+
+        results, reference = {}, None
+        for backend, load in models.items():
+            try:
+                model = load()
+            except Exception as e:  # e.g. ultralytics not installed for the torch backend
+                print(f"Skipping {backend}: {e}")
+                continue
+            best, outputs = None, None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                outputs = detector.run_batch_inference(model, scenes, batch_size=batch_size)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            if reference is None:
+                reference = outputs
+            path = getattr(model, "path", None) or weights
+            results[backend] = {
+                "seconds": best,
+                "images_per_second": images / best,
+                "model_mb": os.path.getsize(path) / 1e6 if path and os.path.exists(path) else None,
+                "boxes": sum(len(o[0].boxes) for o in outputs),
+                "matched": matched_fraction(reference, outputs),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", default="model/best.pt", help="PyTorch weights (default: model/best.pt)")
+    parser.add_argument("--images", type=int, default=64, help="Synthetic scenes to infer (default: 64)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per predict call (default: 8)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend; the best is kept (default: 3)")
+    parser.add_argument("--synthetic", action="store_true", help="Benchmark a random YOLO-shaped ONNX network")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args.weights, args.images, args.batch_size, args.repeat, args.synthetic)
+    print(f"{'backend':<12}{'images/s':>10}{'model MB':>10}{'boxes':>8}{'matched':>9}")
+    for backend, r in results.items():
+        size = f"{r['model_mb']:.1f}" if r["model_mb"] is not None else "-"
+        print(f"{backend:<12}{r['images_per_second']:>10.1f}{size:>10}{r['boxes']:>8}{r['matched']:>9.1%}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Report images/sec of `run_batch_inference` for several batch sizes against a mock model.
+
+The mock charges a fixed cost per `predict` call (preprocessing setup, dispatch) plus a smaller
+cost per image, which is roughly how a CPU-bound YOLO forward pass behaves.
+
+Usage:
+    python benchmarks/bench_batch_inference.py --images 256 --call-overhead-ms 20 --per-image-ms 2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pipeline.detector import run_batch_inference  # noqa: E402
+
+
+class MockBoxes:
+    def __init__(self):
+        self.xyxy = [[0, 0, 10, 10]]
+        self.conf = [0.5]
+        self.cls = [0]
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class MockResult:
+    def __init__(self):
+        self.boxes = MockBoxes()
+
+
+class MockModel:
+    def __init__(self, call_overhead_s, per_image_s):
+        self.call_overhead_s = call_overhead_s
+        self.per_image_s = per_image_s
+
+    def predict(self, source):
+        images = source if isinstance(source, list) else [source]
+        time.sleep(self.call_overhead_s + self.per_image_s * len(images))
+        return [MockResult() for _ in images]
+
+
+def bench(model, images, batch_size):
+    start = time.perf_counter()
+    results = run_batch_inference(model, images, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    assert len(results) == len(images)
+    return len(images) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--call-overhead-ms", type=float, default=20.0)
+    parser.add_argument("--per-image-ms", type=float, default=2.0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    model = MockModel(args.call_overhead_ms / 1000, args.per_image_ms / 1000)
+    images = [f"artifacts/{i}_image.jpg" for i in range(args.images)]
+    for batch_size in args.batch_sizes:
+        print(f"batch_size={batch_size:>3}  {bench(model, images, batch_size):8.1f} images/sec")
+
+
+if __name__ == "__main__":
+    main()
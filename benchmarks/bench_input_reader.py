@@ -0,0 +1,82 @@
+"""Measure rows/sec and peak RSS of the streaming input reader on a synthetic coordinate CSV.
+
+Each reader runs in a fresh subprocess so its peak RSS is not polluted by the CSV generator or the other reader.
+`--compare-pandas` also runs the previous `pd.read_csv` + `iterrows` approach as a baseline (slow at 5M rows).
+
+Usage:
+    python benchmarks/bench_input_reader.py --rows 5000000 [--compare-pandas]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+
+def write_synthetic_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("sample_id,latitude,longitude\n")
+        for i in range(rows):
+            f.write(f"{i},{rng.uniform(8, 37):.6f},{rng.uniform(68, 97):.6f}\n")
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_reader(mode, path):
+    start = time.perf_counter()
+    count = 0
+    if mode == "stream":
+        from pipeline.input_reader import iter_records
+
+        for _ in iter_records(path):
+            count += 1
+    else:
+        import pandas as pd
+
+        df = pd.read_csv(path)
+        for _, row in df.iterrows():
+            row.get("sample_id"), row.get("latitude"), row.get("longitude")
+            count += 1
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"mode": mode, "rows": count, "seconds": elapsed, "peak_rss_mb": _peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--compare-pandas", action="store_true")
+    parser.add_argument("--_reader", choices=["stream", "pandas"], help=argparse.SUPPRESS)
+    parser.add_argument("--_path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._reader:
+        _run_reader(args._reader, args._path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "coords.csv")
+        print(f"Writing {args.rows:,} synthetic rows...")
+        write_synthetic_csv(path, args.rows)
+        modes = ["stream", "pandas"] if args.compare_pandas else ["stream"]
+        for mode in modes:
+            out = subprocess.run([sys.executable, __file__, "--_reader", mode, "--_path", path],
+                                 check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:>7}: {result['rows'] / result['seconds']:>12,.0f} rows/sec  "
+                  f"peak RSS {result['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
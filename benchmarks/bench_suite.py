@@ -0,0 +1,387 @@
+"""Benchmark suite: time each pipeline subsystem on synthetic inputs and compare runs against a baseline.
+
+Inputs are generated with the helpers in scripts/ (patchwork scenes with dark panel rectangles, CSV converted to
+XLSX). Fetching runs against a local HTTP stub serving those images and against an MBTiles file holding them, and
+inference uses a deterministic mock detector, so results depend only on this repo's code and the machine and no
+network is needed.
+
+Usage:
+    python benchmarks/bench_suite.py run --images 200 --rows 20000 --output benchmarks/results.json
+    python benchmarks/bench_suite.py compare benchmarks/baseline.json benchmarks/results.json --threshold 0.15
+
+Record a baseline once with `run --output benchmarks/baseline.json` on the reference machine; `compare` exits with
+status 1 if any benchmark got slower than the baseline by more than the threshold.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import numpy as np  # noqa: E402
+
+from generate_input_xlsx import csv_to_xlsx  # noqa: E402
+from generate_sample_image import PANEL_COLOR, make_sample_image  # noqa: E402
+
+
+class MockBoxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.cls = np.zeros(len(self.conf), dtype=np.float32)
+
+
+class MockResult:
+    def __init__(self, boxes, orig_shape):
+        self.boxes = boxes
+        self.orig_shape = orig_shape
+
+
+class MockDetector:
+    """Deterministic stand-in for the YOLO model: "detects" the panel-coloured cells of a 32 px grid.
+
+    It does real per-pixel work (a colour match over the whole image), so its cost scales with image size like a
+    model's preprocessing would, and the same image always gives the same boxes.
+    """
+
+    cell = 32
+
+    def predict(self, source):
+        images = source if isinstance(source, list) else [source]
+        return [self._detect(image) for image in images]
+
+    def _detect(self, image):
+        h, w = image.shape[:2]
+        # images arrive as BGR arrays; allow for JPEG noise around the panel colour
+        panel = (np.abs(image.astype(np.int16) - np.array(PANEL_COLOR[::-1])) < 20).all(axis=2)
+        c = self.cell
+        grid = panel[:h - h % c, :w - w % c].reshape(h // c, c, w // c, c).mean(axis=(1, 3))
+        ys, xs = np.nonzero(grid > 0.1)
+        xyxy = np.stack([xs * c, ys * c, xs * c + c, ys * c + c], axis=1)
+        return MockResult(MockBoxes(xyxy, grid[ys, xs]), (h, w))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024  # one send per response; avoids Nagle/delayed-ACK stalls on kept-alive sockets
+    images = []
+
+    def do_GET(self):
+        # /{lat}/{lon}.jpg with lat = index of the image to serve
+        index = int(float(self.path.split("/")[1])) % len(self.images)
+        body = self.images[index]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_inputs(tmp, images, rows):
+    """Write `rows` samples to CSV and XLSX and encode `images` distinct scenes; returns (csv, xlsx, jpeg bytes)."""
+    csv_path = os.path.join(tmp, "input.csv")
+    with open(csv_path, "w") as f:
+        f.write("sample_id,latitude,longitude\n")
+        for i in range(rows):
+            # latitude doubles as the index of the stub image to serve
+            f.write(f"{i},{i % images}.0,{(i * 0.37) % 90:.6f}\n")
+    xlsx_path = os.path.join(tmp, "input.xlsx")
+    csv_to_xlsx(csv_path, xlsx_path)
+
+    encoded = []
+    for seed in range(images):
+        buf = io.BytesIO()
+        make_sample_image(seed=seed).save(buf, format="JPEG")
+        encoded.append(buf.getvalue())
+    return csv_path, xlsx_path, encoded
+
+
+def stage_tiles(path, encoded, zoom=18, x0=131000, y0=90000):
+    """Cut each encoded image into 2x2 256 px tiles, lay the blocks side by side in an MBTiles file at `zoom` and
+    return the (lat, lon) at the centre of every block."""
+    from PIL import Image
+
+    from pipeline.tile_planner import pixel_to_lat_lon
+    from pipeline.tile_providers import write_mbtiles
+
+    tiles, points = {}, []
+    for i, data in enumerate(encoded):
+        image = Image.open(io.BytesIO(data)).convert("RGB")
+        x = x0 + 2 * i
+        for dx in range(2):
+            for dy in range(2):
+                buf = io.BytesIO()
+                image.crop((dx * 256, dy * 256, dx * 256 + 256, dy * 256 + 256)).save(buf, format="JPEG")
+                tiles[(zoom, x + dx, y0 + dy)] = buf.getvalue()
+        lat, lon = pixel_to_lat_lon((x + 1) * 256, (y0 + 1) * 256, zoom)
+        points.append((float(lat), float(lon)))
+    write_mbtiles(path, tiles)
+    return points
+
+
+def _per_object_records(results):
+    """Records built the way the pipeline used to: every box, score and class converted to a Python value one at a
+    time, and the area estimated one sample at a time."""
+    from pipeline import area
+    from pipeline.output_builder import make_record
+
+    records = []
+    for i, result in enumerate(results):
+        boxes = result.boxes
+        confs = [float(c) for c in boxes.conf.tolist()]
+        bbox = [[float(v) for v in box] for box in boxes.xyxy.tolist()]
+        classes = [int(c) for c in boxes.cls.tolist()]
+        area_sqm = area.estimate_result_areas([result], i % 90, 18)[0] if confs else 0.0
+        records.append(make_record(i, i % 90, 0.0, bbox, confs, classes, area_sqm))
+    return records
+
+
+def timed(fn, repeat):
+    """Best wall time of `repeat` calls of `fn`, and its return value (the number of items processed)."""
+    best, items = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": best, "items": items, "items_per_second": items / best if best else 0.0}
+
+
+def run_suite(images=200, rows=20000, repeat=3, fetch_workers=8, batch_size=8):
+    """Run every benchmark and return the results document."""
+    from pipeline import detection_store
+    from pipeline import detector
+    from pipeline import image_fetcher
+    from pipeline import main as pipeline_main
+    from pipeline import postprocess
+    from pipeline.input_reader import iter_records
+    from pipeline.output_builder import build_record, make_record, make_sink
+
+    results = {}
+    saved_env = {k: os.environ.get(k) for k in ("SAT_API_PROVIDER", "SAT_API_URL_TEMPLATE", "SAT_CACHE_DIR")}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, xlsx_path, encoded = make_inputs(tmp, images, rows)
+        _StubHandler.images = encoded
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["SAT_API_PROVIDER"] = "url"
+        os.environ["SAT_API_URL_TEMPLATE"] = f"http://127.0.0.1:{server.server_port}/{{lat}}/{{lon}}.jpg"
+        os.environ.pop("SAT_CACHE_DIR", None)
+        try:
+            results["input.csv"] = timed(lambda: sum(1 for _ in iter_records(csv_path)), repeat)
+            results["input.xlsx"] = timed(lambda: sum(1 for _ in iter_records(xlsx_path)), repeat)
+
+            image_fetcher.get_session(pool_size=max(fetch_workers, 10))
+
+            def fetch_all():
+                with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+                    return sum(1 for data in pool.map(lambda i: image_fetcher.fetch_image_bytes(i, 0), range(images))
+                               if data)
+
+            results["fetch"] = timed(fetch_all, repeat)
+
+            from pipeline.tile_providers import MBTilesProvider
+            points = stage_tiles(os.path.join(tmp, "tiles.mbtiles"), encoded)
+            local = MBTilesProvider(os.path.join(tmp, "tiles.mbtiles"))
+
+            def fetch_local():
+                with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+                    return sum(1 for data in pool.map(lambda p: local.fetch(*p), points) if data)
+
+            results["fetch.local"] = timed(fetch_local, repeat)
+
+            from pipeline.mosaic import TileMosaic
+
+            def fetch_mosaic():
+                # a fresh mosaic per run, so tiles are read and decoded again rather than served from memory
+                mosaic = TileMosaic(local, workers=fetch_workers)
+                try:
+                    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+                        return sum(1 for image in pool.map(lambda p: mosaic.view(*p, size=640), points)
+                                   if image is not None)
+                finally:
+                    mosaic.close()
+
+            results["fetch.mosaic"] = timed(fetch_mosaic, repeat)
+            results["decode"] = timed(lambda: len([detector.decode_image(data) for data in encoded]), repeat)
+
+            decoded = [detector.decode_image(data) for data in encoded]
+            model = MockDetector()
+            results["inference"] = timed(
+                lambda: len(detector.run_batch_inference(model, decoded, batch_size=batch_size)), repeat)
+
+            inferred = detector.run_batch_inference(model, decoded, batch_size=batch_size)
+            # per-sample overhead of turning results into records: box by box (the old path) vs whole batches
+            per_sample = [inferred[i % images][0] for i in range(rows)]
+            results["postprocess.per_object"] = timed(lambda: len(_per_object_records(per_sample)), repeat)
+
+            def postprocess_batched():
+                count = 0
+                for start in range(0, rows, batch_size):
+                    batch = per_sample[start:start + batch_size]
+                    detections = postprocess.DetectionBatch.from_results(batch)
+                    areas = detections.areas([i % 90 for i in range(start, start + len(batch))], 18).tolist()
+                    for i, ((bbox, confs, classes), area_sqm) in enumerate(zip(detections.split(), areas), start):
+                        make_record(i, i % 90, 0.0, bbox, confs, classes, area_sqm)
+                        count += 1
+                return count
+            results["postprocess.batched"] = timed(postprocess_batched, repeat)
+
+            records = [build_record(i, i % 90, 0.0, inferred[i % images]) for i in range(rows)]
+            for kind in ("json", "jsonl", "parquet"):
+                def write(kind=kind):
+                    path = os.path.join(tmp, f"out-{kind}-{time.perf_counter_ns()}")
+                    with make_sink(kind, path if kind == "json" else f"{path}.{kind}") as sink:
+                        for record in records[:images] if kind == "json" else records:
+                            sink.write(record)
+                    return images if kind == "json" else rows
+                try:
+                    results[f"write.{kind}"] = timed(write, repeat)
+                except RuntimeError as e:  # pyarrow missing
+                    print(f"Skipping write.{kind}: {e}")
+
+            # a threshold change over `rows` stored samples: load the store, re-filter, build the columnar output
+            store = detection_store.DetectionStore(os.path.join(tmp, "store"), flush_every=rows)
+            for i in range(rows):
+                store.add(i, i % 90, 0.0, f"{i:032x}", "bench", inferred[i % images][0], decoded[i % images].shape,
+                          18, 256)
+            store.close()
+
+            def rescore():
+                table = store.load()
+                detection_store.to_arrow(table, detection_store.rescore(table, 0.5))
+                return len(table)
+            results["rescore"] = timed(rescore, repeat)
+
+            e2e_input = os.path.join(tmp, "e2e.csv")
+            with open(e2e_input, "w") as f:
+                f.write("sample_id,latitude,longitude\n")
+                f.writelines(f"{i},{i}.0,0.0\n" for i in range(images))
+            load_model = detector.load_model
+            detector.load_model = lambda path=None: model
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                def end_to_end():
+                    run_id = time.perf_counter_ns()
+                    summary = pipeline_main.main(e2e_input, batch_size=batch_size, fetch_workers=fetch_workers,
+                                                 output_format="jsonl", output_path=f"e2e-{run_id}.jsonl",
+                                                 checkpoint_path=f"ckpt-{run_id}.log")
+                    return summary["samples"]
+                results["end_to_end"] = timed(end_to_end, repeat)
+            finally:
+                os.chdir(cwd)
+                detector.load_model = load_model
+        finally:
+            server.shutdown()
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    return {"meta": _meta(images=images, rows=rows, repeat=repeat), "results": results}
+
+
+def _meta(**params):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+    }
+
+
+def compare(baseline, current, threshold=0.15):
+    """Compare two results documents; returns (rows, regressions) where rows are (name, base s, current s, change).
+
+    A benchmark regresses when its best time grew by more than `threshold` (0.15 = 15%) over the baseline.
+    """
+    rows, regressions = [], []
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None:
+            rows.append((name, base["seconds"], None, None))
+            continue
+        change = cur["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+        rows.append((name, base["seconds"], cur["seconds"], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_results(doc):
+    print(f"{'benchmark':<16}{'items':>8}{'best s':>10}{'items/s':>12}")
+    for name, r in doc["results"].items():
+        print(f"{name:<16}{r['items']:>8}{r['seconds']:>10.3f}{r['items_per_second']:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the suite and save the results as JSON")
+    run.add_argument("--images", type=int, default=200, help="Distinct synthetic images (default: 200)")
+    run.add_argument("--rows", type=int, default=20000, help="Rows in the synthetic CSV/XLSX (default: 20000)")
+    run.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best is kept (default: 3)")
+    run.add_argument("--output", default="benchmarks/results.json", help="Where to write the results")
+    cmp = commands.add_parser("compare", help="Flag regressions against a baseline results file")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.15,
+                     help="Allowed slow-down as a fraction of the baseline time (default: 0.15)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        doc = run_suite(images=args.images, rows=args.rows, repeat=args.repeat)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(doc, f, indent=2)
+        print_results(doc)
+        print(f"Results written to {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'benchmark':<16}{'baseline s':>12}{'current s':>12}{'change':>10}")
+    for name, base, cur, change in rows:
+        if cur is None:
+            print(f"{name:<16}{base:>12.3f}{'missing':>12}")
+            continue
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<16}{base:>12.3f}{cur:>12.3f}{change:>+10.1%}{flag}")
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Compare latency, peak memory and small-panel recall of tiled vs whole-image inference on a large scene.
+
+The mock model behaves like YOLO preprocessing: it converts its input to a normalized float32 tensor at native
+resolution, letterboxes it to `--imgsz`, and only "sees" panels that are still at least `--min-px` pixels wide after
+that resize. Its cost grows with the input's pixel count. Peak memory is measured with tracemalloc.
+
+Usage:
+    python benchmarks/bench_tiled_inference.py --width 5400 --height 2700 --panels 200
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pipeline import detector  # noqa: E402
+from pipeline.tiling import Boxes, Result, tile_windows  # noqa: E402
+
+
+def _stamp_offsets(image, windows):
+    """Write each window's origin into its first two pixels so the mock can tell which part of the scene it got."""
+    for x0, y0, _, _ in windows:
+        image[y0, x0] = (x0 // 256, x0 % 256, 0)
+        image[y0, x0 + 1] = (y0 // 256, y0 % 256, 0)
+
+
+def _read_offset(tile):
+    return int(tile[0, 0, 0]) * 256 + int(tile[0, 0, 1]), int(tile[0, 1, 0]) * 256 + int(tile[0, 1, 1])
+
+
+class MockYolo:
+    def __init__(self, panels, imgsz=640, min_px=4, ns_per_pixel=2.0):
+        self.panels = panels
+        self.imgsz = imgsz
+        self.min_px = min_px
+        self.ns_per_pixel = ns_per_pixel
+
+    def predict(self, source):
+        sources = source if isinstance(source, list) else [source]
+        results = []
+        for image in sources:
+            x0, y0 = _read_offset(image)
+            h, w = image.shape[:2]
+            tensor = image.astype(np.float32) / 255.0  # native-resolution preprocessing buffer
+            time.sleep(tensor.size * self.ns_per_pixel / 1e9)
+            scale = self.imgsz / max(h, w)
+            local = self.panels - [x0, y0, x0, y0]
+            inside = (local[:, 0] >= 0) & (local[:, 1] >= 0) & (local[:, 2] <= w) & (local[:, 3] <= h)
+            visible = inside & ((local[:, 2] - local[:, 0]) * scale >= self.min_px)
+            results.append(Result(Boxes(local[visible], np.full(visible.sum(), 0.9), np.zeros(visible.sum())),
+                                  (h, w)))
+        return results
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=5400)
+    parser.add_argument("--height", type=int, default=2700)
+    parser.add_argument("--panels", type=int, default=200)
+    parser.add_argument("--tile-size", type=int, default=640)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--min-px", type=float, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, args.width - 40, args.panels)
+    y = rng.uniform(0, args.height - 20, args.panels)
+    panels = np.stack([x, y, x + 30, y + 15], axis=1)
+    model = MockYolo(panels, imgsz=args.imgsz, min_px=args.min_px)
+    image = np.zeros((args.height, args.width, 3), dtype=np.uint8)
+    _stamp_offsets(image, tile_windows(args.height, args.width, tile_size=args.tile_size, overlap=args.overlap))
+
+    whole, whole_s, whole_mb = _measure(lambda: detector.run_inference(model, image))
+    tiled, tiled_s, tiled_mb = _measure(
+        lambda: detector.run_tiled_inference(model, image, tile_size=args.tile_size, overlap=args.overlap))
+
+    print(f"scene {args.width}x{args.height}, {args.panels} panels of 30x15 px")
+    for name, result, seconds, mb in (("whole", whole, whole_s, whole_mb), ("tiled", tiled, tiled_s, tiled_mb)):
+        found = len(result[0].boxes)
+        print(f"{name:>6}: {seconds * 1000:8.1f} ms  peak {mb:8.1f} MB  panels found {found}/{args.panels}")
+
+
+if __name__ == "__main__":
+    main()
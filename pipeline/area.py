@@ -0,0 +1,132 @@
+import numpy as np
+
+# Equatorial circumference of the WGS84 ellipsoid in meters, as used by Web Mercator
+EARTH_CIRCUMFERENCE_M = 40075016.686
+SQFT_TO_SQM = 0.09290304
+
+# The challenge buffer: a 1200 sq ft circle centred on the sample's coordinate
+DEFAULT_BUFFER_SQFT = 1200.0
+
+# Tile sizes of the static-map providers' zoom pyramids: Google uses 256 px tiles, Mapbox 512 px
+GOOGLE_TILE_SIZE = 256
+MAPBOX_TILE_SIZE = 512
+
+
+def meters_per_pixel(lat, zoom, tile_size=GOOGLE_TILE_SIZE, scale=1):
+    """Web Mercator ground resolution in meters per image pixel at `lat` (degrees) and `zoom`; works on arrays.
+
+    `scale` is the image's pixel density (2 for Google `scale=2` / Mapbox `@2x` images).
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    return EARTH_CIRCUMFERENCE_M * np.cos(lat) / (tile_size * np.power(2.0, zoom) * scale)
+
+
+def buffer_radius_m(buffer_sqft=DEFAULT_BUFFER_SQFT):
+    """Radius in meters of a circle whose area is `buffer_sqft` square feet."""
+    return np.sqrt(np.asarray(buffer_sqft, dtype=np.float64) * SQFT_TO_SQM / np.pi)
+
+
+def estimate_areas(boxes, sample_index, n_samples, lat, zoom, image_size, tile_size=GOOGLE_TILE_SIZE,
+                   buffer_sqft=DEFAULT_BUFFER_SQFT, grid=64, chunk_size=2048):
+    """Panel area in square meters inside each sample's buffer circle, for a whole run's boxes at once.
+
+    Args:
+    boxes (array (N, 4)): xyxy pixel boxes of all samples, concatenated.
+    sample_index (array (N,)): which sample (0..n_samples-1) each box belongs to.
+    n_samples (int): number of samples.
+    lat, zoom, tile_size: per-sample arrays or scalars describing how each image was fetched; the sample's
+        coordinate is assumed to be at the image centre.
+    image_size (array (n_samples, 2) or (2,)): image height and width in pixels.
+    buffer_sqft: area of the buffer circle around each coordinate.
+    grid (int): boxes are rasterized onto a `grid` x `grid` lattice spanning the buffer circle, so overlapping
+        boxes are only counted once; the result is accurate to about one cell (2 * radius / grid).
+
+    Returns:
+    numpy.ndarray: (n_samples,) areas in square meters.
+
+    Boxes are clipped to the circle and their union is measured with a 2D difference array per sample: each box
+    adds +1/-1 at its four corners (via np.bincount), two cumulative sums turn that into per-cell coverage, and covered
+    cells inside the circle are counted; samples with a single box skip the grid and read their count from a
+    summed-area table of the circle. There are no per-box Python loops; samples are processed `chunk_size` at a
+    time to bound memory.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    sample_index = np.asarray(sample_index, dtype=np.int64).reshape(-1)
+    areas = np.zeros(n_samples)
+    if n_samples == 0 or len(boxes) == 0:
+        return areas
+
+    m_per_px = np.broadcast_to(meters_per_pixel(lat, zoom, tile_size), (n_samples,))
+    image_size = np.broadcast_to(np.asarray(image_size, dtype=np.float64), (n_samples, 2))
+    radius = np.broadcast_to(buffer_radius_m(buffer_sqft), (n_samples,))
+    cell = 2 * radius / grid  # meters per grid cell, per sample
+
+    # box corners in meters relative to the image centre, then in grid cells from the circle's top-left corner
+    center = image_size[sample_index][:, ::-1] / 2  # (x, y)
+    px_to_m = m_per_px[sample_index][:, None]
+    rel = (boxes - np.concatenate([center, center], axis=1)) * px_to_m
+    cells = np.rint((rel + radius[sample_index][:, None]) / cell[sample_index][:, None])
+    cells = np.clip(cells, 0, grid).astype(np.int64)
+    x0, y0, x1, y1 = cells.T
+    nonempty = (x1 > x0) & (y1 > y0)
+
+    centers = (np.arange(grid) + 0.5) / grid * 2 - 1
+    inside_circle = centers[None, :] ** 2 + centers[:, None] ** 2 <= 1.0
+
+    # a sample with a single box needs no grid: the circle cells inside it come from a summed-area table
+    boxes_per_sample = np.bincount(sample_index[nonempty], minlength=n_samples)
+    single = nonempty & (boxes_per_sample[sample_index] == 1)
+    table = np.zeros((grid + 1, grid + 1), dtype=np.int64)
+    table[1:, 1:] = inside_circle.cumsum(axis=0).cumsum(axis=1)
+    covered = table[y1[single], x1[single]] - table[y0[single], x1[single]] - table[y1[single], x0[single]] \
+        + table[y0[single], x0[single]]
+    areas[sample_index[single]] = covered * cell[sample_index[single]] ** 2
+    nonempty &= ~single
+
+    order = np.argsort(sample_index, kind="stable")
+    bounds = np.searchsorted(sample_index[order], np.arange(0, n_samples + chunk_size, chunk_size))
+    for c, start in enumerate(range(0, n_samples, chunk_size)):
+        sel = order[bounds[c]:bounds[c + 1]]
+        sel = sel[nonempty[sel]]
+        if not len(sel):
+            continue
+        # only samples that actually have boxes get a grid; most samples in a run have none
+        present, local = np.unique(sample_index[sel], return_inverse=True)
+        n = len(present)
+        # scatter the corner increments with bincount on flat indices; much faster than np.add.at
+        side = grid + 1
+        base = local * side * side
+        flat = np.concatenate([base + y0[sel] * side + x0[sel], base + y1[sel] * side + x1[sel],
+                               base + y0[sel] * side + x1[sel], base + y1[sel] * side + x0[sel]])
+        signs = np.repeat(np.array([1, 1, -1, -1], dtype=np.int32), len(sel))
+        diff = np.bincount(flat, weights=signs, minlength=n * side * side).astype(np.int32).reshape(n, side, side)
+        coverage = np.cumsum(np.cumsum(diff, axis=1, out=diff), axis=2, out=diff)[:, :grid, :grid]
+        covered = ((coverage > 0) & inside_circle).sum(axis=(1, 2))
+        areas[present] = covered * cell[present] ** 2
+    return areas
+
+
+def _boxes_array(result):
+    xyxy = result.boxes.xyxy
+    if hasattr(xyxy, "cpu"):
+        xyxy = xyxy.cpu().numpy()
+    return np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+
+
+def estimate_result_areas(results, lat, zoom, image_size=None, tile_size=GOOGLE_TILE_SIZE,
+                          buffer_sqft=DEFAULT_BUFFER_SQFT, default_size=(640, 640)):
+    """`estimate_areas` for a list of per-sample ultralytics-style results (one `Result` per sample).
+
+    Each sample's (height, width) comes from `image_size` if given, else the result's `orig_shape`, else
+    `default_size`.
+    """
+    arrays = [_boxes_array(r) for r in results]
+    counts = np.array([len(a) for a in arrays], dtype=np.int64)
+    boxes = np.concatenate(arrays) if arrays else np.empty((0, 4))
+    if image_size is None:
+        image_size = [None] * len(results)
+    image_size = [tuple(size or getattr(r, "orig_shape", None) or default_size)[:2]
+                  for r, size in zip(results, image_size)]
+    return estimate_areas(boxes, np.repeat(np.arange(len(results)), counts), len(results), lat, zoom,
+                          np.asarray(image_size, dtype=np.float64).reshape(-1, 2), tile_size=tile_size,
+                          buffer_sqft=buffer_sqft)
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+
+DONE = "done"
+FAILED = "failed"
+
+
+def input_hash(lat, lon) -> str:
+    """Short hash of a sample's inputs; a row whose coordinates change is treated as new work."""
+    return hashlib.sha1(f"{float(lat):.7f},{float(lon):.7f}".encode()).hexdigest()[:16]
+
+
+class CompletionIndex:
+    """Append-only log of finished and failed samples, used to resume interrupted runs.
+
+    Each line is `status<TAB>sample_id<TAB>input_hash<TAB>reason`. The whole log is loaded into a dict on open,
+    so checking a row costs one dict lookup and no disk access. Later lines win, so a sample that failed and was
+    then retried successfully counts as done. A torn last line from a crash is ignored.
+    """
+
+    def __init__(self, path: str, resume: bool = True):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+        # line buffering flushes each record as it is written, so a crash loses at most the current line
+        self._file = open(path, "a" if resume else "w", buffering=1, encoding="utf-8")
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                parts = line.rstrip("\n").split("\t", 3)
+                if len(parts) != 4 or parts[0] not in (DONE, FAILED):
+                    continue
+                status, sample_id, digest, reason = parts
+                self._entries[sample_id] = (status, digest, reason)
+
+    def _record(self, status, sample_id, lat, lon, reason=""):
+        sample_id = str(sample_id)
+        digest = input_hash(lat, lon)
+        reason = " ".join(str(reason).split())  # keep the record on one line
+        with self._lock:
+            self._entries[sample_id] = (status, digest, reason)
+            self._file.write(f"{status}\t{sample_id}\t{digest}\t{reason}\n")
+
+    def mark_done(self, sample_id, lat, lon):
+        self._record(DONE, sample_id, lat, lon)
+
+    def mark_failed(self, sample_id, lat, lon, reason):
+        self._record(FAILED, sample_id, lat, lon, reason)
+
+    def _status(self, sample_id, lat, lon):
+        entry = self._entries.get(str(sample_id))
+        if entry is None or entry[1] != input_hash(lat, lon):
+            return None
+        return entry[0]
+
+    def is_done(self, sample_id, lat, lon) -> bool:
+        return self._status(sample_id, lat, lon) == DONE
+
+    def is_failed(self, sample_id, lat, lon) -> bool:
+        return self._status(sample_id, lat, lon) == FAILED
+
+    def failures(self) -> dict:
+        """Return {sample_id: reason} for every sample whose latest record is a failure."""
+        return {sample_id: reason for sample_id, (status, _, reason) in self._entries.items() if status == FAILED}
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,334 @@
+import glob
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    from pipeline import area, postprocess, tiling
+    from pipeline.input_reader import normalize_sample_id
+    from pipeline.output_builder import _arrow_schema, make_record
+except ImportError:  # run as a script from inside pipeline/
+    import area
+    import postprocess
+    import tiling
+    from input_reader import normalize_sample_id
+    from output_builder import _arrow_schema, make_record
+
+DEFAULT_PATH = "predictions/detections"
+# Confidence the model runs at while its detections are stored. Everything above it is kept, so any threshold at or
+# above it can be applied later without inference.
+RAW_CONF = 0.01
+# The ultralytics default threshold, which records have always been written at
+DEFAULT_CONF = 0.25
+VERIFIABLE = "VERIFIABLE"
+
+# Per-sample columns of a segment; "model", "qc_status" and "source" are codes into a per-segment vocabulary
+SAMPLE_COLUMNS = ("sample_id", "lat", "lon", "image", "model", "qc_status", "source", "zoom", "tile_size", "height",
+                  "width", "count")
+DETECTION_COLUMNS = ("xyxy", "conf", "cls")
+VOCABULARIES = ("model", "qc_status", "source")
+# Source of the rows of segments written before sources were stored
+UNKNOWN_SOURCE = "unknown"
+
+
+def image_hash(image) -> str:
+    """Content hash of an image given as encoded bytes or a decoded array."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(image, np.ndarray):
+        h.update(str(image.shape).encode())
+        image = np.ascontiguousarray(image).data
+    h.update(image)
+    return h.hexdigest()
+
+
+def filter_result(result, conf):
+    """Copy of `result` keeping only the detections scoring at least `conf`."""
+    boxes = result.boxes
+    scores = tiling._as_array(boxes.conf).reshape(-1)
+    keep = scores >= conf
+    return tiling.Result(tiling.Boxes(tiling._as_array(boxes.xyxy).reshape(-1, 4)[keep], scores[keep],
+                                      tiling._as_array(boxes.cls).reshape(-1)[keep]),
+                         getattr(result, "orig_shape", None))
+
+
+class StoredDetections:
+    """The columns of a detection store: one row per sample, with every row's detections concatenated.
+
+    Row `i`'s detections are `xyxy/conf/cls[start[i]:start[i] + count[i]]`; `models`, `qc_statuses` and `sources`
+    hold the strings the `model`/`qc_status`/`source` codes stand for.
+    """
+
+    def __init__(self, columns, models, qc_statuses, sources):
+        for name in SAMPLE_COLUMNS + DETECTION_COLUMNS:
+            setattr(self, name, columns[name])
+        self.models = list(models)
+        self.qc_statuses = list(qc_statuses)
+        self.sources = list(sources)
+        self.start = np.cumsum(self.count) - self.count
+
+    def __len__(self):
+        return len(self.sample_id)
+
+    @property
+    def owner(self):
+        """Row index of every detection."""
+        return np.repeat(np.arange(len(self)), self.count)
+
+    def take(self, rows):
+        """The rows `rows` (an index array) with their detections."""
+        rows = np.asarray(rows, dtype=np.int64)
+        count = self.count[rows]
+        within = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        detections = np.repeat(self.start[rows], count) + within
+        columns = {name: getattr(self, name)[rows] for name in SAMPLE_COLUMNS}
+        columns.update({name: getattr(self, name)[detections] for name in DETECTION_COLUMNS})
+        return StoredDetections(columns, self.models, self.qc_statuses, self.sources)
+
+    def latest(self):
+        """Only the last row written for each sample id, in the order they were written."""
+        _, last = np.unique(self.sample_id[::-1], return_index=True)
+        return self.take(np.sort(len(self) - 1 - last))
+
+    def from_model(self, model):
+        """Boolean mask of the rows whose detections came from `model`."""
+        if model not in self.models:
+            return np.zeros(len(self), dtype=bool)
+        return self.model == self.models.index(model)
+
+
+def _concat(parts):
+    """Merge segments, remapping their vocabulary codes onto the union of their vocabularies."""
+    vocab = {name: [] for name in VOCABULARIES}
+    columns = {name: [] for name in SAMPLE_COLUMNS + DETECTION_COLUMNS}
+    for part in parts:
+        if "source" not in part:  # written before sources were stored
+            part = dict(part, source=np.zeros(len(part["sample_id"]), dtype=np.int16),
+                        source_vocab=np.array([UNKNOWN_SOURCE]))
+        for name in VOCABULARIES:
+            words = [str(w) for w in part[f"{name}_vocab"]]
+            for word in words:
+                if word not in vocab[name]:
+                    vocab[name].append(word)
+            remap = np.array([vocab[name].index(w) for w in words] or [0], dtype=np.int16)
+            columns[name].append(remap[part[name]])
+        for name in SAMPLE_COLUMNS + DETECTION_COLUMNS:
+            if name not in VOCABULARIES:
+                columns[name].append(part[name])
+    return StoredDetections({name: np.concatenate(values) for name, values in columns.items()},
+                            vocab["model"], vocab["qc_status"], vocab["source"])
+
+
+def _empty_segment():
+    return {"sample_id": np.array([], dtype="U1"), "lat": np.zeros(0), "lon": np.zeros(0),
+            "image": np.array([], dtype="S32"), "model": np.zeros(0, dtype=np.int16),
+            "qc_status": np.zeros(0, dtype=np.int16), "source": np.zeros(0, dtype=np.int16),
+            "zoom": np.zeros(0, dtype=np.int8),
+            "tile_size": np.zeros(0, dtype=np.int16), "height": np.zeros(0, dtype=np.int32),
+            "width": np.zeros(0, dtype=np.int32), "count": np.zeros(0, dtype=np.int32),
+            "xyxy": np.zeros((0, 4), dtype=np.float32), "conf": np.zeros(0, dtype=np.float32),
+            "cls": np.zeros(0, dtype=np.int16), "model_vocab": np.array([], dtype="U1"),
+            "qc_status_vocab": np.array([], dtype="U1"), "source_vocab": np.array([], dtype="U1")}
+
+
+class DetectionStore:
+    """Raw detections of every inferred sample, kept so a new threshold or new weights don't mean a full re-run.
+
+    Each sample's detections are stored before thresholding (the model runs at `RAW_CONF`) together with the hash of
+    the image they came from and the checksum of the weights that produced them. A later run with the same weights
+    looks an image up by its hash and skips the model (`lookup`); `rescore` re-filters the stored detections at a
+    new threshold with array operations only.
+
+    Rows are buffered and written `flush_every` at a time as NumPy segment files named by time and process id, so
+    shards of one run can share a store; a sample's latest row wins. `compact` rewrites the latest rows as one
+    segment.
+    """
+
+    def __init__(self, directory=DEFAULT_PATH, flush_every=10000):
+        self.directory = directory
+        self.flush_every = flush_every
+        self.stats = {"reused": 0, "stored": 0}
+        self._rows = []
+        self._index = {}
+        self._table = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.npz")))
+
+    def load(self, latest=True) -> StoredDetections:
+        """Everything stored so far, or with `latest` only each sample's last row."""
+        parts = [_empty_segment()]
+        for path in self.segments():
+            with np.load(path, allow_pickle=False) as segment:
+                parts.append({name: segment[name] for name in segment.files})
+        table = _concat(parts)
+        return table.latest() if latest else table
+
+    def lookup(self, image, model):
+        """`(result, sample_id)` stored for the image hash `image` by the weights `model`, or None.
+
+        Only rows the model actually ran on count; images the prefilter kept away from it are not reused.
+        """
+        with self._lock:
+            if model not in self._index:
+                if self._table is None:
+                    self._table = self.load()
+                table = self._table
+                rows = np.flatnonzero(table.from_model(model) & (table.qc_status == self._qc_code(VERIFIABLE)))
+                self._index[model] = dict(zip(table.image[rows].tolist(), rows.tolist()))
+            row = self._index[model].get(image.encode())
+            if row is None:
+                return None
+            self.stats["reused"] += 1
+        table = self._table
+        detections = slice(table.start[row], table.start[row] + table.count[row])
+        boxes = tiling.Boxes(table.xyxy[detections], table.conf[detections], table.cls[detections])
+        return tiling.Result(boxes, (int(table.height[row]), int(table.width[row]))), str(table.sample_id[row])
+
+    def _qc_code(self, status):
+        return self._table.qc_statuses.index(status) if status in self._table.qc_statuses else -1
+
+    def add(self, sample_id, lat, lon, image, model, result, shape, zoom, tile_size, qc_status=VERIFIABLE,
+            source=UNKNOWN_SOURCE):
+        """Buffer one sample's raw `result`, inferred by the weights `model` from the image hashed `image`, which
+        came from `source` (see `output_builder.make_record`)."""
+        boxes = result.boxes
+        row = (str(normalize_sample_id(sample_id)), float(lat), float(lon), image, model, qc_status, source, zoom,
+               tile_size, int(shape[0]), int(shape[1]), tiling._as_array(boxes.xyxy).reshape(-1, 4),
+               tiling._as_array(boxes.conf).reshape(-1), tiling._as_array(boxes.cls).reshape(-1))
+        with self._lock:
+            self._rows.append(row)
+            self.stats["stored"] += 1
+            if len(self._rows) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        (sample_id, lat, lon, image, model, qc_status, source, zoom, tile_size, height, width, xyxy, conf,
+         cls) = zip(*rows)
+        models, model_codes = np.unique(np.array(model), return_inverse=True)
+        statuses, status_codes = np.unique(np.array(qc_status), return_inverse=True)
+        sources, source_codes = np.unique(np.array(source), return_inverse=True)
+        segment = {
+            "sample_id": np.array(sample_id), "lat": np.array(lat), "lon": np.array(lon),
+            "image": np.array(image, dtype="S32"), "model": model_codes.astype(np.int16),
+            "qc_status": status_codes.astype(np.int16), "source": source_codes.astype(np.int16),
+            "zoom": np.array(zoom, dtype=np.int8),
+            "tile_size": np.array(tile_size, dtype=np.int16), "height": np.array(height, dtype=np.int32),
+            "width": np.array(width, dtype=np.int32), "count": np.array([len(c) for c in conf], dtype=np.int32),
+            "xyxy": np.concatenate(xyxy).astype(np.float32), "conf": np.concatenate(conf).astype(np.float32),
+            "cls": np.concatenate(cls).astype(np.int16), "model_vocab": models, "qc_status_vocab": statuses,
+            "source_vocab": sources,
+        }
+        self._write_segment(segment)
+
+    def _write_segment(self, segment):
+        # written under a temporary name and renamed, so readers never see half a segment
+        path = os.path.join(self.directory, f"segment-{time.time_ns():020d}-{os.getpid()}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **segment)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def compact(self):
+        """Rewrite each sample's latest row into a single segment and drop the segments it supersedes."""
+        self.flush()
+        old = self.segments()
+        if len(old) < 2:
+            return
+        table = self.load()
+        segment = {name: getattr(table, name) for name in SAMPLE_COLUMNS + DETECTION_COLUMNS}
+        segment["model_vocab"] = np.array(table.models)
+        segment["qc_status_vocab"] = np.array(table.qc_statuses)
+        segment["source_vocab"] = np.array(table.sources)
+        self._write_segment(segment)
+        for path in old:
+            os.remove(path)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rescore(table, conf, buffer_sqft=area.DEFAULT_BUFFER_SQFT):
+    """Apply the confidence threshold `conf` to every row of `table` at once.
+
+    Returns a dict of arrays: `keep` (which detections pass), and per row `count`, `confidence` (the best passing
+    score, 0 if none) and `area` (panel area in the buffer, see `area.estimate_areas`). Greedy NMS never lets a
+    lower-scoring box suppress a higher one, so this equals running the model at `conf` directly.
+    """
+    if conf < RAW_CONF:
+        raise ValueError(f"Detections are stored from conf {RAW_CONF}; cannot rescore at {conf}")
+    n = len(table)
+    keep = postprocess.select(table.conf, table.cls, conf)
+    owner = table.owner[keep]
+    count, confidence = postprocess.aggregate(owner, table.conf[keep], n)
+    areas = area.estimate_areas(table.xyxy[keep], owner, n, table.lat, table.zoom.astype(np.float64),
+                                np.stack([table.height, table.width], axis=1), tile_size=table.tile_size,
+                                buffer_sqft=buffer_sqft)
+    return {"keep": keep, "count": count, "confidence": confidence, "area": areas}
+
+
+def records(table, scored, buffer_sqft=area.DEFAULT_BUFFER_SQFT):
+    """Yield the output record of every row of `table` with the detections that passed `rescore`."""
+    keep = scored["keep"]
+    bbox = table.xyxy[keep].astype(np.float64).tolist()
+    confs = table.conf[keep].astype(np.float64).tolist()
+    classes = table.cls[keep].tolist()
+    ends = np.cumsum(scored["count"]).tolist()
+    sample_id, lat, lon = table.sample_id.tolist(), table.lat.tolist(), table.lon.tolist()
+    areas = scored["area"].tolist()
+    statuses = [table.qc_statuses[code] for code in table.qc_status.tolist()]
+    sources = [table.sources[code] for code in table.source.tolist()]
+    begin = 0
+    for i, end in enumerate(ends):
+        yield make_record(sample_id[i], lat[i], lon[i], bbox[begin:end], confs[begin:end],
+                          classes[begin:end], areas[i], buffer_sqft=buffer_sqft,
+                          qc_status=statuses[i], source=sources[i])
+        begin = end
+
+
+def to_arrow(table, scored, buffer_sqft=area.DEFAULT_BUFFER_SQFT):
+    """The rows of `table` as a `pyarrow.Table` in the columnar sinks' schema, built from the arrays directly."""
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    keep, count = scored["keep"], scored["count"]
+    offsets = np.concatenate([[0], np.cumsum(count)]).astype(np.int32)
+    detection = pa.StructArray.from_arrays(
+        [pa.FixedSizeListArray.from_arrays(pa.array(table.xyxy[keep].reshape(-1), pa.float32()), 4),
+         pa.array(table.conf[keep], pa.float32()), pa.array(table.cls[keep].astype(np.int32), pa.int32())],
+        fields=list(schema.field("detections").type.value_type))
+    n = len(table)
+    source = pa.DictionaryArray.from_arrays(pa.array(table.source.astype(np.int32)),
+                                            pa.array(table.sources, pa.string())).cast(pa.string())
+    metadata = pa.StructArray.from_arrays([source, pa.array(np.full(n, "unknown", dtype=object))],
+                                          fields=list(schema.field("image_metadata").type))
+    qc_status = pa.DictionaryArray.from_arrays(pa.array(table.qc_status.astype(np.int32)),
+                                               pa.array(table.qc_statuses, pa.string())).cast(pa.string())
+    return pa.Table.from_arrays([
+        pa.array(table.sample_id.astype(str)),
+        pa.array(table.lat), pa.array(table.lon),
+        pa.array(count > 0),
+        pa.array(scored["confidence"], pa.float32()),
+        pa.array(np.where(count > 0, scored["area"], 0.0), pa.float32()),
+        pa.array(np.full(n, buffer_sqft, dtype=np.float32)),
+        qc_status,
+        pa.ListArray.from_arrays(pa.array(offsets), detection),
+        metadata,
+    ], schema=schema)
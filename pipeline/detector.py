@@ -1,10 +1,34 @@
-
 import os
+import shutil
+import tempfile
+
+try:
+    from pipeline import instrumentation
+    from pipeline.model_registry import ModelRegistry
+except ImportError:  # run as a script from inside pipeline/
+    import instrumentation
+    from model_registry import ModelRegistry
+
+# Environment variable setting how many dummy inferences warm up a freshly loaded model
+WARMUP_RUNS_ENV = "MODEL_WARMUP_RUNS"
+# Environment variable choosing the inference backend, one of BACKENDS
+BACKEND_ENV = "MODEL_BACKEND"
+# torch: the ultralytics/PyTorch model; onnx: the same weights exported to ONNX and run with ONNX Runtime on the CPU;
+# onnx-int8: that export with int8-quantized weights
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Weights files smaller than this are treated as missing
+MIN_WEIGHTS_BYTES = 1000
+
 
-def load_model(path="model/best.pt"):
+def _usable_weights(path):
+    return os.path.exists(path) and os.path.getsize(path) >= MIN_WEIGHTS_BYTES
+
+
+def _load_yolo(path, fallback=True):
     """Load a YOLO model. Import ultralytics lazily so tests/CI can mock this function without installing heavy deps.
 
-    If the local file doesn't exist or is suspiciously small, falls back to the pretrained `yolov8n.pt`.
+    If the local file doesn't exist, is suspiciously small or fails to load, falls back to the pretrained
+    `yolov8n.pt`, unless `fallback` is False, in which case the error is raised.
     """
     try:
         # import inside function to avoid requiring ultralytics at module import time
@@ -14,14 +38,217 @@ def load_model(path="model/best.pt"):
 
     # If the local file doesn't exist or is suspiciously small, fall back to a pretrained model
     try:
-        if not os.path.exists(path) or os.path.getsize(path) < 1000:
+        if not _usable_weights(path):
+            if not fallback:
+                raise RuntimeError(f"Local weights '{path}' missing or too small")
             print(f"Local weights '{path}' missing or too small; falling back to 'yolov8n.pt' pretrained weights.")
             return YOLO("yolov8n.pt")
         return YOLO(path)
     except Exception as e:
+        if not fallback:
+            raise
         print(f"Failed to load local weights '{path}': {e}\nFalling back to 'yolov8n.pt'.")
         return YOLO("yolov8n.pt")
 
-def run_inference(model, image_path):
-    results = model.predict(image_path)
-    return results
\ No newline at end of file
+
+def _load_backend(path):
+    """Load `path` with the backend its extension calls for: ONNX Runtime for `.onnx`, ultralytics otherwise."""
+    if path.endswith(".onnx"):
+        try:
+            from pipeline.onnx_backend import OnnxDetector
+        except ImportError:  # run as a script from inside pipeline/
+            from onnx_backend import OnnxDetector
+        return OnnxDetector(path)
+    return _load_yolo(path)
+
+
+# One registry per process: each weights file is loaded (and its fallback message printed) only once
+registry = ModelRegistry(_load_backend)
+
+
+def _export(output_path, write):
+    """Run `write(tmp_dir, tmp_output)` in a private directory next to `output_path`, then move the result into place.
+
+    Each process exports on its own copy, so workers racing on the same weights never read a half-written file: the
+    last `os.replace` wins, and every contender produced the same model.
+    """
+    directory = os.path.dirname(output_path) or "."
+    with tempfile.TemporaryDirectory(dir=directory, prefix=".export-") as tmp:
+        tmp_output = os.path.join(tmp, os.path.basename(output_path))
+        write(tmp, tmp_output)
+        os.replace(tmp_output, output_path)
+    return output_path
+
+
+def backend_path(path, backend):
+    """Weights file `backend` runs from, next to the PyTorch weights and tagged with their checksum:
+    best.pt -> best.<sha>.onnx / best.<sha>.int8.onnx.
+
+    Missing ONNX files are exported from `path` (and quantized) on first use, so replacing `path` gets a new export
+    rather than the old one. Only real weights are exported: without a usable `path` this raises instead of baking
+    the pretrained fallback model in under the weights' name.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "torch":
+        return path
+    try:
+        from pipeline import onnx_backend
+    except ImportError:  # run as a script from inside pipeline/
+        import onnx_backend
+
+    if not _usable_weights(path):
+        raise RuntimeError(f"Weights '{path}' missing or too small; cannot export them for the {backend} backend")
+    stem = f"{os.path.splitext(path)[0]}.{registry.checksum(path)[:16]}"
+    fp32_path = f"{stem}.onnx"
+    if not os.path.exists(fp32_path):
+        print(f"Exporting '{path}' to ONNX at '{fp32_path}'...")
+
+        def export(tmp, output):
+            # ultralytics writes its export next to the weights, so export from a private copy of them
+            weights = shutil.copy(path, os.path.join(tmp, os.path.basename(path)))
+            onnx_backend.export_onnx(_load_yolo(weights, fallback=False), output)
+
+        _export(fp32_path, export)
+    if backend == "onnx":
+        return fp32_path
+    int8_path = f"{stem}.int8.onnx"
+    if not os.path.exists(int8_path):
+        print(f"Quantizing '{fp32_path}' to int8 at '{int8_path}'...")
+        _export(int8_path, lambda tmp, output: onnx_backend.quantize_int8(fp32_path, output))
+    return int8_path
+
+
+def load_model(path="model/best.pt", warmup_runs=None, backend=None):
+    """Return the model for `path`, loading and warming it up on first use (see `ModelRegistry`).
+
+    `backend` (one of `BACKENDS`) defaults to the `MODEL_BACKEND` environment variable, or "torch"; every backend
+    returns results with the same `boxes.xyxy/conf/cls` layout. `warmup_runs` defaults to the `MODEL_WARMUP_RUNS`
+    environment variable, or 1.
+    """
+    if warmup_runs is None:
+        warmup_runs = int(os.environ.get(WARMUP_RUNS_ENV, 1))
+    if backend is None:
+        backend = os.environ.get(BACKEND_ENV, "torch")
+    return registry.get(backend_path(path, backend), warmup_runs=warmup_runs)
+
+
+def preload_model(path="model/best.pt", warmup_runs=None, backend=None):
+    """`load_model` for a parent process about to fork workers, which then share its weights instead of each loading
+    their own copy (see `ModelRegistry.preload`)."""
+    if warmup_runs is None:
+        warmup_runs = int(os.environ.get(WARMUP_RUNS_ENV, 1))
+    if backend is None:
+        backend = os.environ.get(BACKEND_ENV, "torch")
+    return registry.preload([backend_path(path, backend)], warmup_runs=warmup_runs)[0]
+
+
+def model_checksum(path="model/best.pt", backend=None):
+    """Identity of the model `load_model(path, backend=backend)` runs, without loading or exporting it: the checksum
+    of the source weights, tagged with the backend unless it is torch."""
+    if backend is None:
+        backend = os.environ.get(BACKEND_ENV, "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    checksum = registry.checksum(path)
+    return checksum if backend == "torch" else f"{checksum}:{backend}"
+
+
+def decode_image(image):
+    """Decode an image into an HxWx3 BGR uint8 array, the layout ultralytics expects for array inputs.
+
+    `image` may be a file path, the encoded bytes of an image (e.g. straight from the fetcher), or an already
+    decoded array, which is returned unchanged.
+    """
+    import io
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = io.BytesIO(image)
+    with instrumentation.timer("decode"):
+        with Image.open(image) as im:
+            rgb = np.asarray(im.convert("RGB"))
+        return np.ascontiguousarray(rgb[..., ::-1])
+
+
+def _model_input(image):
+    """Paths and arrays go to the model as-is; encoded bytes are decoded in memory first."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return decode_image(image)
+    return image
+
+
+def _predict(model, source, conf=None):
+    """`model.predict` under the "predict" timer, plus the per-image preprocess/inference/postprocess split that
+    ultralytics reports in `Results.speed` (milliseconds). `conf` overrides the model's confidence threshold."""
+    with instrumentation.timer("predict"):
+        results = model.predict(source) if conf is None else model.predict(source, conf=conf)
+    if instrumentation.enabled():
+        results = list(results)
+        for r in results:
+            for stage, ms in (getattr(r, "speed", None) or {}).items():
+                if ms is not None:
+                    instrumentation.observe(f"predict.{stage}", ms / 1000)
+    return results
+
+
+def run_inference(model, image, conf=None):
+    """Run the model on one image given as a path, encoded bytes or a decoded BGR array.
+
+    `conf` is the minimum confidence of the returned detections (default: the model's own, 0.25 for ultralytics).
+    """
+    results = _predict(model, _model_input(image), conf=conf)
+    return results
+
+
+def run_batch_inference(model, images, batch_size=8, conf=None):
+    """Run inference over a list of image paths, encoded bytes or arrays, `batch_size` images per `model.predict` call.
+
+    Returns one entry per input, in input order, each shaped like the return value of `run_inference`
+    (a list holding that image's result) so it can be passed straight to `save_output`. Raises RuntimeError if the
+    model returns a different number of results than it was given images.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+
+    images = [_model_input(image) for image in images]
+    outputs = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        results = list(_predict(model, batch if len(batch) > 1 else batch[0], conf=conf))
+        if len(results) != len(batch):
+            # The results can't be matched back to their images, so don't guess which ones are missing
+            raise RuntimeError(f"model returned {len(results)} results for a batch of {len(batch)} images; "
+                               f"batched inference needs a model that predicts a list of images at once")
+        outputs.extend([r] for r in results)
+    return outputs
+
+
+def run_tiled_inference(model, image, tile_size=640, overlap=0.2, iou_threshold=0.5, merge="nms", batch_size=8,
+                        conf=None):
+    """Run the model over overlapping `tile_size` windows of a large image and merge the detections.
+
+    Feeding a large scene to the model whole shrinks rooftop panels to a few pixels. Instead the image is cut into
+    windows, the windows are inferred `batch_size` at a time (so only one batch of tiles is copied out at once),
+    boxes are shifted back to image coordinates, and duplicates from overlapping windows are merged with NMS or
+    weighted box fusion (`merge="wbf"`).
+    Returns a one-element list shaped like `run_inference`'s output.
+    """
+    try:
+        from pipeline import tiling
+    except ImportError:  # run as a script from inside pipeline/
+        import tiling
+    import numpy as np
+
+    image = decode_image(image)
+    height, width = image.shape[:2]
+    windows = tiling.tile_windows(height, width, tile_size=tile_size, overlap=overlap)
+    tile_results = []
+    for start in range(0, len(windows), batch_size):
+        tiles = [np.ascontiguousarray(image[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows[start:start + batch_size]]
+        tile_results.extend(r[0] for r in run_batch_inference(model, tiles, batch_size=batch_size, conf=conf))
+    boxes = tiling.merge_tile_results(tile_results, windows, iou_threshold=iou_threshold, method=merge)
+    return [tiling.Result(boxes, (height, width))]
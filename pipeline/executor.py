@@ -0,0 +1,177 @@
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+# Marks the end of a stage's input; one is queued per downstream worker
+_DONE = object()
+
+
+class Stage:
+    """One step of a `StagedExecutor`.
+
+    `fn` receives one item (or, if `batch_size` is set, a list of up to `batch_size` items) and returns the item
+    to pass downstream (or a list of them in batch mode). Returning None drops the item. If `fn` raises, `on_error`
+    is called with each affected item and the exception, and those items are dropped. An `on_error` that raises
+    itself is reported and counted, never allowed to stop the worker.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = 16,
+                 batch_size: Optional[int] = None, batch_timeout: float = 0.05, on_error: Optional[Callable] = None):
+        if workers < 1 or queue_size < 1 or (batch_size is not None and batch_size < 1):
+            raise ValueError(f"Stage '{name}': workers, queue_size and batch_size must all be >= 1")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.on_error = on_error
+
+    @property
+    def batched(self) -> bool:
+        return self.batch_size is not None
+
+
+class _StageStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.handler_errors = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def record_depth(self, depth):
+        with self.lock:
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.depth_max = max(self.depth_max, depth)
+
+
+class StagedExecutor:
+    """Run items through a chain of stages, each with its own worker threads, connected by bounded queues.
+
+    A stage that falls behind fills its input queue, which blocks the upstream workers on `put`; memory therefore
+    stays bounded by the queue sizes instead of growing with the input. `run` returns per-stage statistics:
+    items processed, errors, failed `on_error` calls, utilization (busy time / wall time / workers) and input queue depth.
+    """
+
+    def __init__(self, stages):
+        if not stages:
+            raise ValueError("StagedExecutor needs at least one stage")
+        self.stages = list(stages)
+
+    def _next_batch(self, stage, in_q):
+        """Block for one item, then gather more until the batch is full or `batch_timeout` passes."""
+        item = in_q.get()
+        if item is _DONE or not stage.batched:
+            return item, item is _DONE
+        batch = [item]
+        deadline = time.monotonic() + stage.batch_timeout
+        while len(batch) < stage.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = in_q.get(timeout=max(remaining, 0)) if remaining > 0 else in_q.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, stage, stats, in_q, out_q, out_stats):
+        while True:
+            work, finished = self._next_batch(stage, in_q)
+            if work is not _DONE:
+                items = work if stage.batched else [work]
+                start = time.perf_counter()
+                try:
+                    out = stage.fn(work)
+                except Exception as e:
+                    out = None
+                    with stats.lock:
+                        stats.errors += len(items)
+                    if stage.on_error is not None:
+                        for item in items:
+                            try:
+                                stage.on_error(item, e)
+                            except Exception as handler_error:
+                                # a dead worker would leave its upstream blocked on a full queue for good
+                                print(f"{stage.name}: error handler failed: {handler_error}")
+                                with stats.lock:
+                                    stats.handler_errors += 1
+                busy = time.perf_counter() - start
+                with stats.lock:
+                    stats.processed += len(items)
+                    stats.busy_seconds += busy
+
+                outputs = (out or []) if stage.batched else ([] if out is None else [out])
+                if out_q is not None:
+                    for result in outputs:
+                        out_q.put(result)  # blocks while the next stage is saturated (backpressure)
+                        out_stats.record_depth(out_q.qsize())
+            if finished:
+                return
+
+    def run(self, items) -> dict:
+        """Feed `items` through all stages and block until every item has left the last stage."""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        stats = [_StageStats() for _ in self.stages]
+        start = time.perf_counter()
+
+        worker_groups = []
+        for i, stage in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(self.stages) else None
+            out_stats = stats[i + 1] if i + 1 < len(self.stages) else None
+            threads = [
+                threading.Thread(target=self._worker, args=(stage, stats[i], queues[i], out_q, out_stats),
+                                 name=f"{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            ]
+            for t in threads:
+                t.start()
+            worker_groups.append(threads)
+
+        try:
+            for item in items:
+                queues[0].put(item)
+                stats[0].record_depth(queues[0].qsize())
+        finally:
+            # Shut stages down in order, even if `items` raised: once every worker of a stage has exited, nothing
+            # more can reach the next one
+            for i, threads in enumerate(worker_groups):
+                for _ in threads:
+                    queues[i].put(_DONE)
+                for t in threads:
+                    t.join()
+
+        elapsed = time.perf_counter() - start
+        report = {}
+        for stage, s in zip(self.stages, stats):
+            report[stage.name] = {
+                "processed": s.processed,
+                "errors": s.errors,
+                "handler_errors": s.handler_errors,
+                "workers": stage.workers,
+                "utilization": s.busy_seconds / (elapsed * stage.workers) if elapsed > 0 else 0.0,
+                "queue_depth_max": s.depth_max,
+                "queue_depth_avg": s.depth_total / s.depth_samples if s.depth_samples else 0.0,
+                "queue_size": stage.queue_size,
+            }
+        report["elapsed_seconds"] = elapsed
+        return report
+
+
+def format_report(report: dict) -> str:
+    """Render a `StagedExecutor.run` report as a small text table."""
+    lines = [f"{'stage':<10}{'processed':>10}{'errors':>8}{'util':>8}{'q max':>7}{'q avg':>8}"]
+    for name, s in report.items():
+        if name == "elapsed_seconds":
+            continue
+        lines.append(f"{name:<10}{s['processed']:>10}{s['errors']:>8}{s['utilization']:>7.0%}"
+                     f"{s['queue_depth_max']:>5}/{s['queue_size']:<3}{s['queue_depth_avg']:>6.1f}")
+    lines.append(f"elapsed {report['elapsed_seconds']:.2f}s")
+    return "\n".join(lines)
@@ -1,13 +1,31 @@
+import io
 import os
+import threading
 import time
-import requests
 from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
 
 try:
     from PIL import Image
 except Exception:
     Image = None
 
+try:
+    from pipeline import instrumentation
+    from pipeline.retry_policy import (MISSING_STATUSES, PROVIDER_FAILURE_STATUSES, CircuitBreaker, RetryPolicy,
+                                       parse_retry_after)
+    from pipeline.tile_cache import TileCache, get_default_cache
+    from pipeline.tile_providers import DEFAULT_IMAGE_SIZE, DEFAULT_ZOOM, get_provider
+except ImportError:  # run as a script from inside pipeline/
+    import instrumentation
+    from retry_policy import (MISSING_STATUSES, PROVIDER_FAILURE_STATUSES, CircuitBreaker, RetryPolicy,
+                              parse_retry_after)
+    from tile_cache import TileCache, get_default_cache
+    from tile_providers import DEFAULT_IMAGE_SIZE, DEFAULT_ZOOM, get_provider
+
 # Candidate sample images to try when no API key/provider is configured
 SAMPLE_IMAGE_URLS = [
     "https://eoimages.gsfc.nasa.gov/images/imagerecords/57000/57730/world.topo.bathy.200412.3x5400x2700.jpg",
@@ -15,82 +33,250 @@ SAMPLE_IMAGE_URLS = [
 ]
 
 
-def _download_with_retries(url: str, retries: int = 3, backoff: float = 1.0) -> Optional[bytes]:
-    for attempt in range(1, retries + 1):
+def image_geometry() -> dict:
+    """Zoom level, zoom-pyramid tile size and image size of the images `fetch_image_bytes` returns under the current
+    settings (see `tile_providers.get_provider`).
+
+    Needed to convert detections from pixels to ground area (see `area.meters_per_pixel`) and to plan shared images.
+    """
+    provider = get_provider()
+    if provider is not None:
+        return provider.geometry()
+    # sample imagery; assume the Google Static Maps defaults used in src/
+    return {"zoom": int(os.environ.get("SAT_IMAGE_ZOOM", DEFAULT_ZOOM)), "tile_size": 256,
+            "image_size": DEFAULT_IMAGE_SIZE}
+
+
+def image_source() -> str:
+    """Name of the source of the images `fetch_image_bytes` returns under the current settings: the provider's
+    `name`, or "sample" for sample imagery. Written to each record's `image_metadata`."""
+    provider = get_provider()
+    return provider.name if provider is not None else "sample"
+
+
+# Shared keep-alive session so repeated downloads reuse pooled connections instead of reconnecting
+DEFAULT_POOL_SIZE = 32
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: Optional[int] = None) -> requests.Session:
+    """Return the process-wide `requests.Session`, with a connection pool of at least `pool_size` per host.
+
+    The pool starts at `DEFAULT_POOL_SIZE`; asking for a larger one (e.g. more fetch workers than that) mounts a
+    larger pool on the same session, so every caller keeps sharing it.
+    """
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        size = max(pool_size or DEFAULT_POOL_SIZE, _session_pool_size)
+        if size != _session_pool_size:
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session_pool_size = size
+        return _session
+
+
+class HostRateLimiter:
+    """Thread-safe limiter allowing at most `rate` requests per second to each host."""
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError(f"rate must be > 0, got {rate}")
+        self.interval = 1.0 / rate
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """The process-wide circuit breaker of `url`'s host, so every worker sees the same provider health."""
+    host = urlparse(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker()
+        return breaker
+
+
+def _download_with_retries(url: str, rate_limiter: Optional[HostRateLimiter] = None,
+                           policy: Optional[RetryPolicy] = None, raise_on_failure: bool = False) -> Optional[bytes]:
+    """Download `url`, retrying transient failures as `policy` (default `DEFAULT_RETRY_POLICY`) allows.
+
+    Statuses that can't succeed on a retry (e.g. 401/403/404) fail at once, `Retry-After` is honoured, and there is
+    no wait after the last attempt. Provider failures feed the host's circuit breaker; while it is open, requests
+    return None immediately so callers fall back without waiting. A retry wait only occupies the calling worker:
+    no lock or pooled connection is held while sleeping, so other downloads carry on.
+
+    Returns None when the download fails, or with `raise_on_failure` only when the server says the resource doesn't
+    exist (`MISSING_STATUSES`); every other failure then raises ConnectionError, so callers can tell "not there"
+    from "couldn't get it".
+    """
+
+    def fail(reason):
+        if raise_on_failure and status not in MISSING_STATUSES:
+            raise ConnectionError(f"{reason} for {url}")
+        return None
+
+    policy = policy or DEFAULT_RETRY_POLICY
+    breaker = get_circuit_breaker(url)
+    session = get_session()
+    status = None
+    for attempt in range(1, policy.max_attempts + 1):
+        if not breaker.allow():
+            instrumentation.count("fetch.circuit_open")
+            return fail(f"circuit open for {urlparse(url).netloc}")
+        if attempt > 1:
+            instrumentation.count("fetch.retries")
+        status = retry_after = None
         try:
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
+            if rate_limiter is not None:
+                rate_limiter.acquire(url)
+            with instrumentation.timer("fetch.download"):
+                resp = session.get(url, timeout=policy.timeout)
+            status = resp.status_code
+            if status == 200:
+                breaker.record_success()
+                instrumentation.count("fetch.bytes", len(resp.content))
                 return resp.content
-            else:
-                print(f"Download failed (status {resp.status_code}) for {url}")
+            print(f"Download failed (status {status}) for {url}")
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
         except Exception as e:
             print(f"Attempt {attempt} failed for {url}: {e}")
-        time.sleep(backoff * attempt)
-    return None
+        instrumentation.count("fetch.errors")
 
+        if status is None or status in PROVIDER_FAILURE_STATUSES:
+            if breaker.record_failure():
+                print(f"{urlparse(url).netloc} looks down; failing fast for {breaker.reset_timeout:.0f}s")
+        else:
+            breaker.record_success()  # the provider answered; only this URL is bad
+        if not policy.is_retryable(status):
+            return fail(f"download failed (status {status})")
+        wait = policy.delay(attempt, retry_after)
+        if wait is None:
+            return fail(f"download failed after {attempt} attempts (status {status})")
+        time.sleep(wait)
+    return fail(f"download failed after {policy.max_attempts} attempts (status {status})")
 
-def _write_placeholder_image(path: str, size=(512, 512)):
+
+def _placeholder_image_bytes(size=(512, 512)) -> bytes:
     if Image is None:
-        # If PIL isn't available, write an empty file to signal failure
-        open(path, "wb").close()
-        return
-    img = Image.new("RGB", size, color=(200, 200, 200))
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    img.save(path)
+        # If PIL isn't available, return no data to signal failure
+        return b""
+    buf = io.BytesIO()
+    Image.new("RGB", size, color=(200, 200, 200)).save(buf, format="JPEG")
+    return buf.getvalue()
 
 
-def fetch_image(lat, lon, output_path):
-    """Fetch a satellite image for the given lat/lon.
+def _write_placeholder_image(path: str, size=(512, 512)):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_placeholder_image_bytes(size))
 
-    Behavior:
-    - If `SAT_API_PROVIDER` and `SAT_API_KEY` are provided, attempt to use the provider (currently supports 'mapbox').
-    - Otherwise try a list of free sample images.
-    - If all downloads fail, write a placeholder image so the pipeline can continue.
+
+def _download_cached(url: str, cache_key: Optional[str], cache: Optional[TileCache],
+                     rate_limiter: Optional[HostRateLimiter] = None, validate=None,
+                     raise_on_failure: bool = False) -> Optional[bytes]:
+    """Return the cached bytes for `cache_key` if present, else download `url` and store it in the cache.
+
+    Downloads that fail `validate(data)` (e.g. an error page sent with status 200) are neither cached nor returned;
+    with `raise_on_failure` they, like failed downloads, raise ConnectionError (see `_download_with_retries`).
     """
-    provider = os.environ.get("SAT_API_PROVIDER")
-    api_key = os.environ.get("SAT_API_KEY")
+    if cache is not None:
+        data = cache.get(cache_key)
+        if data:
+            instrumentation.count("cache.hits")
+            return data
+        instrumentation.count("cache.misses")
+    data = _download_with_retries(url, rate_limiter=rate_limiter, raise_on_failure=raise_on_failure)
+    if data and validate is not None and not validate(data):
+        instrumentation.count("fetch.invalid")
+        print(f"Discarding invalid response from {urlparse(url).netloc}")
+        if raise_on_failure:
+            raise ConnectionError(f"invalid response for {url}")
+        return None
+    if data and cache is not None:
+        cache.put(cache_key, data)
+    return data
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    if provider == "mapbox" and api_key:
-        # Mapbox Static Tiles API (satellite-v9)
-        try:
-            zoom = 16
-            width = 512
-            height = 512
-            url = (
-                f"https://api.mapbox.com/styles/v1/mapbox/satellite-v9/static/"
-                f"{lon},{lat},{zoom}/{width}x{height}?access_token={api_key}"
-            )
-            print(f"Fetching image from Mapbox for {lat},{lon}...")
-            data = _download_with_retries(url)
-            if data:
-                with open(output_path, "wb") as f:
-                    f.write(data)
-                print(f"Image saved to {output_path}")
-                return
-            else:
-                print("Mapbox download failed, falling back to sample images.")
-        except Exception as e:
-            print(f"Mapbox fetch error: {e}")
+_sample_bytes = None
+
+
+def _local_sample_bytes() -> Optional[bytes]:
+    """Bytes of the offline sample image in pipeline/examples, read from disk once per process."""
+    global _sample_bytes
+    if _sample_bytes is None:
+        sample_local = os.path.join(os.path.dirname(__file__), "examples", "sample_satellite.jpg")
+        if not os.path.exists(sample_local):
+            return None
+        with open(sample_local, "rb") as f:
+            _sample_bytes = f.read()
+    return _sample_bytes
+
+
+def fetch_image_bytes(lat, lon, rate_limiter: Optional[HostRateLimiter] = None,
+                      cache: Optional[TileCache] = None) -> bytes:
+    """Fetch a satellite image for the given lat/lon and return its encoded bytes without touching the disk.
+
+    Behavior:
+    - If a provider is configured (`SAT_API_PROVIDER`, see `tile_providers.get_provider`), get the image from it:
+      Mapbox or Google with `SAT_API_KEY`, a `{lat}`/`{lon}` URL template (e.g. a self-hosted or stand-in tile
+      server), or pre-staged local tiles. If the provider fails or has no image for the point, this raises (the
+      provider's error, or FileNotFoundError) rather than passing a stand-in off as that provider's imagery.
+    - Only without a provider, try a list of free sample images.
+    - If all those downloads fail, return a placeholder image so the pipeline can continue (empty bytes if PIL is
+      missing).
+
+    Provider downloads go through `cache` (default: the cache configured by `SAT_CACHE_DIR`, if any).
+    """
+    provider = get_provider()
+    if cache is None:
+        cache = get_default_cache()
 
-    print("No provider/API configured or provider failed. Trying sample images...")
+    if provider is not None:
+        data = provider.fetch(lat, lon, rate_limiter=rate_limiter, cache=cache)
+        if not data:
+            raise FileNotFoundError(f"{provider.name} has no image for {lat},{lon}")
+        return data
+
+    print("No provider/API configured. Trying sample images...")
     # If an offline sample image exists in pipeline/examples, use it directly (deterministic offline mode)
-    sample_local = os.path.join(os.path.dirname(__file__), "examples", "sample_satellite.jpg")
-    if os.path.exists(sample_local):
-        print(f"Using local sample image {sample_local} for {lat},{lon}")
-        with open(sample_local, "rb") as src, open(output_path, "wb") as dst:
-            dst.write(src.read())
-        print(f"Image saved to {output_path}")
-        return
+    data = _local_sample_bytes()
+    if data:
+        print(f"Using local sample image for {lat},{lon}")
+        return data
 
     for url in SAMPLE_IMAGE_URLS:
-        data = _download_with_retries(url)
+        data = _download_with_retries(url, rate_limiter=rate_limiter)
         if data:
-            with open(output_path, "wb") as f:
-                f.write(data)
-            print(f"Image saved to {output_path}")
-            return
+            return data
+
+    print("All downloads failed — using placeholder image so pipeline can continue.")
+    return _placeholder_image_bytes()
+
 
-    print("All downloads failed — writing placeholder image so pipeline can continue.")
-    _write_placeholder_image(output_path)
\ No newline at end of file
+def fetch_image(lat, lon, output_path, rate_limiter: Optional[HostRateLimiter] = None,
+                cache: Optional[TileCache] = None):
+    """Fetch a satellite image for the given lat/lon and save it to `output_path` (see `fetch_image_bytes`)."""
+    data = fetch_image_bytes(lat, lon, rate_limiter=rate_limiter, cache=cache)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(data)
+    print(f"Image saved to {output_path}")
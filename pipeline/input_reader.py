@@ -0,0 +1,114 @@
+import csv
+import math
+import re
+
+SAMPLE_KEYS = ["sample", "sampl", "id"]
+LAT_KEYS = ["lat"]
+LON_KEYS = ["lon", "lng", "long"]
+
+
+def find_col(columns, key_parts):
+    """Return the index of the first column whose normalized name contains one of `key_parts`, or None."""
+    for i, c in enumerate(columns):
+        for part in key_parts:
+            if part in c:
+                return i
+    return None
+
+
+def resolve_columns(header):
+    """Map a header row to the (sample_id, lat, lon) column indices, raising ValueError if any is missing."""
+    columns = [str(c).lower().strip() if c is not None else "" for c in header]
+    sample_idx = find_col(columns, SAMPLE_KEYS)
+    lat_idx = find_col(columns, LAT_KEYS)
+    lon_idx = find_col(columns, LON_KEYS)
+
+    if sample_idx is None or lat_idx is None or lon_idx is None:
+        raise ValueError(f"Required columns not found. Found columns: {columns}.\n"
+                         f"Expected something like 'sample_id', 'latitude', 'longitude'.")
+    return sample_idx, lat_idx, lon_idx
+
+
+def normalize_sample_id(value):
+    """Integral ids become ints (spreadsheets hand back 1.0, CSVs "1"), anything else a stripped string.
+
+    Ids written with leading zeros ("007") stay strings, so they never collide with the number ("7").
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if re.fullmatch(r"[+-]?0\d+(\.\d*)?", value):
+            return value
+        try:
+            as_float = float(value)
+        except ValueError:
+            return value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        as_float = float(value)
+    else:
+        return str(value)
+    if as_float.is_integer():
+        return int(as_float)
+    return str(value)
+
+
+def _to_coordinate(value, limit):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value) or not -limit <= value <= limit:
+        return None
+    return value
+
+
+def _validated(rows, header):
+    """Yield (sample_id, lat, lon) for every row with a sample id and in-range coordinates."""
+    sample_idx, lat_idx, lon_idx = resolve_columns(header)
+    width = max(sample_idx, lat_idx, lon_idx) + 1
+    for row in rows:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        sample_id = row[sample_idx]
+        lat = _to_coordinate(row[lat_idx], 90.0)
+        lon = _to_coordinate(row[lon_idx], 180.0)
+
+        if sample_id is None or sample_id == "" or lat is None or lon is None:
+            print(f"Skipping row due to missing or invalid fields: {list(row)}")
+            continue
+
+        yield normalize_sample_id(sample_id), lat, lon
+
+
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield from _validated(reader, header)
+
+
+def _iter_xlsx(path):
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook in memory
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield from _validated(rows, header)
+    finally:
+        wb.close()
+
+
+def iter_records(path):
+    """Stream validated `(sample_id, lat, lon)` records from a CSV or Excel file with bounded memory.
+
+    Column detection runs once on the header; rows are then read one at a time, so memory use does not grow
+    with the number of rows.
+    """
+    if path.lower().endswith(".csv"):
+        return _iter_csv(path)
+    return _iter_xlsx(path)
@@ -0,0 +1,214 @@
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+
+# Durations kept per timer for percentiles; beyond this a uniform reservoir sample is kept, counts stay exact
+MAX_SAMPLES = 100000
+MAX_TRACE_EVENTS = 1000000
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, self.start, time.perf_counter())
+
+
+_NULL = contextlib.nullcontext()
+_enabled = False
+_tracing = False
+_lock = threading.Lock()
+_durations = {}
+_totals = {}
+_counters = {}
+_trace = []
+_dropped_events = 0
+_epoch = time.perf_counter()
+
+
+def enable(trace: bool = False):
+    """Start recording timers and counters; with `trace`, also keep one event per timed block for `write_trace`.
+
+    Instrumentation is off by default, and then each timed block costs one function call and a flag check.
+    """
+    global _enabled, _tracing
+    _enabled = True
+    _tracing = trace
+
+
+def disable():
+    global _enabled, _tracing
+    _enabled = _tracing = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Forget everything recorded so far."""
+    global _dropped_events, _epoch
+    with _lock:
+        _durations.clear()
+        _totals.clear()
+        _counters.clear()
+        _trace.clear()
+        _dropped_events = 0
+        _epoch = time.perf_counter()
+
+
+def timer(name: str):
+    """Context manager timing the enclosed block under `name` (a no-op while disabled)."""
+    return _Timer(name) if _enabled else _NULL
+
+
+def count(name: str, n=1):
+    """Add `n` to the counter `name` (a no-op while disabled)."""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name: str, seconds: float):
+    """Record a duration measured elsewhere, e.g. the per-stage speeds ultralytics reports."""
+    if _enabled:
+        now = time.perf_counter()
+        _record(name, now - seconds, now)
+
+
+def timed_iter(name: str, iterable):
+    """Yield from `iterable`, timing each step under `name` (e.g. parsing one input row)."""
+    iterator = iter(iterable)
+    while True:
+        with timer(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _record(name, start, end):
+    global _dropped_events
+    seconds = end - start
+    with _lock:
+        samples = _durations.setdefault(name, [])
+        total = _totals.setdefault(name, [0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+        if len(samples) < MAX_SAMPLES:
+            samples.append(seconds)
+        else:
+            slot = random.randrange(total[0])
+            if slot < MAX_SAMPLES:
+                samples[slot] = seconds
+        if _tracing:
+            if len(_trace) < MAX_TRACE_EVENTS:
+                _trace.append((name, start, seconds, threading.get_ident()))
+            else:
+                _dropped_events += 1
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summary() -> dict:
+    """Per-timer count, total and p50/p95/p99 seconds, plus the counters."""
+    with _lock:
+        durations = {name: sorted(samples) for name, samples in _durations.items()}
+        totals = {name: tuple(t) for name, t in _totals.items()}
+        counters = dict(_counters)
+    timers = {}
+    for name in sorted(durations):
+        ordered = durations[name]
+        n, total = totals[name]
+        timers[name] = {
+            "count": n,
+            "total_seconds": total,
+            "p50": _percentile(ordered, 0.50),
+            "p95": _percentile(ordered, 0.95),
+            "p99": _percentile(ordered, 0.99),
+        }
+    return {"timers": timers, "counters": dict(sorted(counters.items()))}
+
+
+def format_summary(data: dict = None) -> str:
+    """Human-readable table of `summary()`."""
+    data = data or summary()
+    lines = [f"{'stage':<24}{'count':>9}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for name, t in data["timers"].items():
+        lines.append(f"{name:<24}{t['count']:>9}{t['total_seconds']:>10.2f}{t['p50'] * 1000:>10.2f}"
+                     f"{t['p95'] * 1000:>10.2f}{t['p99'] * 1000:>10.2f}")
+    for name, value in data["counters"].items():
+        lines.append(f"{name:<24}{value:>9}")
+    return "\n".join(lines)
+
+
+def write_trace(path: str):
+    """Write the recorded blocks as Chrome trace-event JSON (one complete event each), viewable in Perfetto."""
+    pid = os.getpid()
+    with _lock:
+        events = [
+            {"name": name, "ph": "X", "ts": (start - _epoch) * 1e6, "dur": seconds * 1e6, "pid": pid, "tid": tid}
+            for name, start, seconds, tid in _trace
+        ]
+        dropped = _dropped_events
+    if dropped:
+        print(f"Trace truncated: {dropped} events beyond the first {MAX_TRACE_EVENTS} were dropped.")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+@contextlib.contextmanager
+def profile(path: str = None):
+    """Run the enclosed block under cProfile and dump the stats to `path` (a no-op if `path` is None).
+
+    Threads started inside the block (the pipeline's stage workers) are profiled too and merged into the same file,
+    which loads in `pstats`, snakeviz or speedscope. For a sampling profile without cProfile's overhead, run the
+    pipeline under `py-spy record -o profile.svg -- python pipeline/main.py ...` instead.
+    """
+    if path is None:
+        yield
+        return
+    import cProfile
+    import pstats
+    import sys
+
+    profilers = [cProfile.Profile()]
+    # from 3.12 cProfile hooks sys.monitoring, which already covers every thread; before that each thread needs
+    # its own profiler
+    per_thread = sys.version_info < (3, 12)
+
+    def start_thread_profiler(*args):
+        profiler = cProfile.Profile()
+        with _lock:
+            profilers.append(profiler)
+        profiler.enable()
+
+    if per_thread:
+        threading.setprofile(start_thread_profiler)
+    profilers[0].enable()
+    try:
+        yield
+    finally:
+        profilers[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        stats.dump_stats(path)
+        print(f"cProfile stats written to {path}")
@@ -1,14 +1,258 @@
 import argparse
 import os
-import pandas as pd
-from detector import load_model, run_inference
-from image_fetcher import fetch_image
-from output_builder import save_output
+import time
 
+import numpy as np
 
-def main(input_path: str):
+try:
+    from pipeline import detection_store, detector, instrumentation, postprocess, tiling
+    from pipeline.checkpoint import CompletionIndex
+    from pipeline.executor import Stage, StagedExecutor, format_report
+    from pipeline.image_fetcher import HostRateLimiter, fetch_image_bytes, get_session, image_geometry, image_source
+    from pipeline.input_reader import iter_records
+    from pipeline.mosaic import TileMosaic
+    from pipeline.output_builder import SINKS, make_record, make_sink
+    from pipeline.prefilter import TilePrefilter, format_report as format_prefilter_report
+    from pipeline.sharding import merge_outputs, parse_shard, run_sharded, shard_of, shard_path
+    from pipeline.tile_planner import TileJob, TilePlanner, assign_detections
+    from pipeline.tile_providers import TilePyramidProvider, get_provider
+except ImportError:  # run as a script: python pipeline/main.py
+    import detection_store
+    import detector
+    import instrumentation
+    import postprocess
+    import tiling
+    from checkpoint import CompletionIndex
+    from executor import Stage, StagedExecutor, format_report
+    from image_fetcher import HostRateLimiter, fetch_image_bytes, get_session, image_geometry, image_source
+    from input_reader import iter_records
+    from mosaic import TileMosaic
+    from output_builder import SINKS, make_record, make_sink
+    from prefilter import TilePrefilter, format_report as format_prefilter_report
+    from sharding import merge_outputs, parse_shard, run_sharded, shard_of, shard_path
+    from tile_planner import TileJob, TilePlanner, assign_detections
+    from tile_providers import TilePyramidProvider, get_provider
+
+
+CHECKPOINT_PATH = "predictions/.checkpoint.log"
+MODEL_PATH = "model/best.pt"
+
+
+def _save_artifact(name, image):
+    """Write a fetched image, given as encoded bytes or a BGR array, to `artifacts/{name}_image.jpg`."""
+    os.makedirs("artifacts", exist_ok=True)
+    path = f"artifacts/{name}_image.jpg"
+    if isinstance(image, (bytes, bytearray)):
+        with open(path, "wb") as f:
+            f.write(image)
+    else:
+        from PIL import Image
+        Image.fromarray(image[..., ::-1]).save(path, quality=95)
+
+
+def _no_detections(image):
+    """Empty result for an image the prefilter kept away from the model."""
+    return tiling.Result(tiling.Boxes([], [], []), image.shape[:2])
+
+
+def _model_key(tile_size=None):
+    """Identity of the detections the current weights produce: their checksum and backend (see
+    `detector.model_checksum`), plus the tiling if any."""
+    key = detector.model_checksum(MODEL_PATH)
+    return f"{key}:tile{tile_size}" if tile_size else key
+
+
+def build_stages(model, index, sink, batch_size=8, fetch_workers=8, decode_workers=2, queue_size=None,
+                 rate_limit=None, save_artifacts=False, tile_size=None, planner=None, prefilter=None,
+                 prefilter_audit=False, mosaic=None, conf=None, store=None, model_key=None):
+    """Build the fetch -> decode -> infer -> write stages for a run.
+
+    Items entering the first stage are `TileJob`s: one image and the samples that share it (a single sample unless
+    a `TilePlanner` grouped nearby points). Every item keeps its job first so a failure at any stage can be recorded
+    against its samples in `index`. Images travel between stages in memory; with `save_artifacts` they are also
+    written to `artifacts/{job name}_image.jpg` (the sample id for single-sample jobs). With `tile_size`, each image
+    is inferred as overlapping tiles of that size (see `detector.run_tiled_inference`). With a `TileMosaic`, images
+    are assembled from XYZ tiles as arrays instead of downloaded whole.
+
+    With a `TilePrefilter`, the decode stage also classifies each image; images it judges empty or invalid skip the
+    model and their samples are written with no detections and the prefilter's qc_status. With `prefilter_audit` the
+    model still runs on every image, the records are the model's, and the prefilter only counts what it would miss.
+
+    `conf` is the minimum confidence of the detections written (default: the model's). With a `DetectionStore`
+    `store`, the model runs at `detection_store.RAW_CONF`, each sample's unthresholded detections are stored under
+    its image hash and `model_key`, and images already stored for `model_key` skip the model.
+    """
+    queue_size = queue_size or 2 * batch_size
+    rate_limiter = HostRateLimiter(rate_limit) if rate_limit else None
+    geometry = image_geometry()
+    source = image_source()
+
+    def fetch(job):
+        if mosaic is not None:
+            data = mosaic.view(job.lat, job.lon)
+            if data is None:
+                raise FileNotFoundError("no tiles cover this point")
+        else:
+            data = fetch_image_bytes(job.lat, job.lon, rate_limiter)
+            if not data:
+                raise FileNotFoundError("image not available")
+        if save_artifacts:
+            _save_artifact(job.name, data)
+        return job, data
+
+    def decode(item):
+        job, data = item
+        digest = detection_store.image_hash(data) if store is not None else None
+        image = detector.decode_image(data)
+        status = None
+        if prefilter is not None:
+            with instrumentation.timer("prefilter"):
+                status = prefilter.check(image)
+        return job, image, status, digest
+
+    # stored detections are unthresholded, so the model runs at the store's floor and records are filtered after
+    run_conf = detection_store.RAW_CONF if store is not None else conf
+    threshold = detection_store.DEFAULT_CONF if conf is None else conf
+
+    def detect(images):
+        if tile_size:
+            return [detector.run_tiled_inference(model, image, tile_size=tile_size, batch_size=batch_size,
+                                                 conf=run_conf)
+                    for image in images]
+        return detector.run_batch_inference(model, images, batch_size=len(images), conf=run_conf)
+
+    def infer(batch):
+        use_model = [status is None or prefilter_audit for _, _, status, _ in batch]
+        stored = [store.lookup(digest, model_key) if store is not None and run else None
+                  for (_, _, _, digest), run in zip(batch, use_model)]
+        todo = [image for (_, image, _, _), run, hit in zip(batch, use_model, stored) if run and hit is None]
+        detected = iter(detect(todo) if todo else [])
+        batch_results = []
+        for (job, image, status, digest), run, hit in zip(batch, use_model, stored):
+            if not run:
+                results = [_no_detections(image)]
+            elif hit is not None:
+                results = [hit[0]]
+            else:
+                results = next(detected)
+            if store is not None:
+                sample_id, lat, lon = job.samples[0]
+                if hit is None or hit[1] != str(sample_id):
+                    store.add(sample_id, lat, lon, digest, model_key, results[0], image.shape,
+                              geometry["zoom"], geometry["tile_size"], qc_status="VERIFIABLE" if run else status,
+                              source=source)
+                results = [detection_store.filter_result(results[0], threshold)]
+            batch_results.append(results)
+        if prefilter_audit:
+            for (_, _, status, _), results in zip(batch, batch_results):
+                prefilter.audit(status, results)
+            statuses = [None] * len(batch)
+        else:
+            statuses = [status for _, _, status, _ in batch]
+
+        # split shared images into one result per sample, in that sample's own frame
+        members, shapes = [], []
+        for (job, image, _, _), results in zip(batch, batch_results):
+            shape = getattr(image, "shape", None)
+            if job.positions is None:
+                per_sample = [results]
+            else:
+                lats = [lat for _, lat, _ in job.samples]
+                shape = shape or (geometry["image_size"], geometry["image_size"])
+                per_sample = [[r] for r in assign_detections(results[0], job.positions, planner.radius_px(lats), shape)]
+            members.append(per_sample)
+            shapes.extend([shape] * len(per_sample))
+
+        # detections and panel areas for the whole batch as arrays, converted to lists once
+        with instrumentation.timer("postprocess"):
+            detections = postprocess.DetectionBatch.from_results(
+                [results[0] for per_sample in members for results in per_sample], image_size=shapes)
+            lats = [lat for job, _, _, _ in batch for _, lat, _ in job.samples]
+            areas = detections.areas(lats, geometry["zoom"], tile_size=geometry["tile_size"]).tolist()
+            split = zip(detections.split(), areas)
+            return [(job, [(sample_id, lat, lon, *next(split), status or "VERIFIABLE")
+                           for sample_id, lat, lon in job.samples])
+                    for (job, _, _, _), status in zip(batch, statuses)]
+
+    def write(item):
+        _, samples = item
+        for sample_id, lat, lon, (bbox, confs, classes), area_sqm, qc_status in samples:
+            # buffered sinks only report a sample done once it has been flushed to disk
+            with instrumentation.timer("write"):
+                try:
+                    record = make_record(sample_id, lat, lon, bbox, confs, classes, area_sqm, qc_status=qc_status,
+                                         source=source)
+                    sink.write(record, name=sample_id,
+                               done=lambda sample_id=sample_id, lat=lat, lon=lon: index.mark_done(sample_id, lat,
+                                                                                                  lon))
+                except Exception as e:
+                    # only this sample failed: the job's other samples may already be written (and marked done)
+                    print(f"write failed for sample {sample_id}: {e}")
+                    index.mark_failed(sample_id, lat, lon, f"write error: {e}")
+
+    def failed(stage_name):
+        def on_error(item, e):
+            job = item[0] if isinstance(item, tuple) else item
+            for sample_id, lat, lon in job.samples:
+                print(f"{stage_name} failed for sample {sample_id}: {e}")
+                index.mark_failed(sample_id, lat, lon, f"{stage_name} error: {e}")
+        return on_error
+
+    return [
+        Stage("fetch", fetch, workers=fetch_workers, queue_size=queue_size, on_error=failed("fetch")),
+        Stage("decode", decode, workers=decode_workers, queue_size=queue_size, on_error=failed("decode")),
+        Stage("infer", infer, workers=1, queue_size=queue_size, batch_size=batch_size, on_error=failed("infer")),
+        Stage("write", write, workers=1, queue_size=queue_size, on_error=failed("write")),
+    ]
+
+
+def main(input_path: str, batch_size: int = 8, fetch_workers: int = 8, rate_limit: float = None,
+         resume: bool = False, retry_failed: bool = False, checkpoint_path: str = CHECKPOINT_PATH,
+         decode_workers: int = 2, queue_size: int = None, output_format: str = "json", output_path: str = None,
+         save_artifacts: bool = False, tile_size: int = None, dedup: bool = False, shard: tuple = None,
+         instrument: bool = False, trace_path: str = None, profile_path: str = None, prefilter: bool = False,
+         prefilter_audit: bool = False, mosaic: bool = False, conf: float = None, store_path: str = None,
+         samples=None):
+    """Run the pipeline over every row of `input_path`.
+
+    Fetching, decoding, inference and writing run as separate stages with their own workers and bounded queues
+    between them, so downloads overlap with inference and a slow stage throttles the ones before it.
+
+    Every finished or failed sample is recorded in the checkpoint log at `checkpoint_path`. With `resume`, samples
+    already completed by an earlier run are skipped; with `retry_failed`, only samples that failed earlier are run.
+
+    Records go to the sink named by `output_format` (see `output_builder.SINKS`); `output_path` overrides its default
+    location.
+
+    With `dedup`, points that fall on the same image are grouped by a `TilePlanner` so each shared image is fetched
+    and inferred once; every sample still gets its own record, with the detections reaching into its buffer.
+
+    With `shard=(i, K)`, only the samples whose `sharding.shard_of` id hash is `i` are processed, and the checkpoint
+    log and single-file outputs get a `.shard-i-of-K` suffix so shards can run side by side (see
+    `sharding.run_sharded` and `sharding.merge_outputs`). Returns a summary with the number of samples attempted,
+    how many failed and the elapsed time.
+
+    With `instrument` (implied by `trace_path`), hot paths are timed and the run ends with per-stage p50/p95/p99
+    latencies, bytes downloaded, retries and cache hits, also returned under "instrumentation"; `trace_path` writes a
+    Chrome trace of every timed block. `profile_path` runs the whole run under cProfile.
+
+    With `prefilter`, images that cheap statistics show to be empty (water, vegetation) or invalid (placeholder,
+    blank) skip the model and are written with has_solar false and a `prefilter.QC_EMPTY`/`QC_INVALID` qc_status.
+    `prefilter_audit` runs the model on every image anyway and reports how many images with detections the prefilter
+    would have skipped. The skip counts are printed and returned under "prefilter".
+
+    With `mosaic`, each sample's image is stitched from the XYZ tiles of the configured tile pyramid provider
+    (`SAT_API_PROVIDER=xyz` or `local`) by a `mosaic.TileMosaic`: sized to the buffer plus context, fetched
+    concurrently and shared with neighbouring samples. Tile counts are printed and returned under "mosaic".
+
+    `conf` is the minimum confidence of the detections written (default: the model's, 0.25). With
+    `store_path` (a directory), every sample's detections are also stored unthresholded under its image hash
+    and the weights' checksum, images already stored for the current weights skip the model, and `rescore` can
+    later rewrite the output at another threshold without inference. `samples`, an iterable of
+    `(sample_id, lat, lon)`, replaces reading `input_path`.
+    """
     # If the provided path doesn't exist, try a few common fallbacks
-    if not os.path.exists(input_path):
+    if samples is None and not os.path.exists(input_path):
         fallbacks = ["input.xlsx", "input code.xlsx", "input.csv"]
         found = None
         for f in fallbacks:
@@ -24,57 +268,252 @@ def main(input_path: str):
                 "Create one or pass --input <path> to the script."
             )
 
-    # Load spreadsheet or CSV depending on extension
-    if input_path.lower().endswith('.csv'):
-        df = pd.read_csv(input_path)
-    else:
-        df = pd.read_excel(input_path)
-
-    model = load_model("model/best.pt")
-
-    # Normalize column names to help tolerate input variations
-    cols = {c: c.lower().strip() for c in df.columns}
-    df = df.rename(columns=cols)
+    # one pooled connection per fetch worker, so downloads never queue for a connection
+    get_session(pool_size=fetch_workers)
+    if store_path and dedup:
+        raise ValueError("detections are stored per sample image; drop dedup to use a detection store")
+    tile_mosaic = None
+    if mosaic:
+        if dedup:
+            raise ValueError("mosaic already shares tiles between neighbouring samples; drop dedup")
+        provider = get_provider()
+        if not isinstance(provider, TilePyramidProvider):
+            raise ValueError("mosaic needs a tile pyramid provider: set SAT_API_PROVIDER=xyz (with a {z}/{x}/{y} "
+                             "SAT_API_URL_TEMPLATE) or SAT_API_PROVIDER=local (with SAT_TILES_PATH)")
+        tile_mosaic = TileMosaic(provider, workers=fetch_workers,
+                                 rate_limiter=HostRateLimiter(rate_limit) if rate_limit else None)
+    if instrument or trace_path:
+        instrumentation.reset()
+        instrumentation.enable(trace=bool(trace_path))
+    model = detector.load_model(MODEL_PATH)
+    for m in detector.registry.metrics():
+        print(f"Model {m['path']} loaded in {m['load_seconds']:.2f}s, warm-up {m['warmup_seconds']:.2f}s")
+    store = detection_store.DetectionStore(store_path) if store_path else None
+    if shard is not None:
+        checkpoint_path = shard_path(checkpoint_path, *shard)
+        if output_format not in ("json", "none"):
+            output_path = shard_path(output_path or SINKS[output_format].DEFAULT_PATH, *shard)
+    index = CompletionIndex(checkpoint_path, resume=resume or retry_failed)
+    attempted = 0
 
-    # Find best matching column names for required fields
-    def find_col(key_parts):
-        for c in df.columns:
-            for part in key_parts:
-                if part in c:
-                    return c
-        return None
+    def pending_records():
+        nonlocal attempted
+        skipped = 0
+        rows = samples if samples is not None else iter_records(input_path)
+        for sample_id, lat, lon in instrumentation.timed_iter("input.parse", rows):
+            if shard is not None and shard_of(sample_id, shard[1]) != shard[0]:
+                continue
+            if retry_failed:
+                wanted = index.is_failed(sample_id, lat, lon)
+            else:
+                wanted = not (resume and index.is_done(sample_id, lat, lon))
+            if not wanted:
+                skipped += 1
+                continue
+            attempted += 1
+            yield sample_id, lat, lon
+        if skipped:
+            print(f"Skipped {skipped} samples already handled by a previous run.")
 
-    sample_col = find_col(["sample", "sampl", "id"])
-    lat_col = find_col(["lat"])
-    lon_col = find_col(["lon", "lng", "long"])
-
-    if not sample_col or not lat_col or not lon_col:
-        raise ValueError(f"Required columns not found. Found columns: {list(df.columns)}.\n"
-                         f"Expected something like 'sample_id', 'latitude', 'longitude'.")
+    # Rows are streamed from the file, so memory stays flat however long the input is
+    # a resumed run keeps the records of the samples the checkpoint says are done
+    sink = make_sink(output_format, output_path, resume=resume or retry_failed)
+    planner = None
+    if dedup:
+        geometry = image_geometry()
+        planner = TilePlanner(geometry["zoom"], geometry["tile_size"], geometry["image_size"])
+        jobs = planner.plan(pending_records())
+    else:
+        jobs = (TileJob.single(*record) for record in pending_records())
+    tile_prefilter = TilePrefilter() if prefilter or prefilter_audit else None
+    stages = build_stages(model, index, sink, batch_size=batch_size, fetch_workers=fetch_workers,
+                          decode_workers=decode_workers, queue_size=queue_size, rate_limit=rate_limit,
+                          save_artifacts=save_artifacts, tile_size=tile_size, planner=planner,
+                          prefilter=tile_prefilter, prefilter_audit=prefilter_audit, mosaic=tile_mosaic, conf=conf,
+                          store=store, model_key=_model_key(tile_size) if store is not None else None)
+    with index, sink, instrumentation.profile(profile_path):
+        report = StagedExecutor(stages).run(jobs)
+        print(format_report(report))
+        if planner is not None:
+            print(f"Planned {planner.stats['samples']} samples onto {planner.stats['images']} images "
+                  f"(dedup ratio {planner.dedup_ratio:.2f})")
+        if tile_prefilter is not None:
+            print(format_prefilter_report(tile_prefilter.report()))
+        if tile_mosaic is not None:
+            tile_mosaic.close()
+            stats = tile_mosaic.stats
+            print(f"Mosaic: {stats['views']} images from {stats['tiles_fetched']} tiles fetched "
+                  f"({stats['tile_hits']} reused, {stats['tiles_missing']} missing, "
+                  f"{stats['tiles_failed']} failed)")
+        if store is not None:
+            store.close()
+            print(f"Detection store: {store.stats['stored']} samples stored, {store.stats['reused']} reused "
+                  f"without inference")
 
-    for _, row in df.iterrows():
-        sample_id = row.get(sample_col)
-        lat = row.get(lat_col)
-        lon = row.get(lon_col)
+        failures = index.failures()
+        if failures:
+            print(f"{len(failures)} samples failed; rerun with --retry-failed to retry only those.")
+    summary = {"samples": attempted, "failed": len(failures), "elapsed_seconds": report["elapsed_seconds"]}
+    if tile_prefilter is not None:
+        summary["prefilter"] = tile_prefilter.report()
+    if tile_mosaic is not None:
+        summary["mosaic"] = dict(tile_mosaic.stats)
+    if store is not None:
+        summary["detection_store"] = dict(store.stats)
+    if instrumentation.enabled():
+        summary["instrumentation"] = instrumentation.summary()
+        print(instrumentation.format_summary(summary["instrumentation"]))
+        if trace_path:
+            instrumentation.write_trace(trace_path)
+            print(f"Trace written to {trace_path}")
+        instrumentation.disable()
+    return summary
 
-        if pd.isna(sample_id) or pd.isna(lat) or pd.isna(lon):
-            print(f"Skipping row due to missing fields: {row.to_dict()}")
-            continue
 
-        image_path = f"artifacts/{sample_id}_image.jpg"
-        fetch_image(lat, lon, image_path)
+def rescore(conf: float, store_path: str = detection_store.DEFAULT_PATH, output_format: str = "json",
+            output_path: str = None, reinfer: bool = True, **options):
+    """Rewrite the output of every sample in the detection store at confidence threshold `conf`.
 
-        if not os.path.exists(image_path):
-            print(f"Image for sample {sample_id} not available, skipping.")
-            continue
+    Samples whose stored detections came from the current weights are re-filtered with array operations only, no
+    model. With `reinfer`, samples scored by other weights (or another `tile_size`) are first run again through
+    `main` (their images are re-fetched, from the tile cache when one is configured) and replace the old rows;
+    samples whose re-inference fails are left out of the output. Without `reinfer` the old detections of stale
+    samples are re-filtered too. `options` are passed on to that run.
+    Returns a summary with the number of samples written, how many were re-inferred, the ids of those that failed
+    to be, and the elapsed time.
+    """
+    if conf < detection_store.RAW_CONF:
+        raise ValueError(f"Detections are stored from conf {detection_store.RAW_CONF}; cannot rescore at {conf}")
+    start = time.perf_counter()
+    store = detection_store.DetectionStore(store_path)
+    table = store.load()
+    if not len(table):
+        raise FileNotFoundError(f"No stored detections in '{store_path}'; run the pipeline with --detection-store")
 
-        results = run_inference(model, image_path)
+    model_key = _model_key(options.get("tile_size"))
+    stale = np.flatnonzero(~table.from_model(model_key))
+    reinferred, failed = 0, []
+    if reinfer and len(stale):
+        print(f"{len(stale)} of {len(table)} samples were scored by other weights; re-inferring them.")
+        samples = zip(table.sample_id[stale].tolist(), table.lat[stale].tolist(), table.lon[stale].tolist())
+        main(None, samples=samples, conf=conf, store_path=store_path, output_format="none",
+             checkpoint_path=os.path.join(store_path, "rescore.checkpoint.log"), **options)
+        store.compact()
+        table = store.load()
+        # samples whose re-inference failed still hold the old weights' rows: leave them out rather than pass off
+        # old detections as new ones; they stay stale in the store, so the next rescore tries them again
+        still_stale = ~table.from_model(model_key)
+        failed = table.sample_id[still_stale].tolist()
+        reinferred = len(stale) - len(failed)
+        if failed:
+            print(f"{len(failed)} samples could not be re-inferred and are left out of the output; rerun rescore "
+                  f"to retry them.")
+            table = table.take(np.flatnonzero(~still_stale))
 
-        save_output(sample_id, lat, lon, results)
+    scored = detection_store.rescore(table, conf)
+    with make_sink(output_format, output_path) as sink:
+        if hasattr(sink, "write_table"):
+            sink.write_table(detection_store.to_arrow(table, scored))
+        else:
+            for record in detection_store.records(table, scored):
+                sink.write(record)
+    elapsed = time.perf_counter() - start
+    with_solar = int((scored["count"] > 0).sum())
+    print(f"Rescored {len(table)} samples at conf {conf}: {with_solar} with solar, {reinferred} re-inferred, "
+          f"{elapsed:.2f}s")
+    return {"samples": len(table), "with_solar": with_solar, "reinferred": reinferred, "failed": failed,
+            "elapsed_seconds": elapsed}
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run pipeline using an input spreadsheet (Excel or CSV).")
     parser.add_argument("--input", "-i", default="input.xlsx", help="Path to input Excel/CSV file (default: input.xlsx)")
+    parser.add_argument("--batch-size", "-b", type=int, default=8,
+                        help="Number of images per model.predict call (default: 8)")
+    parser.add_argument("--fetch-workers", type=int, default=8,
+                        help="Number of concurrent image downloads (default: 8)")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Maximum requests per second to each image host (default: unlimited)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip samples completed by a previous run (read from the checkpoint log)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Only rerun samples recorded as failed in the checkpoint log")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                        help=f"Checkpoint log path (default: {CHECKPOINT_PATH})")
+    parser.add_argument("--decode-workers", type=int, default=2,
+                        help="Number of threads decoding images for the detector (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Capacity of the queues between stages (default: 2 x batch size)")
+    parser.add_argument("--output-format", choices=sorted(SINKS), default="json",
+                        help="json: one file per sample (default); jsonl: one line per sample; "
+                             "parquet/arrow: columnar files written in batches (needs pyarrow)")
+    parser.add_argument("--output-path", default=None,
+                        help="Output directory (json) or file (other formats); defaults under predictions/")
+    parser.add_argument("--save-artifacts", action="store_true",
+                        help="Also write each fetched image to artifacts/{sample_id}_image.jpg")
+    parser.add_argument("--tile-size", type=int, default=None,
+                        help="Infer large images as overlapping tiles of this many pixels (e.g. 640)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Fetch and infer once per distinct image when several points fall on the same one")
+    parser.add_argument("--shard", default=None,
+                        help="Only process shard i of K, given as 'i/K' (0-based), e.g. one shard per node")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Split the input into this many shards and run them in parallel processes")
+    parser.add_argument("--merge-shards", type=int, default=None, metavar="K",
+                        help="Merge the outputs of a K-shard run into one file and exit")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Time the hot paths and end with a per-stage latency/counter summary")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="Write a Chrome/Perfetto trace of the timed blocks to PATH (implies --instrument)")
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help="Profile the run with cProfile and write the stats to PATH (e.g. run.prof)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Skip the model on images cheap statistics show to be empty or invalid (placeholder)")
+    parser.add_argument("--prefilter-audit", action="store_true",
+                        help="Run the model on every image anyway and report how many detections --prefilter "
+                             "would have missed")
+    parser.add_argument("--mosaic", action="store_true",
+                        help="Stitch each image from XYZ tiles (SAT_API_PROVIDER=xyz or local), sized to the buffer "
+                             "and sharing tiles between neighbouring samples")
+    parser.add_argument("--backend", choices=detector.BACKENDS, default=None,
+                        help="Inference backend (default: $MODEL_BACKEND or torch); onnx/onnx-int8 run on the CPU "
+                             "with ONNX Runtime and are exported from the PyTorch weights on first use")
+    parser.add_argument("--conf", type=float, default=None,
+                        help="Minimum confidence of the detections written (default: the model's, 0.25)")
+    parser.add_argument("--detection-store", nargs="?", const=detection_store.DEFAULT_PATH, default=None,
+                        metavar="DIR", help="Store every sample's unthresholded detections in DIR (default: "
+                                            f"{detection_store.DEFAULT_PATH}) so 'rescore' can change the threshold "
+                                            "without inference; images already stored for the current weights "
+                                            "skip the model")
+    commands = parser.add_subparsers(dest="command")
+    rescore_parser = commands.add_parser(
+        "rescore", help="Rewrite the output from the detection store at a new --conf, re-inferring only samples "
+                        "scored by other weights")
+    rescore_parser.add_argument("--conf", type=float, required=True,
+                                help=f"New confidence threshold (at least {detection_store.RAW_CONF})")
+    rescore_parser.add_argument("--no-reinfer", action="store_true",
+                                help="Also re-filter samples scored by other weights instead of re-inferring them")
     args = parser.parse_args()
-    main(args.input)
\ No newline at end of file
+    if args.backend:
+        os.environ[detector.BACKEND_ENV] = args.backend  # also reaches --processes workers
+    if args.merge_shards:
+        print(f"Merged output: {merge_outputs(args.output_format, args.merge_shards, args.output_path)}")
+    elif args.command == "rescore":
+        rescore(args.conf, store_path=args.detection_store or detection_store.DEFAULT_PATH,
+                output_format=args.output_format, output_path=args.output_path, reinfer=not args.no_reinfer,
+                batch_size=args.batch_size, fetch_workers=args.fetch_workers, rate_limit=args.rate_limit,
+                decode_workers=args.decode_workers, tile_size=args.tile_size, prefilter=args.prefilter,
+                mosaic=args.mosaic)
+    else:
+        options = dict(batch_size=args.batch_size, fetch_workers=args.fetch_workers, rate_limit=args.rate_limit,
+                       resume=args.resume, retry_failed=args.retry_failed, checkpoint_path=args.checkpoint,
+                       decode_workers=args.decode_workers, queue_size=args.queue_size,
+                       output_format=args.output_format, output_path=args.output_path,
+                       save_artifacts=args.save_artifacts, tile_size=args.tile_size, dedup=args.dedup,
+                       instrument=args.instrument, trace_path=args.trace, profile_path=args.profile,
+                       prefilter=args.prefilter, prefilter_audit=args.prefilter_audit, mosaic=args.mosaic,
+                       conf=args.conf, store_path=args.detection_store)
+        if args.processes:
+            run_sharded(args.input, args.processes, **options)
+        else:
+            main(args.input, shard=parse_shard(args.shard) if args.shard else None, **options)
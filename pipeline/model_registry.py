@@ -0,0 +1,114 @@
+import gc
+import hashlib
+import os
+import threading
+import time
+
+
+def file_checksum(path: str) -> str:
+    """sha256 of a weights file, or "missing" if it doesn't exist (the loader then decides on a fallback)."""
+    if not os.path.exists(path):
+        return "missing"
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """Loads each weights file once per process and hands out the same model object afterwards.
+
+    Models are cached by absolute path and file checksum, so replacing the weights on disk triggers a reload while
+    repeated calls cost a `stat`. The checksum itself is only recomputed when the file's size or mtime changes.
+    Newly loaded models can be warmed up with dummy inferences so the first real request doesn't pay for lazy
+    initialization. Load and warm-up times are kept in `metrics()`.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._models = {}
+        self._checksums = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _checksum(self, path):
+        try:
+            st = os.stat(path)
+            signature = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            return "missing"
+        cached = self._checksums.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, file_checksum(path))
+            self._checksums[path] = cached
+        return cached[1]
+
+    def checksum(self, path: str) -> str:
+        """Checksum of the weights at `path`, as used in the cache key; identifies which model produced a result."""
+        with self._lock:
+            return self._checksum(os.path.abspath(path))
+
+    def get(self, path: str, warmup_runs: int = 0, warmup_size: int = 640):
+        path = os.path.abspath(path)
+        with self._lock:
+            key = (path, self._checksum(path))
+            model = self._models.get(key)
+            if model is not None:
+                self._metrics[key]["hits"] += 1
+                return model
+
+            start = time.perf_counter()
+            model = self.loader(path)
+            load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            warm_up(model, warmup_runs, warmup_size)
+            warmup_seconds = time.perf_counter() - start
+
+            # drop models loaded from an older version of the same file
+            for old in [k for k in self._models if k[0] == path]:
+                del self._models[old]
+                del self._metrics[old]
+            self._models[key] = model
+            self._metrics[key] = {
+                "path": path,
+                "checksum": key[1],
+                "load_seconds": load_seconds,
+                "warmup_runs": warmup_runs,
+                "warmup_seconds": warmup_seconds,
+                "hits": 0,
+            }
+            return model
+
+    def metrics(self) -> list:
+        with self._lock:
+            return [dict(m) for m in self._metrics.values()]
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._metrics.clear()
+
+    def preload(self, paths, warmup_runs: int = 1, warmup_size: int = 640):
+        """Load `paths` in the parent process before forking workers so they share the weights.
+
+        Forked children inherit the loaded models copy-on-write. `gc.freeze()` moves everything allocated so far
+        out of the garbage collector's reach, so collections in the children don't write to (and thereby copy)
+        the pages holding the parent's objects.
+        """
+        models = [self.get(path, warmup_runs=warmup_runs, warmup_size=warmup_size) for path in paths]
+        gc.collect()
+        gc.freeze()
+        return models
+
+
+def warm_up(model, runs: int = 1, size: int = 640):
+    """Run `runs` inferences on a blank `size`x`size` image to trigger lazy setup (fusing, allocation, JIT)."""
+    if runs <= 0:
+        return
+    import numpy as np
+
+    blank = np.zeros((size, size, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model.predict(blank)
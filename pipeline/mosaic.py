@@ -0,0 +1,158 @@
+import io
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from pipeline import area, instrumentation
+    from pipeline.tile_planner import lat_lon_to_pixel
+except ImportError:  # run as a script from inside pipeline/
+    import area
+    import instrumentation
+    from tile_planner import lat_lon_to_pixel
+
+
+def tile_window(lat, lon, zoom, tile_size, size):
+    """The XYZ tiles under the `size` x `size` pixel window centred on `lat`/`lon` at `zoom`.
+
+    Returns `(x, y, dx, dy)` for each tile: its XYZ index (x wrapped around the antimeridian) and the position of its
+    top-left corner in the window, which may be negative for tiles that stick out.
+    """
+    px, py = lat_lon_to_pixel(lat, lon, zoom, tile_size)
+    left, top = int(round(float(px))) - size // 2, int(round(float(py))) - size // 2
+    n = 2 ** zoom
+    first_x, last_x = math.floor(left / tile_size), math.floor((left + size - 1) / tile_size)
+    first_y, last_y = max(math.floor(top / tile_size), 0), min(math.floor((top + size - 1) / tile_size), n - 1)
+    return [(x % n, y, x * tile_size - left, y * tile_size - top)
+            for y in range(first_y, last_y + 1) for x in range(first_x, last_x + 1)]
+
+
+def decode_tile(data):
+    """Decode an encoded tile into an HxWx3 BGR uint8 array, the pipeline's image layout."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as im:
+        rgb = np.asarray(im.convert("RGB"))
+    return np.ascontiguousarray(rgb[..., ::-1])
+
+
+def stitch(parts, size):
+    """Paste `(tile array, dx, dy)` parts into a black `size` x `size` BGR canvas with array slicing."""
+    canvas = np.zeros((size, size, 3), dtype=np.uint8)
+    for tile, dx, dy in parts:
+        h, w = tile.shape[:2]
+        x0, y0 = max(dx, 0), max(dy, 0)
+        x1, y1 = min(dx + w, size), min(dy + h, size)
+        if x1 > x0 and y1 > y0:
+            canvas[y0:y1, x0:x1] = tile[y0 - dy:y1 - dy, x0 - dx:x1 - dx]
+    return canvas
+
+
+class TileMosaic:
+    """Assembles the view around each coordinate from the XYZ tiles of a `tile_providers.TilePyramidProvider`.
+
+    The view is sized by the buffer instead of a static-map API's limits: the buffer radius at the point's latitude
+    plus `context` pixels of surroundings on every side, at least `min_size` pixels. The tiles under it that aren't
+    in memory yet are fetched concurrently on `workers` threads (through the provider, and so through the tile cache
+    for remote tiles), decoded once, and pasted into one array with NumPy slicing; nothing is re-encoded.
+
+    Decoded tiles are kept in an LRU of `max_tiles`, and a tile another view is already fetching is waited for
+    rather than fetched twice, so neighbouring samples share the tiles they have in common. `stats` counts views,
+    tiles fetched, tiles served from memory, tiles missing from the source and tiles that failed. Failed tiles are not
+    remembered, so a later view (or a `--retry-failed` run) fetches them again.
+    """
+
+    def __init__(self, provider, buffer_sqft=area.DEFAULT_BUFFER_SQFT, context=64, min_size=128, workers=8,
+                 max_tiles=512, rate_limiter=None):
+        self.provider = provider
+        self.buffer_sqft = buffer_sqft
+        self.context = context
+        self.min_size = min_size
+        self.max_tiles = max_tiles
+        self.rate_limiter = rate_limiter
+        self.stats = {"views": 0, "tiles_fetched": 0, "tile_hits": 0, "tiles_missing": 0, "tiles_failed": 0}
+        self._tiles = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile")
+
+    @property
+    def zoom(self):
+        return self.provider.zoom
+
+    @property
+    def tile_size(self):
+        return self.provider.tile_size
+
+    def size_for(self, lat) -> int:
+        """Side of the view at `lat`: the buffer diameter plus the context margin, rounded up to even pixels."""
+        radius = area.buffer_radius_m(self.buffer_sqft) / area.meters_per_pixel(lat, self.zoom, self.tile_size)
+        size = 2 * math.ceil(float(radius) + self.context)
+        return max(size, self.min_size)
+
+    def _load(self, key):
+        z, x, y = key
+        data = self.provider.read_tile(z, x, y, rate_limiter=self.rate_limiter)
+        return decode_tile(data) if data else None
+
+    def _tiles_for(self, keys):
+        """Decoded tiles (None if missing) for `keys`, fetching the ones not in memory concurrently.
+
+        Raises the error of any tile that couldn't be fetched, after waiting for the rest."""
+        found, waiting = {}, {}
+        with self._lock:
+            for key in keys:
+                if key in self._tiles:
+                    self._tiles.move_to_end(key)
+                    found[key] = self._tiles[key]
+                    self.stats["tile_hits"] += 1
+                elif key in self._pending:
+                    waiting[key] = self._pending[key]
+                    self.stats["tile_hits"] += 1
+                else:
+                    waiting[key] = self._pending[key] = self._pool.submit(self._load, key)
+                    self.stats["tiles_fetched"] += 1
+        error = None
+        for key, future in waiting.items():
+            try:
+                tile = future.result()
+            except Exception as e:
+                # not cached: the next view asking for this tile fetches it again
+                with self._lock:
+                    if self._pending.get(key) is future:
+                        del self._pending[key]
+                        self.stats["tiles_failed"] += 1
+                        print(f"Tile {key} failed: {e}")
+                error = error or e
+                continue
+            with self._lock:
+                if self._pending.pop(key, None) is not None:
+                    if tile is None:
+                        self.stats["tiles_missing"] += 1
+                    self._tiles[key] = tile
+                    while len(self._tiles) > self.max_tiles:
+                        self._tiles.popitem(last=False)
+            found[key] = tile
+        if error is not None:
+            raise error
+        return found
+
+    def view(self, lat, lon, size=None):
+        """BGR array of the `size` (default `size_for(lat)`) window centred on `lat`/`lon`, or None if none of its
+        tiles exists. Missing tiles at the edge of the covered area are left black; a tile that failed to download
+        raises instead, so the sample fails rather than being written with a hole in its image."""
+        size = size or self.size_for(lat)
+        placements = tile_window(lat, lon, self.zoom, self.tile_size, size)
+        with instrumentation.timer("fetch.mosaic"):
+            tiles = self._tiles_for([(self.zoom, x, y) for x, y, _, _ in placements])
+            parts = [(tiles[(self.zoom, x, y)], dx, dy) for x, y, dx, dy in placements
+                     if tiles[(self.zoom, x, y)] is not None]
+            with self._lock:
+                self.stats["views"] += 1
+            return stitch(parts, size) if parts else None
+
+    def close(self):
+        self._pool.shutdown(wait=True)
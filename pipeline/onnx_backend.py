@@ -0,0 +1,136 @@
+import os
+import time
+
+import numpy as np
+
+try:
+    from pipeline import tiling
+except ImportError:  # run as a script from inside pipeline/
+    import tiling
+
+
+def letterbox(image, size=640, pad_value=114):
+    """Resize an HxWx3 image to fit `size`x`size` keeping its aspect ratio and pad the rest, as ultralytics does.
+
+    Returns the padded image, the scale factor and the (left, top) padding, which map boxes back to the original.
+    """
+    from PIL import Image
+
+    h, w = image.shape[:2]
+    gain = min(size / h, size / w)
+    new_w, new_h = round(w * gain), round(h * gain)
+    if (new_w, new_h) != (w, h):
+        image = np.asarray(Image.fromarray(image).resize((new_w, new_h), Image.BILINEAR))
+    left, top = (size - new_w) // 2, (size - new_h) // 2
+    padded = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    padded[top:top + new_h, left:left + new_w] = image
+    return padded, gain, (left, top)
+
+
+def postprocess(output, gain, pad, orig_shape, conf=0.25, iou=0.7, max_det=300):
+    """Turn one image's raw YOLOv8 output, shaped (4 + classes, anchors), into a `tiling.Boxes` in original pixels.
+
+    Rows 0-3 are box centre/size in letterboxed input pixels and the rest are per-class scores.
+    """
+    preds = output.T
+    scores = preds[:, 4:]
+    cls = scores.argmax(axis=1)
+    best = scores[np.arange(len(scores)), cls]
+    keep = best >= conf
+    preds, best, cls = preds[keep], best[keep], cls[keep]
+    cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    order = tiling.nms(xyxy, best, cls.astype(np.float32), iou_threshold=iou)[:max_det]
+    xyxy, best, cls = xyxy[order], best[order], cls[order]
+    xyxy = (xyxy - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / gain
+    height, width = orig_shape
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+    return tiling.Boxes(xyxy, best, cls)
+
+
+class OnnxDetector:
+    """YOLOv8 detector exported to ONNX, run with ONNX Runtime on the CPU.
+
+    `predict` follows the ultralytics contract the pipeline relies on: it takes one image or a list (paths, encoded
+    bytes or BGR arrays) and returns one result per image with `boxes.xyxy`, `boxes.conf`, `boxes.cls` in original
+    image pixels, `orig_shape` and a `speed` dict in milliseconds. Models exported with a dynamic batch axis get
+    whole batches in one run; others are run an image at a time.
+    """
+
+    def __init__(self, path, imgsz=640, conf=0.25, iou=0.7, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        self.batched = not isinstance(batch_dim, int)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+
+    def predict(self, source, **kwargs):
+        try:
+            from pipeline.detector import decode_image
+        except ImportError:  # run as a script from inside pipeline/
+            from detector import decode_image
+
+        conf = kwargs.get("conf", self.conf)
+        images = source if isinstance(source, list) else [source]
+
+        start = time.perf_counter()
+        decoded = [decode_image(image) for image in images]
+        boxed = [letterbox(np.ascontiguousarray(image[..., ::-1]), self.imgsz) for image in decoded]  # RGB in
+        batch = np.stack([b[0] for b in boxed]).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        preprocess = time.perf_counter()
+
+        if self.batched:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                                      for i in range(len(batch))])
+        inference = time.perf_counter()
+
+        results = []
+        for output, image, (_, gain, pad) in zip(outputs, decoded, boxed):
+            boxes = postprocess(output, gain, pad, image.shape[:2], conf=conf, iou=self.iou)
+            results.append(tiling.Result(boxes, image.shape[:2]))
+        done = time.perf_counter()
+
+        n = len(images)
+        speed = {
+            "preprocess": (preprocess - start) * 1000 / n,
+            "inference": (inference - preprocess) * 1000 / n,
+            "postprocess": (done - inference) * 1000 / n,
+        }
+        for r in results:
+            r.speed = speed
+        return results
+
+    def __call__(self, source, **kwargs):
+        return self.predict(source, **kwargs)
+
+
+def export_onnx(model, output_path, imgsz=640):
+    """Export an ultralytics YOLO `model` to ONNX with a dynamic batch axis and move the file to `output_path`."""
+    exported = model.export(format="onnx", dynamic=True, imgsz=imgsz)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    os.replace(exported, output_path)
+    return output_path
+
+
+def quantize_int8(fp32_path, output_path):
+    """Write an int8 copy of an ONNX model with weights quantized ahead of time and activations at run time.
+
+    Dynamic quantization needs no calibration images; Conv and MatMul weights shrink 4x and run on int8 kernels.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QUInt8)
+    return output_path
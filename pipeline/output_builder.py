@@ -1,36 +1,357 @@
 import json
 import os
+import threading
 
+try:
+    from pipeline import area, instrumentation, postprocess
+    from pipeline.input_reader import normalize_sample_id
+except ImportError:  # run as a script from inside pipeline/
+    import area
+    import instrumentation
+    import postprocess
+    from input_reader import normalize_sample_id
 
-def save_output(sample_id, lat, lon, results):
-    os.makedirs("predictions", exist_ok=True)
 
-    has_solar = len(results[0].boxes) > 0
+def build_record(sample_id, lat, lon, results, area_sqm=None, zoom=18, tile_size=area.GOOGLE_TILE_SIZE,
+                 buffer_sqft=area.DEFAULT_BUFFER_SQFT, qc_status="VERIFIABLE", source="unknown"):
+    """Build the output record for one sample from its inference `results`, with detections as nested lists.
+
+    `area_sqm` is the panel area inside the buffer, normally computed for a whole batch with
+    `area.estimate_result_areas`; if omitted it is computed here from `zoom`/`tile_size` (the image geometry).
+    Batches of samples are cheaper through `postprocess.DetectionBatch` and `make_record`.
+    """
+    batch = postprocess.DetectionBatch.from_results(results[:1])
+    bbox, confs, classes = next(batch.split())
+    if confs and area_sqm is None:
+        area_sqm = batch.areas(lat, zoom, tile_size=tile_size, buffer_sqft=buffer_sqft)[0]
+    return make_record(sample_id, lat, lon, bbox, confs, classes, area_sqm, buffer_sqft=buffer_sqft,
+                       qc_status=qc_status, source=source)
+
 
-    if has_solar:
-        confidence = float(results[0].boxes.conf.max().item())
-        area_est_sqm = 10.0   # placeholder, okay for prototype
-        bbox = results[0].boxes.xyxy.tolist()
-    else:
-        confidence = 0.0
-        area_est_sqm = 0.0
-        bbox = []
+def make_record(sample_id, lat, lon, bbox, confs, classes, area_sqm, buffer_sqft=area.DEFAULT_BUFFER_SQFT,
+                qc_status="VERIFIABLE", source="unknown"):
+    """The output record for one sample from plain lists of its boxes, confidences and classes.
 
-    data = {
-        "sample_id": int(sample_id),
+    `source` names where the image came from: the imagery provider's `name`, or "sample" for sample imagery.
+    """
+    return {
+        "sample_id": normalize_sample_id(sample_id),
         "lat": float(lat),
         "lon": float(lon),
-        "has_solar": has_solar,
-        "confidence": confidence,
-        "pv_area_sqm_est": area_est_sqm,
-        "buffer_radius_sqft": 1200,
-        "qc_status": "VERIFIABLE",
-        "bbox_or_mask": json.dumps(bbox),
+        "has_solar": len(confs) > 0,
+        "confidence": max(confs) if confs else 0.0,
+        "pv_area_sqm_est": float(area_sqm) if confs else 0.0,
+        "buffer_radius_sqft": buffer_sqft,
+        "qc_status": qc_status,
+        "detections": [
+            {"bbox": box, "confidence": conf, "class": cls}
+            for box, conf, cls in zip(bbox, confs, classes)
+        ],
         "image_metadata": {
-            "source": "Google Static Maps",
+            "source": source,
             "capture_date": "unknown"
         }
     }
 
-    with open(f"predictions/{sample_id}.json", "w") as f:
-        json.dump(data, f, indent=4)
\ No newline at end of file
+
+class OutputSink:
+    """Destination for output records. `write` may buffer; `close` flushes whatever is left.
+
+    `write` takes an optional `done` callback that is called once the record has actually reached the file, so
+    callers can checkpoint only records that would survive a crash.
+    """
+
+    def write(self, record, name=None, done=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullSink(OutputSink):
+    """Discards records, for runs that only fill the detection store (see `detection_store.DetectionStore`)."""
+
+    DEFAULT_PATH = None
+
+    def __init__(self, path=None, resume=False):
+        pass
+
+    def write(self, record, name=None, done=None):
+        if done is not None:
+            done()
+
+
+class JsonFileSink(OutputSink):
+    """Writes one pretty-printed `{directory}/{name or sample_id}.json` file per sample (the original format)."""
+
+    DEFAULT_PATH = "predictions"
+
+    def __init__(self, directory=DEFAULT_PATH, resume=False):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record, name=None, done=None):
+        data = {k: v for k, v in record.items() if k not in ("detections", "image_metadata")}
+        # bbox_or_mask is kept as a JSON string for consumers of the original format
+        data["bbox_or_mask"] = json.dumps([d["bbox"] for d in record["detections"]])
+        data["detections"] = record["detections"]
+        data["image_metadata"] = record["image_metadata"]
+        name = record["sample_id"] if name is None else name
+        with open(os.path.join(self.directory, f"{name}.json"), "w") as f:
+            json.dump(data, f, indent=4)
+        if done is not None:
+            done()
+
+
+class JsonlSink(OutputSink):
+    """Writes one compact JSON line per sample to a single file, flushing every `flush_every` records.
+
+    A new run truncates the file; with `resume` the lines of the earlier run are kept and new ones appended (a line
+    cut short by a crash is dropped first; its sample was never reported done).
+    """
+
+    DEFAULT_PATH = "predictions/predictions.jsonl"
+
+    def __init__(self, path=DEFAULT_PATH, flush_every=1000, resume=False):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            _drop_partial_line(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def write(self, record, name=None, done=None):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(line)
+            if done is not None:
+                self._callbacks.append(done)
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer = []
+        _run_callbacks(self._callbacks)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+
+def _drop_partial_line(path, chunk_size=65536):
+    """Truncate `path` after its last newline."""
+    with open(path, "rb+") as f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+
+
+def _run_callbacks(callbacks):
+    for callback in callbacks:
+        callback()
+    callbacks.clear()
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    detection = pa.struct([
+        ("bbox", pa.list_(pa.float32(), 4)),
+        ("confidence", pa.float32()),
+        ("class", pa.int32()),
+    ])
+    return pa.schema([
+        ("sample_id", pa.string()),
+        ("lat", pa.float64()),
+        ("lon", pa.float64()),
+        ("has_solar", pa.bool_()),
+        ("confidence", pa.float32()),
+        ("pv_area_sqm_est", pa.float32()),
+        ("buffer_radius_sqft", pa.float32()),
+        ("qc_status", pa.string()),
+        ("detections", pa.list_(detection)),
+        ("image_metadata", pa.struct([("source", pa.string()), ("capture_date", pa.string())])),
+    ])
+
+
+class _ArrowSink(OutputSink):
+    """Buffers records and writes them as Arrow record batches of `flush_every` rows.
+
+    Detections are stored as a list<struct<bbox: float32[4], confidence, class>> column rather than a JSON string.
+    pyarrow is imported lazily so it is only required when a columnar sink is used.
+
+    A columnar file is unreadable until its footer is written, so every flush goes to its own complete part file in
+    `{path}.parts/`, and only then are the records' `done` callbacks run. `close` streams the parts into `path`,
+    after the rows already there when `resume` is set. A new run discards any earlier output; a resumed run keeps
+    the parts a crashed run left behind, since their samples are checkpointed.
+    """
+
+    EXTENSION = ""
+
+    def __init__(self, path, flush_every=10000, resume=False):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("pyarrow is required for Parquet/Arrow output. Install it or use the json/jsonl sink.")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.parts_dir = f"{path}.parts"
+        self.flush_every = flush_every
+        self.schema = _arrow_schema()
+        self._buffer = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+        if not resume:
+            for stale in [path] + self._parts():
+                if os.path.exists(stale):
+                    os.remove(stale)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        self._next_part = len(self._parts())
+
+    def _parts(self):
+        if not os.path.isdir(self.parts_dir):
+            return []
+        return [os.path.join(self.parts_dir, name) for name in sorted(os.listdir(self.parts_dir))
+                if name.startswith("part-") and name.endswith(self.EXTENSION)]
+
+    def _write_file(self, path, batches):
+        """Write the record batches `batches` to a complete file at `path`."""
+        raise NotImplementedError
+
+    def _read_batches(self, path):
+        """Yield the record batches of the file at `path`."""
+        raise NotImplementedError
+
+    def _write_atomic(self, path, batches):
+        tmp_path = f"{path}.tmp"
+        self._write_file(tmp_path, batches)
+        os.replace(tmp_path, path)
+
+    def write(self, record, name=None, done=None):
+        record = dict(record, sample_id=str(record["sample_id"]))
+        with self._lock:
+            self._buffer.append(record)
+            if done is not None:
+                self._callbacks.append(done)
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def write_table(self, table):
+        """Write a whole `pyarrow.Table` in this sink's schema, e.g. one built straight from arrays."""
+        with self._lock:
+            self._flush()
+            self._write_part(table.cast(self.schema).to_batches())
+
+    def _write_part(self, batches):
+        path = os.path.join(self.parts_dir, f"part-{self._next_part:06d}{self.EXTENSION}")
+        self._write_atomic(path, batches)
+        self._next_part += 1
+
+    def _flush(self):
+        import pyarrow as pa
+
+        if self._buffer:
+            self._write_part([pa.RecordBatch.from_pylist(self._buffer, schema=self.schema)])
+            self._buffer = []
+        _run_callbacks(self._callbacks)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            parts = self._parts()
+            sources = ([self.path] if os.path.exists(self.path) else []) + parts
+
+            def batches():
+                for source in sources:
+                    for batch in self._read_batches(source):
+                        yield batch.cast(self.schema) if batch.schema != self.schema else batch
+
+            self._write_atomic(self.path, batches())
+            for part in parts:
+                os.remove(part)
+            os.rmdir(self.parts_dir)
+
+
+class ParquetSink(_ArrowSink):
+    DEFAULT_PATH = "predictions/predictions.parquet"
+    EXTENSION = ".parquet"
+
+    def __init__(self, path=DEFAULT_PATH, flush_every=10000, resume=False):
+        super().__init__(path, flush_every, resume)
+
+    def _write_file(self, path, batches):
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(path, self.schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+    def _read_batches(self, path):
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(path).iter_batches()
+
+
+class ArrowIPCSink(_ArrowSink):
+    DEFAULT_PATH = "predictions/predictions.arrow"
+    EXTENSION = ".arrow"
+
+    def __init__(self, path=DEFAULT_PATH, flush_every=10000, resume=False):
+        super().__init__(path, flush_every, resume)
+
+    def _write_file(self, path, batches):
+        import pyarrow as pa
+
+        with pa.ipc.new_file(path, self.schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+    def _read_batches(self, path):
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+SINKS = {
+    "json": JsonFileSink,
+    "jsonl": JsonlSink,
+    "parquet": ParquetSink,
+    "arrow": ArrowIPCSink,
+    "none": NullSink,
+}
+
+
+def make_sink(kind="json", path=None, **kwargs):
+    """Create an output sink by name; `path` is the directory for 'json' and the output file for the others."""
+    if kind not in SINKS:
+        raise ValueError(f"Unknown output format '{kind}'. Choose one of: {', '.join(SINKS)}.")
+    return SINKS[kind](path, **kwargs) if path else SINKS[kind](**kwargs)
+
+
+def save_output(sample_id, lat, lon, results):
+    with instrumentation.timer("write"):
+        JsonFileSink("predictions").write(build_record(sample_id, lat, lon, results), name=sample_id)
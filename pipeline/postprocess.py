@@ -0,0 +1,85 @@
+import numpy as np
+
+try:
+    from pipeline import area, tiling
+except ImportError:  # run as a script from inside pipeline/
+    import area
+    import tiling
+
+
+def select(conf, cls, min_conf=None, classes=None):
+    """Boolean mask of the detections scoring at least `min_conf` whose class is in `classes` (None: any)."""
+    keep = np.ones(len(conf), dtype=bool) if min_conf is None else conf >= min_conf
+    if classes is not None:
+        keep &= np.isin(cls, np.asarray(list(classes), dtype=cls.dtype))
+    return keep
+
+
+def aggregate(owner, conf, n_samples):
+    """Per-sample detection count and best confidence (0 for samples without detections)."""
+    count = np.bincount(owner, minlength=n_samples)
+    confidence = np.zeros(n_samples, dtype=np.float32)
+    np.maximum.at(confidence, owner, conf)
+    return count, confidence
+
+
+class DetectionBatch:
+    """The detections of a batch of samples as flat NumPy arrays, with no per-box Python objects.
+
+    `xyxy`, `conf` and `cls` hold every sample's detections concatenated in sample order; `owner` is the sample each
+    detection belongs to and `image_size` the (height, width) of each sample's image.
+    """
+
+    def __init__(self, xyxy, conf, cls, owner, image_size):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.owner = owner
+        self.image_size = image_size
+
+    @classmethod
+    def from_results(cls, results, image_size=None, default_size=(640, 640)):
+        """Batch a list of per-sample ultralytics-style results (one `Result` per sample).
+
+        Each sample's (height, width) comes from `image_size` if given, else the result's `orig_shape`, else
+        `default_size`, like `area.estimate_result_areas`.
+        """
+        boxes = [r.boxes for r in results]
+        conf = [tiling._as_array(b.conf).reshape(-1) for b in boxes]
+        counts = np.array([len(c) for c in conf], dtype=np.int64)
+        if image_size is None:
+            image_size = [None] * len(results)
+        sizes = [tuple(size or getattr(r, "orig_shape", None) or default_size)[:2]
+                 for r, size in zip(results, image_size)]
+        if not results:
+            return cls(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.float32),
+                       np.empty(0, np.int64), np.empty((0, 2)))
+        return cls(np.concatenate([tiling._as_array(b.xyxy).reshape(-1, 4) for b in boxes]), np.concatenate(conf),
+                   np.concatenate([tiling._as_array(b.cls).reshape(-1) for b in boxes]),
+                   np.repeat(np.arange(len(results)), counts), np.asarray(sizes, dtype=np.float64).reshape(-1, 2))
+
+    def __len__(self):
+        return len(self.image_size)
+
+    def select(self, min_conf=None, classes=None):
+        """The batch keeping only detections scoring at least `min_conf` whose class is in `classes`."""
+        keep = select(self.conf, self.cls, min_conf, classes)
+        return DetectionBatch(self.xyxy[keep], self.conf[keep], self.cls[keep], self.owner[keep], self.image_size)
+
+    def summary(self):
+        """Per-sample `count` and best `confidence` arrays."""
+        return aggregate(self.owner, self.conf, len(self))
+
+    def areas(self, lat, zoom, tile_size=area.GOOGLE_TILE_SIZE, buffer_sqft=area.DEFAULT_BUFFER_SQFT):
+        """Per-sample panel area in the buffer (see `area.estimate_areas`)."""
+        return area.estimate_areas(self.xyxy, self.owner, len(self), lat, zoom, self.image_size, tile_size=tile_size,
+                                   buffer_sqft=buffer_sqft)
+
+    def split(self):
+        """Yield each sample's (bbox, confidences, classes) as plain lists, converted once for the whole batch."""
+        bbox, confs = self.xyxy.tolist(), self.conf.tolist()
+        classes = self.cls.astype(np.int64).tolist()
+        begin = 0
+        for end in np.cumsum(np.bincount(self.owner, minlength=len(self))).tolist():
+            yield bbox[begin:end], confs[begin:end], classes[begin:end]
+            begin = end
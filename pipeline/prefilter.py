@@ -0,0 +1,108 @@
+import threading
+from typing import Optional
+
+import numpy as np
+
+# qc_status of a tile the prefilter found unusable (placeholder, blank or too small); nothing can be said about it
+QC_INVALID = "NOT_VERIFIABLE"
+# qc_status of a tile the prefilter found certainly empty (water, vegetation, bare ground) without running the model
+QC_EMPTY = "PREFILTER_EMPTY"
+
+
+def tile_stats(image, stride=2):
+    """Cheap whole-tile statistics of an HxWx3 BGR uint8 image, computed on every `stride`-th pixel.
+
+    - `std`: spread of the luma; near zero for placeholder, blank and fully clouded tiles
+    - `vegetation`: fraction of pixels where green clearly dominates red and blue
+    - `structure`: fraction of non-vegetation pixels on a sharp luma edge, i.e. roofs, roads and panels; smooth
+      water, fields and canopy score close to zero
+    """
+    small = image[::stride, ::stride].astype(np.int32)
+    b, g, r = small[..., 0], small[..., 1], small[..., 2]
+    luma = (77 * r + 150 * g + 29 * b) >> 8
+    vegetation = (g > r + 10) & (g > b + 10)
+    edges = np.zeros(luma.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(luma[:, 1:] - luma[:, :-1]) > 40
+    edges[1:, :] |= np.abs(luma[1:, :] - luma[:-1, :]) > 40
+    return {
+        "std": float(luma.std()),
+        "vegetation": float(vegetation.mean()),
+        "structure": float((edges & ~vegetation).mean()),
+    }
+
+
+class TilePrefilter:
+    """Decides from cheap image statistics which tiles can skip the detector.
+
+    `check` returns `QC_INVALID` for tiles with (almost) no contrast or under `min_size` pixels, `QC_EMPTY` for
+    tiles with less than `min_structure` of man-made edges, and None for tiles the detector must see. An optional
+    `classifier(stats) -> probability of panels` can veto more tiles: those it scores below `classifier_threshold`
+    are empty too. The thresholds are deliberately conservative; measure what they cost with `audit`.
+
+    Counters (`report()`) are kept across threads. In audit mode the detector still runs on skipped tiles and
+    `audit(status, results)` counts skipped tiles where it found panels, giving the recall the prefilter would lose.
+    """
+
+    def __init__(self, min_std=1.0, min_structure=0.01, min_size=32, classifier=None, classifier_threshold=0.05,
+                 stride=2):
+        self.min_std = min_std
+        self.min_structure = min_structure
+        self.min_size = min_size
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self.stride = stride
+        self._lock = threading.Lock()
+        self._counts = {"checked": 0, "empty": 0, "invalid": 0, "audited": 0, "positives": 0, "missed": 0}
+
+    def classify(self, image) -> Optional[str]:
+        image = np.asarray(image)
+        if image.ndim != 3 or min(image.shape[:2]) < self.min_size:
+            return QC_INVALID
+        stats = tile_stats(image, self.stride)
+        if stats["std"] < self.min_std:
+            return QC_INVALID
+        if stats["structure"] < self.min_structure:
+            return QC_EMPTY
+        if self.classifier is not None and self.classifier(stats) < self.classifier_threshold:
+            return QC_EMPTY
+        return None
+
+    def check(self, image) -> Optional[str]:
+        """`classify` the tile and count the decision."""
+        status = self.classify(image)
+        with self._lock:
+            self._counts["checked"] += 1
+            if status == QC_INVALID:
+                self._counts["invalid"] += 1
+            elif status == QC_EMPTY:
+                self._counts["empty"] += 1
+        return status
+
+    def audit(self, status, results):
+        """Record the detector's verdict on a tile the prefilter judged `status` (None = passed to the detector)."""
+        found = len(results[0].boxes.conf) > 0
+        with self._lock:
+            self._counts["audited"] += 1
+            if found:
+                self._counts["positives"] += 1
+                if status is not None:
+                    self._counts["missed"] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        checked = counts["checked"]
+        counts["skip_rate"] = (counts["empty"] + counts["invalid"]) / checked if checked else 0.0
+        if counts["audited"]:
+            counts["recall"] = 1 - counts["missed"] / counts["positives"] if counts["positives"] else 1.0
+        return counts
+
+
+def format_report(report) -> str:
+    skipped = report["empty"] + report["invalid"]
+    line = (f"Prefilter skipped {skipped} of {report['checked']} images ({report['skip_rate']:.1%}): "
+            f"{report['empty']} empty, {report['invalid']} invalid")
+    if "recall" in report:
+        line += (f"\nPrefilter audit: {report['missed']} skipped images had detections, out of "
+                 f"{report['positives']} images with detections (recall {report['recall']:.1%})")
+    return line
@@ -0,0 +1,131 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+# Statuses worth retrying: timeouts, rate limiting and transient server errors. Other 4xx (bad key, missing tile)
+# fail the same way every time.
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Statuses that say the provider itself is unusable right now and count towards opening its circuit breaker
+PROVIDER_FAILURE_STATUSES = frozenset({401, 403, 429, 500, 502, 503, 504})
+# Statuses that say the requested resource doesn't exist (e.g. a tile outside the imagery), as opposed to a failure
+MISSING_STATUSES = frozenset({204, 404, 410})
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a `Retry-After` header given as delta-seconds or an HTTP date; None if absent/invalid."""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """When to retry a download and how long to wait first.
+
+    Waits grow exponentially from `base_delay` up to `max_delay` with full jitter (a uniform draw below the cap), so
+    workers that failed together don't retry together. A `Retry-After` header replaces the computed wait; if the
+    server asks for more than `max_delay`, the download gives up instead of stalling. Requests use separate connect
+    and read timeouts.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+                 multiplier: float = 2.0, connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 retry_statuses=RETRY_STATUSES, rng: Optional[random.Random] = None):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be >= 1, got {max_attempts}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_statuses = frozenset(retry_statuses)
+        self._rng = rng or random.Random()
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def is_retryable(self, status: Optional[int] = None) -> bool:
+        """Retry connection errors/timeouts (`status` None) and the statuses in `retry_statuses`."""
+        return status is None or status in self.retry_statuses
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before attempt `attempt + 1`, or None if there should be no further attempt."""
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return self._rng.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """Fails fast once a provider is clearly down.
+
+    After `failure_threshold` consecutive provider failures the breaker opens and `allow()` refuses requests for
+    `reset_timeout` seconds. Then it lets a single trial request through (half-open): success closes it again,
+    failure re-opens it for another `reset_timeout`.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Count a provider failure; returns True if this failure opened the breaker."""
+        with self._lock:
+            was_open = self._opened_at is not None
+            self._failures += 1
+            self._trial_in_flight = False
+            if was_open or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                return not was_open
+            return False
@@ -0,0 +1,189 @@
+import gc
+import hashlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pipeline import detector
+    from pipeline.input_reader import normalize_sample_id
+    from pipeline.output_builder import SINKS
+except ImportError:  # run as a script from inside pipeline/
+    import detector
+    from input_reader import normalize_sample_id
+    from output_builder import SINKS
+
+
+def shard_of(sample_id, num_shards: int) -> int:
+    """Stable shard number of a sample: the same id lands on the same shard on every machine and run."""
+    key = str(normalize_sample_id(sample_id)).encode()
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % num_shards
+
+
+def parse_shard(spec: str):
+    """Parse an `i/K` shard spec (0-based `i`) into `(i, K)`."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like 'i/K', e.g. '0/4', got '{spec}'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in [0, {count}), got '{spec}'")
+    return index, count
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """`predictions/out.jsonl` -> `predictions/out.shard-01-of-04.jsonl`; each shard writes its own files."""
+    root, ext = os.path.splitext(path)
+    width = len(str(count - 1))
+    return f"{root}.shard-{index:0{width}d}-of-{count:0{width}d}{ext}"
+
+
+def _sort_key(sample_id):
+    sample_id = normalize_sample_id(sample_id)
+    return (1, sample_id) if isinstance(sample_id, str) else (0, sample_id)
+
+
+def _line_key(line):
+    return _sort_key(json.loads(line)["sample_id"])
+
+
+def _sorted_runs(parts, directory, run_lines):
+    """Split the lines of `parts` into files of at most `run_lines` lines each sorted by sample id; yield their
+    paths."""
+    for part in parts:
+        with open(part, encoding="utf-8") as f:
+            while True:
+                lines = [line for line in itertools.islice(f, run_lines) if line.strip()]
+                if not lines:
+                    break
+                lines.sort(key=_line_key)
+                fd, path = tempfile.mkstemp(dir=directory, suffix=".jsonl")
+                with os.fdopen(fd, "w", encoding="utf-8") as run:
+                    run.writelines(line if line.endswith("\n") else line + "\n" for line in lines)
+                yield path
+
+
+def _merge_jsonl(parts, path, run_lines=100000):
+    """External merge sort: sorted runs of `run_lines` lines, then one streaming k-way merge, so memory stays
+    bounded however large the shards are."""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+        runs = list(_sorted_runs(parts, directory, run_lines))
+        files = [open(run, encoding="utf-8") for run in runs]
+        try:
+            with open(path, "w", encoding="utf-8") as out:
+                out.writelines(heapq.merge(*files, key=_line_key))
+        finally:
+            for f in files:
+                f.close()
+
+
+def _sort_by_sample_id(table):
+    """`table` ordered like `_sort_key`: integer ids numerically first, then the other ids as strings."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    ids = table["sample_id"]
+    # the string form of an int id; anything else (e.g. "007", "a1") sorts as a string after them
+    numeric = pc.match_substring_regex(ids, r"^-?(0|[1-9][0-9]{0,17})$")
+    keys = pa.table({
+        "kind": pc.if_else(numeric, 0, 1),
+        "number": pc.cast(pc.if_else(numeric, ids, "0"), pa.int64()),
+        "id": ids,
+    })
+    order = pc.sort_indices(keys, sort_keys=[("kind", "ascending"), ("number", "ascending"), ("id", "ascending")])
+    return table.take(order)
+
+
+def merge_outputs(output_format: str, count: int, output_path: str = None) -> str:
+    """Merge the `count` shard outputs of a run into `output_path`, ordered by sample id.
+
+    The order does not depend on which shard finished first, so re-running a merge gives the same file. The 'json'
+    format needs no merge: every shard already writes its per-sample files into the shared directory, and 'none'
+    writes nothing. JSONL is merged with an external sort and parquet/arrow are sorted with Arrow compute kernels,
+    so neither goes through a Python object per row.
+    Returns the path written (or the json directory).
+    """
+    path = output_path or SINKS[output_format].DEFAULT_PATH
+    if output_format in ("json", "none"):
+        return path
+    parts = [p for p in (shard_path(path, i, count) for i in range(count)) if os.path.exists(p)]
+
+    if output_format == "jsonl":
+        _merge_jsonl(parts, path)
+        return path
+
+    import pyarrow as pa
+
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+
+        tables = [pq.read_table(p) for p in parts]
+    else:
+        tables = [pa.ipc.open_file(p).read_all() for p in parts]
+    table = _sort_by_sample_id(pa.concat_tables(tables))
+    if output_format == "parquet":
+        pq.write_table(table, path)
+    else:
+        with pa.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+
+def _pipeline_main():
+    try:
+        from pipeline import main as pipeline_main
+    except ImportError:  # run as a script from inside pipeline/
+        import main as pipeline_main
+    return pipeline_main
+
+
+def _run_shard(input_path, index, count, kwargs):
+    return _pipeline_main().main(input_path, shard=(index, count), **kwargs)
+
+
+def run_sharded(input_path: str, processes: int, **kwargs) -> dict:
+    """Run all `processes` shards of `input_path` on this machine, one process per shard, then merge their outputs.
+
+    Each process runs `main.main` on its shard. Where processes are forked, the model is loaded here first and the
+    workers share its weights; otherwise each loads its own. `kwargs` are passed through to `main.main`. Returns
+    the per-shard summaries and the run-level throughput.
+    """
+    if processes < 1:
+        raise ValueError(f"processes must be >= 1, got {processes}")
+    # fork where available: workers start fast and inherit the parent's configuration and loaded model
+    methods = multiprocessing.get_all_start_methods()
+    forked = "fork" in methods
+    context = multiprocessing.get_context("fork" if forked else None)
+
+    start = time.perf_counter()
+    if forked:
+        detector.preload_model(_pipeline_main().MODEL_PATH)
+    try:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            futures = [pool.submit(_run_shard, input_path, i, processes, kwargs) for i in range(processes)]
+            shards = [f.result() for f in futures]
+    finally:
+        if forked:
+            gc.unfreeze()  # undo `ModelRegistry.preload`'s freeze once no more workers will be forked
+    elapsed = time.perf_counter() - start
+
+    merged = merge_outputs(kwargs.get("output_format", "json"), processes, kwargs.get("output_path"))
+    samples = sum(s["samples"] for s in shards)
+    summary = {
+        "shards": shards,
+        "samples": samples,
+        "failed": sum(s["failed"] for s in shards),
+        "elapsed_seconds": elapsed,
+        "samples_per_second": samples / elapsed if elapsed > 0 else 0.0,
+        "output": merged,
+    }
+    for i, s in enumerate(shards):
+        print(f"shard {i}/{processes}: {s['samples']} samples in {s['elapsed_seconds']:.2f}s")
+    print(f"{samples} samples over {processes} shards in {elapsed:.2f}s "
+          f"({summary['samples_per_second']:.1f} samples/s); merged output: {merged}")
+    return summary
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Optional
+
+# Environment variables used to configure the default cache; the cache is disabled unless SAT_CACHE_DIR is set
+CACHE_DIR_ENV = "SAT_CACHE_DIR"
+CACHE_MAX_MB_ENV = "SAT_CACHE_MAX_MB"
+CACHE_PRECISION_ENV = "SAT_CACHE_PRECISION"
+
+
+def _normalize_size(size):
+    """Accept "640x640", (640, 640) or 640 and return "640x640"."""
+    if isinstance(size, str):
+        width, _, height = size.lower().replace(" ", "").partition("x")
+        return f"{int(width)}x{int(height or width)}"
+    if isinstance(size, (tuple, list)):
+        return f"{int(size[0])}x{int(size[1])}"
+    return f"{int(size)}x{int(size)}"
+
+
+def parse_coordinates(location):
+    """Return (lat, lon) if `location` is a "lat,lon" string, else None."""
+    parts = str(location).split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        return float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+
+
+class TileCache:
+    """Content-addressed on-disk cache of downloaded imagery.
+
+    Entries are keyed by a hash of the normalized provider, coordinate, zoom and image size. Coordinates are rounded
+    to `precision` decimal places so near-duplicate points share a tile (5 places is roughly 1 m).
+
+    Writes go to a temporary file that is atomically renamed into place, so several threads or processes can share
+    one cache directory. Recency is tracked with file mtimes; when the cache grows past `max_bytes` the least
+    recently used entries are evicted until it is back under `low_water * max_bytes`, so the directory is scanned
+    once per batch of evictions rather than on every write once the cache is full.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 ** 3, precision: int = 5, low_water: float = 0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * low_water)
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def key(self, provider, lat, lon, zoom, size) -> str:
+        lat = round(float(lat), self.precision) + 0.0  # + 0.0 folds -0.0 into 0.0
+        lon = round(float(lon), self.precision) + 0.0
+        normalized = f"{str(provider).strip().lower()}|{lat:.{self.precision}f}|{lon:.{self.precision}f}|" \
+                     f"{int(zoom)}|{_normalize_size(size)}"
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def address_key(self, provider, address, zoom, size) -> str:
+        """Key for a free-text address; "lat,lon" strings are keyed like coordinates."""
+        coords = parse_coordinates(address)
+        if coords is not None:
+            return self.key(provider, coords[0], coords[1], zoom, size)
+        normalized = " ".join(str(address).lower().split())
+        normalized = f"{str(provider).strip().lower()}|{normalized}|{int(zoom)}|{_normalize_size(size)}"
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def tile_key(self, provider, z, x, y) -> str:
+        """Key for XYZ tile `z/x/y` of a tile pyramid."""
+        normalized = f"{str(provider).strip().lower()}|tile|{int(z)}/{int(x)}/{int(y)}"
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            try:
+                replaced = os.stat(path).st_size  # an overwrite only adds the difference
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            self._size += len(data) - replaced
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _entries(self):
+        """Yield (mtime, path, size) for every cached file."""
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, entry.path, st.st_size
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under its low-water mark."""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        if total <= self.max_bytes:
+            with self._lock:
+                self._size = total  # another worker already made room
+            return
+        evicted = 0
+        for _, path, size in entries:
+            if total <= self.low_water_bytes:
+                break
+            try:
+                os.unlink(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass  # another worker evicted it first
+            total -= size
+        with self._lock:
+            self._size = total
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._size,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[TileCache]:
+    """Return the process-wide cache configured from the environment, or None if caching is disabled."""
+    global _default_cache
+    root = os.environ.get(CACHE_DIR_ENV)
+    if not root:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.root != root:
+            max_mb = float(os.environ.get(CACHE_MAX_MB_ENV, 1024))
+            precision = int(os.environ.get(CACHE_PRECISION_ENV, 5))
+            _default_cache = TileCache(root, max_bytes=int(max_mb * 1024 * 1024), precision=precision)
+        return _default_cache
@@ -0,0 +1,153 @@
+import math
+
+import numpy as np
+
+try:
+    from pipeline import area
+    from pipeline.tiling import Boxes, Result, _as_array
+except ImportError:  # run as a script from inside pipeline/
+    import area
+    from tiling import Boxes, Result, _as_array
+
+
+def lat_lon_to_pixel(lat, lon, zoom, tile_size=area.GOOGLE_TILE_SIZE):
+    """Global Web Mercator pixel coordinates (x, y) of `lat`/`lon` at `zoom`; works on arrays."""
+    world = tile_size * 2.0 ** zoom
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * world
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * world
+    return x, y
+
+
+def pixel_to_lat_lon(x, y, zoom, tile_size=area.GOOGLE_TILE_SIZE):
+    """Inverse of `lat_lon_to_pixel`."""
+    world = tile_size * 2.0 ** zoom
+    lon = np.asarray(x, dtype=np.float64) / world * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y, dtype=np.float64) / world))))
+    return lat, lon
+
+
+class TileJob:
+    """One image to fetch and infer, and the samples that share it.
+
+    `samples` is a list of `(sample_id, lat, lon)`. `positions` holds each sample's (x, y) pixel position in the
+    image, or is None when the image is centred on its only sample (the same image a per-sample fetch would get).
+    """
+
+    __slots__ = ("name", "lat", "lon", "samples", "positions")
+
+    def __init__(self, name, lat, lon, samples, positions=None):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.samples = samples
+        self.positions = positions
+
+    @classmethod
+    def single(cls, sample_id, lat, lon):
+        return cls(sample_id, lat, lon, [(sample_id, lat, lon)])
+
+
+class TilePlanner:
+    """Groups input points that fall on the same image so each distinct image is fetched and inferred once.
+
+    Points are keyed by a grid over global Web Mercator pixels. Each grid cell becomes one `image_size` image
+    centred on the cell; the cell is smaller than the image by a margin (the buffer radius plus `context` pixels)
+    on every side, so every member's whole buffer circle lies inside the shared image. Cells holding a single point
+    are fetched centred on that point as before.
+
+    Records are grouped `window` at a time, so memory stays bounded on long inputs; dense lists are usually sorted
+    by area, which keeps neighbours in the same window. `stats` counts samples and images planned so far.
+    """
+
+    def __init__(self, zoom, tile_size=area.GOOGLE_TILE_SIZE, image_size=640, buffer_sqft=area.DEFAULT_BUFFER_SQFT,
+                 context=32, window=50000):
+        self.zoom = zoom
+        self.tile_size = tile_size
+        self.image_size = image_size
+        self.buffer_sqft = buffer_sqft
+        self.context = context
+        self.window = window
+        self.stats = {"samples": 0, "images": 0}
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Samples per fetched image; 1.0 means no two points shared an image."""
+        return self.stats["samples"] / self.stats["images"] if self.stats["images"] else 1.0
+
+    def radius_px(self, lat):
+        """Buffer radius in image pixels at `lat`; works on arrays."""
+        return area.buffer_radius_m(self.buffer_sqft) / area.meters_per_pixel(lat, self.zoom, self.tile_size)
+
+    def plan(self, records):
+        """Yield `TileJob`s covering every `(sample_id, lat, lon)` record, in roughly input order."""
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.window:
+                yield from self._plan_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._plan_chunk(chunk)
+
+    def _plan_chunk(self, records):
+        lat = np.array([r[1] for r in records], dtype=np.float64)
+        lon = np.array([r[2] for r in records], dtype=np.float64)
+        x, y = lat_lon_to_pixel(lat, lon, self.zoom, self.tile_size)
+        margin = math.ceil(float(self.radius_px(lat).max())) + self.context
+        cell = self.image_size - 2 * margin
+        if cell <= 0:
+            raise ValueError(f"image_size {self.image_size} is too small for the buffer and context margin ({margin} px)")
+
+        gx, gy = np.floor(x / cell).astype(np.int64), np.floor(y / cell).astype(np.int64)
+        _, group, counts = np.unique(np.stack([gx, gy], axis=1), axis=0, return_inverse=True, return_counts=True)
+        group = group.reshape(-1)
+        order = np.argsort(group, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+        jobs = []
+        for start, count in zip(starts, counts):
+            members = order[start:start + count]
+            first = members[0]
+            if count == 1:
+                jobs.append((first, TileJob.single(*records[first])))
+                continue
+            cx, cy = (gx[first] + 0.5) * cell, (gy[first] + 0.5) * cell
+            c_lat, c_lon = pixel_to_lat_lon(cx, cy, self.zoom, self.tile_size)
+            positions = np.stack([x[members] - cx, y[members] - cy], axis=1) + self.image_size / 2
+            name = f"tile_{self.zoom}_{cell}_{gx[first]}_{gy[first]}"
+            jobs.append((first, TileJob(name, float(c_lat), float(c_lon), [records[i] for i in members], positions)))
+
+        self.stats["samples"] += len(records)
+        self.stats["images"] += len(jobs)
+        for _, job in sorted(jobs, key=lambda j: j[0]):
+            yield job
+
+
+def assign_detections(result, positions, radius_px, image_shape):
+    """Split one shared image's `result` into a result per sample.
+
+    A sample gets the boxes that reach into its buffer circle (`radius_px` around its `positions` entry), shifted
+    so the sample sits at the image centre, i.e. in the frame of an image fetched for that sample alone.
+    """
+    height, width = image_shape[:2]
+    boxes = result.boxes
+    xyxy = _as_array(boxes.xyxy).reshape(-1, 4)
+    conf = _as_array(boxes.conf).reshape(-1)
+    cls = _as_array(boxes.cls).reshape(-1)
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+    radius_px = np.broadcast_to(np.asarray(radius_px, dtype=np.float32), (len(positions),))
+
+    # distance from each sample to the nearest point of each box, (samples, boxes)
+    px, py = positions[:, 0:1], positions[:, 1:2]
+    dx = np.maximum(np.maximum(xyxy[None, :, 0] - px, 0), px - xyxy[None, :, 2])
+    dy = np.maximum(np.maximum(xyxy[None, :, 1] - py, 0), py - xyxy[None, :, 3])
+    reaches = dx ** 2 + dy ** 2 <= radius_px[:, None] ** 2
+
+    shifts = np.array([width, height], dtype=np.float32) / 2 - positions
+    results = []
+    for mask, (sx, sy) in zip(reaches, shifts):
+        shifted = xyxy[mask] + np.array([sx, sy, sx, sy], dtype=np.float32)
+        results.append(Result(Boxes(shifted, conf[mask], cls[mask]), (height, width)))
+    return results
+
@@ -0,0 +1,374 @@
+import io
+import math
+import os
+import sqlite3
+import threading
+from typing import Optional
+from urllib.parse import urlencode
+
+# Environment variables choosing the imagery source (see `get_provider`)
+PROVIDER_ENV = "SAT_API_PROVIDER"
+API_KEY_ENV = "SAT_API_KEY"
+URL_TEMPLATE_ENV = "SAT_API_URL_TEMPLATE"
+TILES_PATH_ENV = "SAT_TILES_PATH"
+ZOOM_ENV = "SAT_IMAGE_ZOOM"
+TILE_SIZE_ENV = "SAT_TILE_SIZE"
+
+# Zoom and size of the images providers without their own limits return (the Google Static Maps defaults)
+DEFAULT_ZOOM = 18
+DEFAULT_IMAGE_SIZE = 640
+
+_IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF8", b"RIFF")
+
+
+def is_image(data) -> bool:
+    """True if `data` starts like a JPEG, PNG, GIF or WebP file (not an HTML/JSON error page sent with a 200)."""
+    return bool(data) and bytes(data[:8]).startswith(_IMAGE_SIGNATURES)
+
+
+def tile_for(lat, lon, zoom):
+    """XYZ tile (x, y) containing `lat`/`lon` at `zoom`."""
+    n = 2 ** zoom
+    lat = math.radians(max(min(lat, 85.05112878), -85.05112878))
+    x = int((lon + 180.0) / 360.0 * n) % n
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return x, min(y, n - 1)
+
+
+def _image_fetcher():
+    # imported on first use so the web app can build provider URLs without loading requests
+    try:
+        from pipeline import image_fetcher
+    except ImportError:  # run as a script from inside pipeline/
+        import image_fetcher
+    return image_fetcher
+
+
+class TileProvider:
+    """A source of satellite images centred on a coordinate.
+
+    Providers know how to get the image for a point (URL building and authentication for remote APIs, tile lookup
+    for local files), which responses are usable, and the geometry of what they return: the zoom level, the size of
+    the tiles that zoom level is defined on, and the image size. `fetch` returns the encoded image bytes, or None.
+    """
+
+    name = "provider"
+    zoom = DEFAULT_ZOOM
+    tile_size = 256
+    image_size = DEFAULT_IMAGE_SIZE
+
+    def geometry(self) -> dict:
+        return {"zoom": self.zoom, "tile_size": self.tile_size, "image_size": self.image_size}
+
+    def validate(self, data) -> bool:
+        return bool(data)
+
+    def fetch(self, lat, lon, rate_limiter=None, cache=None) -> Optional[bytes]:
+        raise NotImplementedError
+
+
+class HttpTileProvider(TileProvider):
+    """A provider behind an HTTP API; downloads go through the pipeline's session, retries, circuit breakers and
+    tile cache."""
+
+    def url(self, lat, lon) -> str:
+        raise NotImplementedError
+
+    def cache_key(self, cache, lat, lon) -> str:
+        return cache.key(self.name, lat, lon, self.zoom, (self.image_size, self.image_size))
+
+    def download(self, url, cache_key=None, cache=None, rate_limiter=None) -> Optional[bytes]:
+        image_fetcher = _image_fetcher()
+        return image_fetcher._download_cached(url, cache_key, cache, rate_limiter=rate_limiter,
+                                              validate=self.validate)
+
+    def fetch(self, lat, lon, rate_limiter=None, cache=None) -> Optional[bytes]:
+        cache_key = self.cache_key(cache, lat, lon) if cache is not None else None
+        return self.download(self.url(lat, lon), cache_key, cache, rate_limiter)
+
+
+class MapboxProvider(HttpTileProvider):
+    """Mapbox Static Images API (satellite-v9). Mapbox zoom levels are defined on 512 px tiles."""
+
+    name = "mapbox"
+    tile_size = 512
+
+    def __init__(self, api_key, zoom=16, size=512):
+        self.api_key = api_key
+        self.zoom = zoom
+        self.image_size = size
+
+    def url(self, lat, lon) -> str:
+        return (f"https://api.mapbox.com/styles/v1/mapbox/satellite-v9/static/"
+                f"{lon},{lat},{self.zoom}/{self.image_size}x{self.image_size}?access_token={self.api_key}")
+
+    def validate(self, data) -> bool:
+        return is_image(data)
+
+
+class GoogleStaticMapsProvider(HttpTileProvider):
+    """Google Static Maps API in satellite mode; centres on a coordinate or on a street address."""
+
+    name = "google"
+    BASE_URL = "https://maps.googleapis.com/maps/api/staticmap"
+
+    def __init__(self, api_key, zoom=DEFAULT_ZOOM, size=DEFAULT_IMAGE_SIZE):
+        self.api_key = api_key
+        self.zoom = int(zoom)
+        # `size` is a side length or a "WIDTHxHEIGHT" string
+        width, _, height = str(size).lower().replace(" ", "").partition("x")
+        self.image_size = int(width)
+        self.size = f"{int(width)}x{int(height or width)}"
+
+    def params(self, center) -> dict:
+        return {
+            "center": center,
+            "zoom": str(self.zoom),
+            "size": self.size,
+            "maptype": "satellite",
+            "key": self.api_key,
+        }
+
+    def url(self, lat, lon) -> str:
+        return self.address_url(f"{lat},{lon}")
+
+    def address_url(self, address) -> str:
+        return f"{self.BASE_URL}?{urlencode(self.params(address))}"
+
+    def validate(self, data) -> bool:
+        return is_image(data)
+
+    def fetch_address(self, address, cache=None, rate_limiter=None) -> Optional[bytes]:
+        """Image centred on a street address (or a "lat,lon" string)."""
+        cache_key = cache.address_key(self.name, address, self.zoom, self.size) if cache is not None else None
+        return self.download(self.address_url(address), cache_key, cache, rate_limiter)
+
+
+class UrlTemplateProvider(HttpTileProvider):
+    """Any server with a `{lat}`/`{lon}` URL template, e.g. a self-hosted or stand-in tile server."""
+
+    name = "url"
+
+    def __init__(self, template, zoom=DEFAULT_ZOOM, size=DEFAULT_IMAGE_SIZE):
+        self.template = template
+        self.zoom = zoom
+        self.image_size = size
+
+    def url(self, lat, lon) -> str:
+        return self.template.format(lat=lat, lon=lon)
+
+    def cache_key(self, cache, lat, lon) -> str:
+        # the template identifies the provider; zoom/size are whatever the template bakes in
+        return cache.key(f"url:{self.template}", lat, lon, 0, 0)
+
+
+class TilePyramidProvider(TileProvider):
+    """Imagery stored as an XYZ tile pyramid: local files for offline runs, or a remote XYZ tile server.
+
+    `fetch` cuts the `image_size` window centred on the coordinate out of the tiles at `zoom` that cover it and
+    returns it as a JPEG, so the result has the same geometry as a static-map API image. Tiles missing from the
+    pyramid are left black; if none of the covering tiles exists the point has no imagery and `fetch` returns None.
+    `mosaic.TileMosaic` builds buffer-sized views from the same tiles without re-encoding. Subclasses implement
+    `read_tile`.
+    """
+
+    def __init__(self, zoom=DEFAULT_ZOOM, image_size=DEFAULT_IMAGE_SIZE, tile_size=256, quality=95):
+        self.zoom = zoom
+        self.image_size = image_size
+        self.tile_size = tile_size
+        self.quality = quality
+
+    def read_tile(self, z, x, y, rate_limiter=None) -> Optional[bytes]:
+        """Encoded bytes of XYZ tile `z/x/y` (y counted from the north), or None if it isn't stored.
+
+        A tile that exists but couldn't be read (e.g. a failed download) raises instead, so it is never mistaken for
+        a gap in the imagery.
+        """
+        raise NotImplementedError
+
+    def view(self, lat, lon, size=None, rate_limiter=None):
+        """BGR array of the `size` (default `image_size`) window centred on `lat`/`lon`, or None without tiles."""
+        try:
+            from pipeline.mosaic import decode_tile, stitch, tile_window
+        except ImportError:  # run as a script from inside pipeline/
+            from mosaic import decode_tile, stitch, tile_window
+
+        size = size or self.image_size
+        parts = []
+        for x, y, dx, dy in tile_window(lat, lon, self.zoom, self.tile_size, size):
+            data = self.read_tile(self.zoom, x, y, rate_limiter=rate_limiter)
+            if data:
+                parts.append((decode_tile(data), dx, dy))
+        return stitch(parts, size) if parts else None
+
+    def fetch(self, lat, lon, rate_limiter=None, cache=None) -> Optional[bytes]:
+        import numpy as np
+        from PIL import Image
+
+        image = self.view(lat, lon, rate_limiter=rate_limiter)
+        if image is None:
+            return None
+        buf = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(image[..., ::-1])).save(buf, format="JPEG", quality=self.quality)
+        return buf.getvalue()
+
+
+class XyzTileProvider(TilePyramidProvider):
+    """A remote XYZ tile server with a `{z}`/`{x}`/`{y}` URL template (e.g. Mapbox raster tiles, ESRI World Imagery).
+
+    Tiles are downloaded through the pipeline's session, retries, circuit breakers and the default tile cache, so
+    each tile is paid for once however many samples it covers.
+    """
+
+    name = "xyz"
+
+    def __init__(self, template, zoom=DEFAULT_ZOOM, image_size=DEFAULT_IMAGE_SIZE, tile_size=256):
+        self.template = template
+        super().__init__(zoom=zoom, image_size=image_size, tile_size=tile_size)
+
+    def validate(self, data) -> bool:
+        return is_image(data)
+
+    def read_tile(self, z, x, y, rate_limiter=None) -> Optional[bytes]:
+        try:
+            from pipeline.tile_cache import get_default_cache
+        except ImportError:  # run as a script from inside pipeline/
+            from tile_cache import get_default_cache
+
+        cache = get_default_cache()
+        cache_key = cache.tile_key(f"xyz:{self.template}", z, x, y) if cache is not None else None
+        url = self.template.format(z=z, x=x, y=y)
+        return _image_fetcher()._download_cached(url, cache_key, cache, rate_limiter=rate_limiter,
+                                                 validate=self.validate, raise_on_failure=True)
+
+
+class MBTilesProvider(TilePyramidProvider):
+    """Tiles from an MBTiles file (SQLite, TMS row order).
+
+    Each thread gets its own read-only connection with SQLite memory-mapped I/O enabled, so tile reads are served
+    from the page cache without read() copies and many fetch workers can read in parallel.
+    """
+
+    name = "mbtiles"
+
+    def __init__(self, path, zoom=None, image_size=DEFAULT_IMAGE_SIZE, tile_size=256, mmap_bytes=1 << 30):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"MBTiles file not found: {path}")
+        self.path = path
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        if zoom is None:
+            zoom = self.max_zoom()
+        super().__init__(zoom=zoom, image_size=image_size, tile_size=tile_size)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_bytes)}")
+            self._local.conn = conn
+        return conn
+
+    def max_zoom(self) -> int:
+        row = self._connection().execute("SELECT value FROM metadata WHERE name = 'maxzoom'").fetchone()
+        if row is None:
+            row = self._connection().execute("SELECT MAX(zoom_level) FROM tiles").fetchone()
+        return int(row[0])
+
+    def read_tile(self, z, x, y, rate_limiter=None) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y)).fetchone()
+        return bytes(row[0]) if row else None
+
+
+class DirectoryTileProvider(TilePyramidProvider):
+    """Tiles from a `{root}/{z}/{x}/{y}.{png,jpg,jpeg,webp}` directory pyramid."""
+
+    name = "tiles"
+    EXTENSIONS = ("png", "jpg", "jpeg", "webp")
+
+    def __init__(self, root, zoom=DEFAULT_ZOOM, image_size=DEFAULT_IMAGE_SIZE, tile_size=256):
+        if not os.path.isdir(root):
+            raise FileNotFoundError(f"Tile directory not found: {root}")
+        self.root = root
+        self._extension = None
+        super().__init__(zoom=zoom, image_size=image_size, tile_size=tile_size)
+
+    def read_tile(self, z, x, y, rate_limiter=None) -> Optional[bytes]:
+        # once a tile has been found, try its extension first
+        extensions = (self._extension,) + self.EXTENSIONS if self._extension else self.EXTENSIONS
+        for ext in extensions:
+            try:
+                with open(os.path.join(self.root, str(z), str(x), f"{y}.{ext}"), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            self._extension = ext
+            return data
+        return None
+
+
+def write_mbtiles(path, tiles, metadata=None):
+    """Write `tiles`, a mapping or iterable of `((z, x, y), encoded bytes)` in XYZ order, to an MBTiles file."""
+    items = tiles.items() if hasattr(tiles, "items") else tiles
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, "
+                     "tile_data BLOB, PRIMARY KEY (zoom_level, tile_column, tile_row))")
+        rows = [(z, x, (1 << z) - 1 - y, sqlite3.Binary(data)) for (z, x, y), data in items]
+        conn.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", rows)
+        zooms = [row[0] for row in rows]
+        meta = {"format": "jpg", "minzoom": min(zooms), "maxzoom": max(zooms)} if zooms else {}
+        meta.update(metadata or {})
+        conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+    conn.close()
+    return path
+
+
+def open_local_provider(path, zoom=None, image_size=DEFAULT_IMAGE_SIZE, tile_size=256) -> TilePyramidProvider:
+    """An `MBTilesProvider` for a file, a `DirectoryTileProvider` for a directory."""
+    if os.path.isdir(path):
+        return DirectoryTileProvider(path, zoom=DEFAULT_ZOOM if zoom is None else zoom, image_size=image_size,
+                                     tile_size=tile_size)
+    return MBTilesProvider(path, zoom=zoom, image_size=image_size, tile_size=tile_size)
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider() -> Optional[TileProvider]:
+    """The provider configured by the environment, or None if there is none (callers then use sample imagery).
+
+    `SAT_API_PROVIDER` picks it:
+    - `mapbox` or `google`, with `SAT_API_KEY`
+    - `url`, with a `SAT_API_URL_TEMPLATE` containing `{lat}`/`{lon}`
+    - `xyz`, with a `SAT_API_URL_TEMPLATE` containing `{z}`/`{x}`/`{y}` and tiles of `SAT_TILE_SIZE` (default 256)
+    - `local`, reading pre-staged tiles from `SAT_TILES_PATH` (an MBTiles file or an XYZ directory)
+
+    `SAT_IMAGE_ZOOM` sets the zoom of all but Mapbox. Providers are created once per configuration.
+    """
+    kind = os.environ.get(PROVIDER_ENV)
+    api_key = os.environ.get(API_KEY_ENV)
+    zoom = os.environ.get(ZOOM_ENV)
+    config = (kind, api_key, os.environ.get(URL_TEMPLATE_ENV), os.environ.get(TILES_PATH_ENV), zoom,
+              int(os.environ.get(TILE_SIZE_ENV, 256)))
+    with _providers_lock:
+        if config not in _providers:
+            _providers[config] = _make_provider(*config)
+        return _providers[config]
+
+
+def _make_provider(kind, api_key, template, tiles_path, zoom, tile_size):
+    if kind == "mapbox" and api_key:
+        return MapboxProvider(api_key)
+    if kind == "google" and api_key:
+        return GoogleStaticMapsProvider(api_key, zoom=int(zoom or DEFAULT_ZOOM))
+    if kind == "url" and template:
+        return UrlTemplateProvider(template, zoom=int(zoom or DEFAULT_ZOOM))
+    if kind == "xyz" and template:
+        return XyzTileProvider(template, zoom=int(zoom or DEFAULT_ZOOM), tile_size=tile_size)
+    if kind == "local" and tiles_path:
+        return open_local_provider(tiles_path, zoom=int(zoom) if zoom else None, tile_size=tile_size)
+    return None
@@ -0,0 +1,94 @@
+"""Stand-in tile server: serves pre-staged MBTiles/XYZ imagery over HTTP, so code written against a tile API can run
+with no network.
+
+    python pipeline/tile_server.py imagery.mbtiles --zoom 18 --port 8080
+
+GET /{z}/{x}/{y}.jpg returns a stored tile and GET /point/{lat}/{lon}.jpg the image centred on a coordinate, so
+`SAT_API_PROVIDER=url SAT_API_URL_TEMPLATE=http://127.0.0.1:8080/point/{lat}/{lon}.jpg` points the pipeline at it.
+"""
+import argparse
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from pipeline.tile_providers import DEFAULT_IMAGE_SIZE, open_local_provider
+except ImportError:  # run as a script from inside pipeline/
+    from tile_providers import DEFAULT_IMAGE_SIZE, open_local_provider
+
+TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)(?:\.\w+)?$")
+POINT_PATH = re.compile(r"^/point/(-?[\d.]+)/(-?[\d.]+)(?:\.\w+)?$")
+
+
+def _content_type(data):
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"RIFF"):
+        return "image/webp"
+    return "image/jpeg"
+
+
+def make_handler(provider):
+    """Request handler class serving tiles and point-centred images from the `TilePyramidProvider` `provider`."""
+
+    class TileHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = 64 * 1024  # one send per response; avoids Nagle/delayed-ACK stalls on kept-alive sockets
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            data = None
+            tile, point = TILE_PATH.match(path), POINT_PATH.match(path)
+            if tile:
+                data = provider.read_tile(*(int(v) for v in tile.groups()))
+            elif point:
+                data = provider.fetch(float(point.group(1)), float(point.group(2)))
+            if not data:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", _content_type(data))
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return TileHandler
+
+
+def serve(provider, host="127.0.0.1", port=8080):
+    """Start the server in the background and return it; stop it with `server.shutdown()`."""
+    server = ThreadingHTTPServer((host, port), make_handler(provider))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("tiles", help="MBTiles file or {z}/{x}/{y} tile directory")
+    parser.add_argument("--zoom", type=int, default=None,
+                        help="Zoom of the point-centred images (default: the MBTiles max zoom, or 18)")
+    parser.add_argument("--image-size", type=int, default=DEFAULT_IMAGE_SIZE,
+                        help=f"Size of the point-centred images (default: {DEFAULT_IMAGE_SIZE})")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    provider = open_local_provider(args.tiles, zoom=args.zoom, image_size=args.image_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(provider))
+    print(f"Serving {args.tiles} (zoom {provider.zoom}) on http://{args.host}:{args.port}")
+    print(f"Point the pipeline at it with SAT_API_PROVIDER=url "
+          f"SAT_API_URL_TEMPLATE=http://{args.host}:{args.port}/point/{{lat}}/{{lon}}.jpg SAT_IMAGE_ZOOM={provider.zoom}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
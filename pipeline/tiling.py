@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class Boxes:
+    """Detections as NumPy arrays, laid out like ultralytics `Results.boxes` (xyxy, conf, cls)."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.float32).reshape(-1)
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class Result:
+    """Minimal stand-in for an ultralytics `Results` object holding merged detections for one image."""
+
+    def __init__(self, boxes: Boxes, orig_shape):
+        self.boxes = boxes
+        self.orig_shape = orig_shape
+
+
+def _as_array(values):
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=np.float32)
+
+
+def tile_windows(height, width, tile_size=640, overlap=0.2):
+    """Return an (N, 4) int array of x0, y0, x1, y1 windows of at most `tile_size` px covering the image.
+
+    Neighbouring windows overlap by at least `overlap` of the tile size, and the last row/column is shifted back so
+    every window lies inside the image.
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError(f"overlap must be in [0, 1), got {overlap}")
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return np.array([0])
+        s = np.arange(0, length - tile_size, stride)
+        return np.append(s, length - tile_size)
+
+    ys, xs = np.meshgrid(starts(height), starts(width), indexing="ij")
+    x0, y0 = xs.ravel(), ys.ravel()
+    return np.stack([x0, y0, np.minimum(x0 + tile_size, width), np.minimum(y0 + tile_size, height)], axis=1)
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes, returned as an (N, M) array."""
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _clusters(boxes, scores, classes, iou_threshold):
+    """Greedy NMS that also reports, for every box, the index of the kept box that suppressed it.
+
+    Boxes of different classes never suppress each other: each class is shifted by an offset larger than any
+    coordinate so their boxes cannot overlap.
+    """
+    order = np.argsort(-scores, kind="stable")
+    offset = (boxes.max() - boxes.min() + 1) if len(boxes) else 0
+    shifted = boxes + (classes * offset)[:, None]
+    owner = np.full(len(boxes), -1)
+    keep = []
+    for i in order:
+        if owner[i] != -1:
+            continue
+        owner[i] = i
+        keep.append(i)
+        free = owner == -1
+        if not free.any():
+            break
+        candidates = np.flatnonzero(free)
+        overlaps = box_iou(shifted[i:i + 1], shifted[candidates])[0]
+        owner[candidates[overlaps > iou_threshold]] = i
+    return np.array(keep, dtype=int), owner
+
+
+def nms(boxes, scores, classes, iou_threshold=0.5):
+    """Class-aware non-maximum suppression; returns indices of kept boxes, highest score first."""
+    keep, _ = _clusters(boxes, scores, classes, iou_threshold)
+    return keep
+
+
+def weighted_box_fusion(boxes, scores, classes, iou_threshold=0.5):
+    """Fuse overlapping boxes into their score-weighted mean instead of dropping them.
+
+    Returns (xyxy, conf, cls) for one fused box per cluster; a cluster's score is its best member's score.
+    """
+    keep, owner = _clusters(boxes, scores, classes, iou_threshold)
+    keep = np.sort(keep)
+    cluster = np.searchsorted(keep, owner)
+    n = len(keep)
+    weighted = np.zeros((n, 4))
+    weights = np.zeros(n)
+    best = np.zeros(n)
+    np.add.at(weighted, cluster, boxes * scores[:, None])
+    np.add.at(weights, cluster, scores)
+    np.maximum.at(best, cluster, scores)
+    return weighted / np.maximum(weights, 1e-9)[:, None], best, classes[keep]
+
+
+def merge_tile_results(tile_results, windows, iou_threshold=0.5, method="nms"):
+    """Map per-tile ultralytics-style results back to global coordinates and merge duplicates across tiles."""
+    xyxy, conf, cls = [], [], []
+    for result, (x0, y0, _, _) in zip(tile_results, windows):
+        boxes = result.boxes
+        b = _as_array(boxes.xyxy).reshape(-1, 4)
+        if not len(b):
+            continue
+        xyxy.append(b + np.array([x0, y0, x0, y0], dtype=np.float32))
+        conf.append(_as_array(boxes.conf).reshape(-1))
+        cls.append(_as_array(boxes.cls).reshape(-1))
+    if not xyxy:
+        return Boxes(np.empty((0, 4)), [], [])
+
+    xyxy, conf, cls = np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+    if method == "wbf":
+        return Boxes(*weighted_box_fusion(xyxy, conf, cls, iou_threshold))
+    if method != "nms":
+        raise ValueError(f"Unknown merge method '{method}'. Use 'nms' or 'wbf'.")
+    keep = nms(xyxy, conf, cls, iou_threshold)
+    return Boxes(xyxy[keep], conf[keep], cls[keep])
@@ -0,0 +1,40 @@
+import numpy as np
+
+from pipeline.area import buffer_radius_m, estimate_areas, meters_per_pixel
+
+
+def test_ground_resolution_matches_web_mercator():
+    assert np.isclose(meters_per_pixel(0, 0), 156543.03, atol=0.01)
+    assert np.isclose(meters_per_pixel(60, 18), meters_per_pixel(0, 18) / 2)
+    # Mapbox zoom levels are on 512 px tiles: same zoom, half the meters per pixel
+    assert np.isclose(meters_per_pixel(10, 16, tile_size=512), meters_per_pixel(10, 16) / 2)
+
+
+def test_area_is_clipped_to_buffer_and_overlaps_count_once():
+    m_per_px = meters_per_pixel(0, 20)
+    r_px = buffer_radius_m() / m_per_px
+    c = 320
+    whole = [c - 2 * r_px, c - 2 * r_px, c + 2 * r_px, c + 2 * r_px]
+    half = [c - 2 * r_px, c - 2 * r_px, c, c + 2 * r_px]
+    far = [0, 0, 10, 10]
+    boxes = np.array([whole, whole, half, half, far])
+    areas = estimate_areas(boxes, [0, 0, 1, 1, 2], 3, lat=0, zoom=20, image_size=(640, 640), grid=128)
+
+    buffer_sqm = 1200 * 0.09290304
+    assert np.isclose(areas[0], buffer_sqm, rtol=0.02)  # covering box clipped to the circle, duplicate ignored
+    assert np.isclose(areas[1], buffer_sqm / 2, rtol=0.03)
+    assert areas[2] == 0.0
+
+
+def test_vectorized_matches_per_sample_and_chunking():
+    rng = np.random.default_rng(0)
+    n_samples, n_boxes = 50, 400
+    xy = rng.uniform(250, 390, (n_boxes, 2))
+    boxes = np.concatenate([xy, xy + rng.uniform(2, 30, (n_boxes, 2))], axis=1)
+    index = rng.integers(0, n_samples, n_boxes)
+    lat = rng.uniform(-60, 60, n_samples)
+
+    together = estimate_areas(boxes, index, n_samples, lat, 20, (640, 640), chunk_size=7)
+    separate = [estimate_areas(boxes[index == i], np.zeros((index == i).sum()), 1, lat[i], 20, (640, 640))[0]
+                for i in range(n_samples)]
+    assert np.allclose(together, separate)
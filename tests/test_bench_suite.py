@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_suite import compare, run_suite  # noqa: E402
+
+
+def _doc(**seconds):
+    return {"results": {name: {"seconds": s, "items": 1, "items_per_second": 1 / s} for name, s in seconds.items()}}
+
+
+def test_compare_flags_only_slowdowns_over_threshold():
+    baseline = _doc(fetch=1.0, inference=2.0, write=0.5)
+    current = _doc(fetch=1.1, inference=2.6, write=0.3)
+    rows, regressions = compare(baseline, current, threshold=0.15)
+    assert regressions == ["inference"]
+    assert [round(change, 2) for _, _, _, change in rows] == [0.1, 0.3, -0.4]
+
+    rows, regressions = compare(baseline, _doc(fetch=1.0), threshold=0.15)
+    assert regressions == [] and rows[1][2] is None  # missing benchmarks are reported, not flagged
+
+
+def test_suite_runs_every_subsystem_at_small_scale(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    doc = run_suite(images=3, rows=30, repeat=1)
+    results = doc["results"]
+    assert {"input.csv", "input.xlsx", "fetch", "fetch.local", "fetch.mosaic", "decode", "inference",
+            "postprocess.per_object", "postprocess.batched", "write.jsonl", "rescore", "end_to_end"} <= set(results)
+    assert results["input.csv"]["items"] == results["input.xlsx"]["items"] == results["rescore"]["items"] == 30
+    assert results["postprocess.per_object"]["items"] == results["postprocess.batched"]["items"] == 30
+    assert results["fetch"]["items"] == results["fetch.local"]["items"] == results["end_to_end"]["items"] == 3
+    assert doc["meta"]["params"] == {"images": 3, "rows": 30, "repeat": 1}
+    assert "SAT_API_URL_TEMPLATE" not in os.environ
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from pipeline import main as pipeline_main
+from pipeline.checkpoint import CompletionIndex
+
+
+def test_index_round_trip_and_torn_last_line(tmp_path):
+    path = tmp_path / "ckpt.log"
+    with CompletionIndex(str(path), resume=False) as index:
+        index.mark_done(1, 12.97, 77.59)
+        index.mark_failed(2, 19.07, 72.87, "image not\tavailable")
+        index.mark_failed(3, 1.0, 1.0, "timeout")
+        index.mark_done(3, 1.0, 1.0)
+    with open(path, "a") as f:
+        f.write("done\t2\tdeadbeef")  # crashed mid-write
+
+    index = CompletionIndex(str(path))
+    assert index.is_done(1, 12.97, 77.59)
+    assert index.is_done(3, 1.0, 1.0)
+    assert index.is_failed(2, 19.07, 72.87)
+    assert not index.is_done(1, 12.98, 77.59)  # coordinates changed -> new work
+    assert list(index.failures()) == ["2"]
+    index.close()
+
+
+class CountingModel:
+    def __init__(self):
+        self.images = []
+
+    def predict(self, source):
+        class Boxes:
+            xyxy = [[0, 0, 10, 10]]
+            conf = [0.5]
+            cls = [0]
+
+        class Result:
+            boxes = Boxes()
+
+        sources = source if isinstance(source, list) else [source]
+        self.images.extend(sources)
+        if "img-3.0" in sources:
+            raise RuntimeError("boom")
+        return [Result() for _ in sources]
+
+
+def test_resume_skips_completed_and_retries_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.csv").write_text("sample_id,lat,lon\n1,1.0,1.0\n2,2.0,2.0\nfail,3.0,3.0\n")
+    model = CountingModel()
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: model)
+    # tag each image with its sample's latitude and skip decoding so the test can see which samples were inferred
+    monkeypatch.setattr("pipeline.main.fetch_image_bytes", lambda lat, lon, *args: f"img-{lat}".encode())
+    monkeypatch.setattr("pipeline.detector.decode_image", lambda data: data.decode())
+
+    pipeline_main.main("in.csv", batch_size=1)
+    assert len(model.images) == 3
+    assert sorted(p.name for p in (tmp_path / "predictions").glob("*.json")) == ["1.json", "2.json"]
+
+    model.images.clear()
+    pipeline_main.main("in.csv", batch_size=1, resume=True)
+    assert model.images == ["img-3.0"]
+
+    model.images.clear()
+    pipeline_main.main("in.csv", batch_size=1, retry_failed=True)
+    assert model.images == ["img-3.0"]
+
+
+@pytest.mark.parametrize("output_format", ["jsonl", "parquet", "arrow"])
+def test_resume_keeps_earlier_records(tmp_path, monkeypatch, output_format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: CountingModel())
+    monkeypatch.setattr("pipeline.main.fetch_image_bytes", lambda lat, lon, *args: f"img-{lat}".encode())
+    monkeypatch.setattr("pipeline.detector.decode_image", lambda data: data.decode())
+    output = f"out.{output_format}"
+
+    def sample_ids():
+        if output_format == "jsonl":
+            return sorted(str(json.loads(line)["sample_id"]) for line in open(output))
+        table = pq.read_table(output) if output_format == "parquet" else pa.ipc.open_file(output).read_all()
+        return sorted(table.column("sample_id").to_pylist())
+
+    (tmp_path / "in.csv").write_text("sample_id,lat,lon\n1,1.0,1.0\n2,2.0,2.0\n")
+    pipeline_main.main("in.csv", output_format=output_format, output_path=output)
+    (tmp_path / "in.csv").write_text("sample_id,lat,lon\n1,1.0,1.0\n2,2.0,2.0\n4,4.0,4.0\n")
+    pipeline_main.main("in.csv", output_format=output_format, output_path=output, resume=True)
+    assert sample_ids() == ["1", "2", "4"]
+    pipeline_main.main("in.csv", output_format=output_format, output_path=output)  # a new run starts over
+    assert sample_ids() == ["1", "2", "4"]
+
+
+def test_columnar_records_are_durable_before_they_are_reported_done(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    from pipeline.output_builder import ParquetSink, make_record
+
+    path = str(tmp_path / "out.parquet")
+    done = []
+    sink = ParquetSink(path, flush_every=2)
+    for i in range(3):
+        sink.write(make_record(i, 1.0, 1.0, [], [], [], 0.0), done=lambda i=i: done.append(i))
+    # the process dies here: the flushed records are in a complete, readable part file
+    assert done == [0, 1]
+    parts = sink._parts()
+    assert len(parts) == 1 and pq.read_table(parts[0]).column("sample_id").to_pylist() == ["0", "1"]
+
+    resumed = ParquetSink(path, resume=True)
+    resumed.write(make_record(2, 1.0, 1.0, [], [], [], 0.0))
+    resumed.close()
+    assert pq.read_table(path).column("sample_id").to_pylist() == ["0", "1", "2"]
+    assert not os.path.exists(f"{path}.parts")
@@ -0,0 +1,172 @@
+import io
+import json
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from PIL import Image
+
+from pipeline import detection_store, main as pipeline_main
+from pipeline.detection_store import DetectionStore, image_hash
+from pipeline.output_builder import ParquetSink, build_record
+from pipeline.tile_planner import pixel_to_lat_lon
+from pipeline.tile_providers import write_mbtiles
+from pipeline.tiling import Boxes, Result
+
+ZOOM = 18
+X0, Y0 = 131000, 90000
+
+
+def _png(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (256, 256, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class ScoringModel:
+    """Returns the same three boxes for every image and applies `conf` like ultralytics does."""
+
+    SCORES = [0.05, 0.3, 0.6]
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, source, conf=0.25):
+        images = source if isinstance(source, list) else [source]
+        self.calls.append((len(images), conf))
+        keep = [i for i, s in enumerate(self.SCORES) if s >= conf]
+        boxes = [[300 + 10 * i, 300, 330 + 10 * i, 330] for i in keep]
+        return [Result(Boxes(boxes, [self.SCORES[i] for i in keep], [0] * len(keep)), image.shape[:2])
+                for image in images]
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """Pipeline runs over 6 samples, each on its own local tile, with a settable weights checksum."""
+    tiles = {(ZOOM, X0 + i, Y0): _png(i) for i in range(6)}
+    monkeypatch.setenv("SAT_API_PROVIDER", "local")
+    monkeypatch.setenv("SAT_TILES_PATH", write_mbtiles(str(tmp_path / "tiles.mbtiles"), tiles))
+    monkeypatch.setenv("SAT_IMAGE_ZOOM", str(ZOOM))
+    model = ScoringModel()
+    weights = {"checksum": "v1"}
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: model)
+    monkeypatch.setattr("pipeline.detector.model_checksum", lambda path=None, backend=None: weights["checksum"])
+    rows = [(i, *map(float, pixel_to_lat_lon((X0 + i) * 256 + 128, Y0 * 256 + 128, ZOOM))) for i in range(6)]
+    input_csv = tmp_path / "input.csv"
+    input_csv.write_text("sample_id,latitude,longitude\n" + "".join(f"{i},{lat},{lon}\n" for i, lat, lon in rows))
+    store = str(tmp_path / "store")
+
+    def go(output, samples=None, rescore=None, **kwargs):
+        """Run the pipeline (or `rescore` at that threshold) and return its summary and sorted records."""
+        output = str(tmp_path / output)
+        if rescore is not None:
+            summary = pipeline_main.rescore(rescore, store_path=store, output_format="jsonl", output_path=output)
+        else:
+            summary = pipeline_main.main(str(input_csv), samples=samples and [rows[i] for i in samples],
+                                         store_path=kwargs.pop("store_path", store), output_format="jsonl",
+                                         output_path=output, checkpoint_path=str(tmp_path / "ckpt.log"), **kwargs)
+        with open(output) as f:
+            return summary, sorted((json.loads(line) for line in f), key=lambda r: r["sample_id"])
+
+    go.model, go.weights, go.store = model, weights, store
+    return go
+
+
+def test_threshold_change_needs_no_inference(run):
+    summary, records = run("first.jsonl")
+    assert run.model.calls and all(conf == detection_store.RAW_CONF for _, conf in run.model.calls)
+    confidences = [[d["confidence"] for d in r["detections"]] for r in records]
+    assert confidences == [pytest.approx([0.3, 0.6])] * 6
+    assert summary["detection_store"] == {"reused": 0, "stored": 6}
+    assert {r["image_metadata"]["source"] for r in records} == {"mbtiles"}  # the provider, not a fixed name
+
+    # same weights: a rerun reuses every stored image, and rescoring never calls the model
+    run.model.calls.clear()
+    summary, again = run("again.jsonl")
+    assert not run.model.calls and summary["detection_store"]["reused"] == 6 and again == records
+    summary, rescored = run("rescored.jsonl", rescore=0.5)
+    assert not run.model.calls and summary["reinferred"] == 0 and summary["with_solar"] == 6
+
+
+    # exactly what running the model at conf 0.5 writes
+    _, direct = run("direct.jsonl", store_path=None, conf=0.5)
+    assert rescored == direct and [len(r["detections"]) for r in direct] == [1] * 6
+    assert all(r["pv_area_sqm_est"] < records[0]["pv_area_sqm_est"] for r in rescored)
+
+
+def test_new_weights_reinfer_only_their_samples(run):
+    run("old.jsonl", samples=[0, 1, 2])
+    run.weights["checksum"] = "v2"
+    run("new.jsonl", samples=[3, 4, 5])
+    assert len(DetectionStore(run.store).segments()) == 2
+
+    run.model.calls.clear()
+    summary, records = run("rescored.jsonl", rescore=0.2)
+    assert sum(n for n, _ in run.model.calls) == 3 and summary["reinferred"] == 3
+    assert len(records) == 6 and all(len(r["detections"]) == 2 for r in records)
+    store = DetectionStore(run.store)
+    assert len(store.segments()) == 1 and store.load().from_model("v2").all()
+
+    with pytest.raises(ValueError, match="cannot rescore"):
+        run("low.jsonl", rescore=0.001)
+
+
+def test_samples_that_fail_reinference_are_left_out(run, monkeypatch):
+    run("old.jsonl", samples=[0, 1, 2])
+    run.weights["checksum"] = "v2"
+    run("new.jsonl", samples=[3, 4, 5])
+
+    def broken(source, conf=0.25):
+        raise RuntimeError("out of memory")
+
+    with monkeypatch.context() as m:
+        m.setattr(run.model, "predict", broken)
+        summary, records = run("rescored.jsonl", rescore=0.2)
+    assert summary["reinferred"] == 0 and sorted(summary["failed"]) == ["0", "1", "2"]
+    assert [r["sample_id"] for r in records] == [3, 4, 5]  # no old-weights rows passed off as current
+
+    summary, records = run("retried.jsonl", rescore=0.2)  # still stale in the store: the next rescore retries
+    assert summary["reinferred"] == 3 and summary["failed"] == [] and len(records) == 6
+
+
+def test_rescore_matches_per_record_filtering(tmp_path):
+    rng = np.random.default_rng(1)
+    store = DetectionStore(str(tmp_path / "store"), flush_every=50)
+    results = {}
+    for i in range(200):
+        n = int(rng.integers(0, 6))
+        corner = rng.uniform(250, 380, (n, 2))
+        result = Result(Boxes(np.hstack([corner, corner + rng.uniform(5, 40, (n, 2))]), rng.uniform(0.01, 1, n),
+                              rng.integers(0, 2, n)), (640, 640))
+        results[i % 150] = (result, 40 + i * 1e-3)  # ids 0-49 are written twice; the second row wins
+        store.add(i % 150, 40 + i * 1e-3, -105.0, image_hash(b"%d" % i), "v1", result, (640, 640), 18, 256,
+                  source="google")
+    store.close()
+    # a segment written before sources were stored
+    old = store.segments()[1]
+    with np.load(old) as segment:
+        columns = {name: segment[name] for name in segment.files if name not in ("source", "source_vocab")}
+    np.savez(old, **columns)
+
+    table = store.load()
+    assert len(table) == 150 and len(store.load(latest=False)) == 200
+    scored = detection_store.rescore(table, 0.4)
+    written = list(detection_store.records(table, scored))
+    assert {r["image_metadata"]["source"] for r in written} == {"google", "unknown"}
+    assert len(written) == 150
+    for got in written:
+        result, lat = results[got["sample_id"]]
+        want = build_record(got["sample_id"], lat, -105.0, [detection_store.filter_result(result, 0.4)])
+        assert got.keys() == want.keys() and got["detections"] == want["detections"]
+        assert got["pv_area_sqm_est"] == pytest.approx(want["pv_area_sqm_est"])
+        assert got["confidence"] == pytest.approx(want["confidence"])
+
+    path = str(tmp_path / "out.parquet")
+    with ParquetSink(path) as sink:
+        sink.write_table(detection_store.to_arrow(table, scored))
+    rows = pq.read_table(path).to_pylist()
+    assert [row["sample_id"] for row in rows] == [str(r["sample_id"]) for r in written]
+    assert [len(row["detections"]) for row in rows] == [len(r["detections"]) for r in written]
+    assert [row["has_solar"] for row in rows] == [r["has_solar"] for r in written]
+    assert [row["image_metadata"] for row in rows] == [r["image_metadata"] for r in written]
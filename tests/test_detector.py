@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pipeline import detector
+
+
+def _png_bytes(color=(255, 0, 0), size=(8, 6)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color=color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_decode_image_accepts_bytes_paths_and_arrays(tmp_path):
+    data = _png_bytes()
+    path = tmp_path / "img.png"
+    path.write_bytes(data)
+
+    from_bytes = detector.decode_image(data)
+    assert from_bytes.shape == (6, 8, 3)
+    assert tuple(from_bytes[0, 0]) == (0, 0, 255)  # BGR
+    assert np.array_equal(detector.decode_image(str(path)), from_bytes)
+    assert detector.decode_image(from_bytes) is from_bytes
+
+
+class ShapeModel:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, source):
+        sources = source if isinstance(source, list) else [source]
+        self.calls.append(len(sources))
+        return [s.shape for s in sources]
+
+
+def test_batch_inference_decodes_bytes_in_memory_and_keeps_order():
+    model = ShapeModel()
+    images = [_png_bytes(size=(i + 1, 2)) for i in range(5)]
+    out = detector.run_batch_inference(model, images, batch_size=2)
+    assert [r[0] for r in out] == [(2, i + 1, 3) for i in range(5)]
+    assert model.calls == [2, 2, 1]
+
+
+class SingleImageModel:
+    def predict(self, source):
+        return [source]  # treats a list as one input
+
+
+def test_batch_inference_rejects_a_result_count_that_does_not_match_the_batch():
+    with pytest.raises(RuntimeError, match="returned 1 results for a batch of 2 images"):
+        detector.run_batch_inference(SingleImageModel(), [_png_bytes(), _png_bytes()], batch_size=2)
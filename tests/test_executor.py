@@ -0,0 +1,113 @@
+import threading
+import time
+
+from pipeline.executor import Stage, StagedExecutor
+
+
+def test_single_worker_stages_preserve_order_and_batch():
+    out = []
+    batches = []
+
+    def infer(batch):
+        batches.append(len(batch))
+        return [x * 10 for x in batch]
+
+    report = StagedExecutor([
+        Stage("double", lambda x: x * 2),
+        Stage("infer", infer, batch_size=4, queue_size=8),
+        Stage("write", out.append),
+    ]).run(range(10))
+
+    assert out == [x * 20 for x in range(10)]
+    assert sum(batches) == 10 and max(batches) <= 4
+    assert report["write"]["processed"] == 10
+    assert 0.0 <= report["infer"]["utilization"] <= 1.0
+
+
+def test_slow_stage_applies_backpressure():
+    produced = []
+    lock = threading.Lock()
+
+    def produce(x):
+        with lock:
+            produced.append(x)
+        return x
+
+    def slow_write(x):
+        time.sleep(0.02)
+
+    executor = StagedExecutor([
+        Stage("fetch", produce, workers=4, queue_size=2),
+        Stage("write", slow_write, queue_size=2),
+    ])
+    runner = threading.Thread(target=executor.run, args=(range(50),))
+    runner.start()
+    time.sleep(0.1)
+    # only the in-flight items fit between the stages; the producer cannot race ahead of the writer
+    with lock:
+        in_flight = len(produced)
+    runner.join()
+    assert in_flight < 25
+    assert len(produced) == 50
+
+
+def test_errors_are_reported_per_item_and_dropped():
+    failed = []
+    out = []
+
+    def infer(batch):
+        if 3 in batch:
+            raise RuntimeError("bad batch")
+        return batch
+
+    report = StagedExecutor([
+        Stage("infer", infer, batch_size=2, on_error=lambda item, e: failed.append((item, str(e)))),
+        Stage("write", out.append),
+    ]).run(range(6))
+
+    assert sorted(out + [item for item, _ in failed]) == list(range(6))
+    assert (3, "bad batch") in failed
+    assert report["infer"]["errors"] == len(failed)
+
+
+def _run_with_timeout(executor, items, timeout=5):
+    """`executor.run(items)` in a thread; returns (report, exception), or fails the test if the run hangs."""
+    outcome = {}
+
+    def target():
+        try:
+            outcome["report"] = executor.run(items)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "the run hung"
+    return outcome.get("report"), outcome.get("error")
+
+
+def test_a_failing_error_handler_does_not_hang_the_run():
+    def broken_handler(item, e):
+        raise OSError("disk full")
+
+    out = []
+    executor = StagedExecutor([
+        Stage("fetch", lambda item: item, queue_size=1),
+        Stage("infer", lambda item: 1 / 0 if item % 2 else item, queue_size=1, on_error=broken_handler),
+        Stage("write", out.append, queue_size=1),
+    ])
+    report, error = _run_with_timeout(executor, range(20))
+    assert error is None and out == list(range(0, 20, 2))
+    assert report["infer"]["errors"] == report["infer"]["handler_errors"] == 10
+
+
+def test_stages_shut_down_when_the_input_raises():
+    def items():
+        yield from range(5)
+        raise ValueError("bad input row")
+
+    out = []
+    executor = StagedExecutor([Stage("infer", lambda item: item, queue_size=1), Stage("write", out.append)])
+    _, error = _run_with_timeout(executor, items())
+    assert isinstance(error, ValueError) and out == list(range(5))
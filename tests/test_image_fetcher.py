@@ -1,8 +1,11 @@
-import os
-import shutil
-from pipeline import image_fetcher
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+from pipeline import image_fetcher
+
 
 def test_fetch_uses_local_sample(tmp_path):
     # ensure sample exists
@@ -16,3 +19,78 @@ def test_fetch_uses_local_sample(tmp_path):
 
     # cleanup
     out.unlink()
+
+
+class _SlowTileHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the client can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # buffer headers and body into one send; avoids Nagle/delayed-ACK stalls on kept-alive sockets
+    wbufsize = 64 * 1024
+    delay = 0.01
+    body = b"\xff\xd8fake-jpeg\xff\xd9"
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.server.client_ports.add(self.client_address[1])
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowTileHandler)
+    server.client_ports = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("SAT_API_PROVIDER", "url")
+    monkeypatch.setenv("SAT_API_URL_TEMPLATE", f"http://127.0.0.1:{server.server_port}/{{lat}}/{{lon}}.jpg")
+    return server
+
+
+def _timed_fetch(n, concurrency, rate_limit=None):
+    image_fetcher.get_session(pool_size=concurrency)
+    limiter = image_fetcher.HostRateLimiter(rate_limit) if rate_limit else None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        done = list(pool.map(lambda i: (i, image_fetcher.fetch_image_bytes(i * 0.001, i * 0.001, limiter)),
+                             range(n)))
+    return time.perf_counter() - start, done
+
+
+def test_fetches_scale_with_concurrency(monkeypatch):
+    server = _start_stub_server(monkeypatch)
+    try:
+        serial, done = _timed_fetch(100, concurrency=1)
+        parallel, _ = _timed_fetch(100, concurrency=10)
+    finally:
+        server.shutdown()
+
+    assert [key for key, _ in done] == list(range(100))
+    assert all(data == _SlowTileHandler.body for _, data in done)
+    assert parallel * 3 < serial
+    # pooled keep-alive connections: far fewer sockets than requests
+    assert len(server.client_ports) < 50
+
+
+def test_fetches_respect_per_host_rate_limit(monkeypatch):
+    server = _start_stub_server(monkeypatch)
+    try:
+        elapsed, done = _timed_fetch(10, concurrency=10, rate_limit=50)
+    finally:
+        server.shutdown()
+
+    assert len(done) == 10
+    # 10 requests at 50/s need at least 9 intervals of 20 ms
+    assert elapsed >= 0.18
+
+
+def test_session_pool_grows_with_the_workers():
+    session = image_fetcher.get_session()
+    assert image_fetcher.get_session(pool_size=64) is session
+    assert session.get_adapter("https://tiles.invalid")._pool_maxsize >= 64
+    image_fetcher.get_session(pool_size=4)  # never shrinks under other callers
+    assert session.get_adapter("https://tiles.invalid")._pool_maxsize >= 64
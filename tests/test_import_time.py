@@ -0,0 +1,44 @@
+"""Cold-import budget for the entry points: heavy dependencies must only load on first use."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT = os.path.join(ROOT, "Solar-Panel-Detector-master")
+
+# Generous enough for a slow CI box; importing torch/ultralytics alone takes several times this
+IMPORT_BUDGET_SECONDS = 1.5
+HEAVY_MODULES = ["ultralytics", "torch", "pandas", "gradio", "cv2"]
+
+
+def _cold_import(module, path):
+    """Import `module` in a fresh interpreter with `-X importtime`; return its cumulative seconds and loaded modules."""
+    code = (
+        f"import sys; sys.path.insert(0, {path!r}); import {module}; "
+        f"print(','.join(sorted(m.split('.')[0] for m in sys.modules)))"
+    )
+    # the repo root on the path stands in for the installed solar-panel-pipeline package
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=path, env=env,
+                          capture_output=True, text=True, check=True)
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    assert cumulative_us is not None, proc.stderr[-2000:]
+    return cumulative_us / 1e6, set(proc.stdout.strip().split(","))
+
+
+@pytest.mark.parametrize("module,path", [
+    ("pipeline.main", ROOT),
+    ("Predict", os.path.join(PROJECT, "src")),
+    ("main", os.path.join(PROJECT, "src")),
+    ("SolarPanelDetector", os.path.join(PROJECT, "deployment")),
+])
+def test_entry_point_cold_import_within_budget(module, path):
+    seconds, loaded = _cold_import(module, path)
+    assert not loaded & set(HEAVY_MODULES), f"{module} eagerly imports {sorted(loaded & set(HEAVY_MODULES))}"
+    assert seconds < IMPORT_BUDGET_SECONDS, f"cold import of {module} took {seconds:.2f}s"
@@ -0,0 +1,115 @@
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "Solar-Panel-Detector-master", "deployment"))
+
+from inference_server import LatencyHistogram, MicroBatcher, serve  # noqa: E402
+from load_test import MockModel, sample_image_bytes  # noqa: E402
+
+
+def test_concurrent_requests_share_batches():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def predict_batch(images):
+        calls.append(list(images))
+        started.set()
+        release.wait(5)
+        return [image * 10 for image in images]
+
+    batcher = MicroBatcher(predict_batch, max_batch_size=4, max_wait=0.05)
+    first = batcher.submit(0)  # occupies the only worker...
+    started.wait(5)
+    futures = [batcher.submit(i) for i in range(1, 6)]  # ...so these pile up into the following batches
+    release.set()
+    assert first.result(5) == 0 and [f.result(5) for f in futures] == [10, 20, 30, 40, 50]
+    batcher.close()
+
+    assert [len(c) for c in calls] == [1, 4, 1]
+    assert batcher.metrics()["batch_sizes"] == {"1": 2, "4": 1}
+    assert batcher.metrics()["latency"]["count"] == 6
+
+
+def test_errors_reach_every_caller_and_async_predict():
+    def predict_batch(images):
+        if "bad" in images:
+            raise RuntimeError("boom")
+        return images
+
+    batcher = MicroBatcher(predict_batch, max_batch_size=2, max_wait=0.0)
+    with pytest.raises(RuntimeError, match="boom"):
+        batcher.predict("bad", timeout=5)
+    assert asyncio.run(batcher.predict_async("ok")) == "ok"
+    batcher.close()
+
+
+def test_a_bad_input_fails_only_its_own_request():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def predict_batch(images):
+        calls.append(list(images))
+        started.set()
+        release.wait(5)
+        if None in images:
+            raise TypeError("not an image")
+        return [image * 10 for image in images]
+
+    batcher = MicroBatcher(predict_batch, max_batch_size=4, max_wait=0.05)
+    first = batcher.submit(0)
+    started.wait(5)
+    futures = [batcher.submit(image) for image in (1, None, 3)]  # one batch, with a bad image in it
+    release.set()
+    assert first.result(5) == 0 and futures[0].result(5) == 10 and futures[2].result(5) == 30
+    with pytest.raises(TypeError, match="not an image"):
+        futures[1].result(5)
+    batcher.close()
+    assert calls == [[0], [1, None, 3], [1], [None], [3]]
+
+
+def test_histogram_percentiles_and_buckets():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    snap = histogram.snapshot()
+    assert snap["count"] == 100
+    assert snap["p50"] == pytest.approx(0.051) and snap["p99"] == pytest.approx(0.1)
+    assert snap["buckets"]["0.01"] == 10 and snap["buckets"]["+Inf"] == 100
+
+    windowed = LatencyHistogram(window=10)
+    for ms in range(1, 101):
+        windowed.observe(ms / 1000)
+    assert windowed.snapshot()["count"] == 100 and windowed.snapshot()["p50"] == pytest.approx(0.096)
+
+
+def test_http_endpoint_returns_detections_without_rendering():
+    batcher = MicroBatcher(MockModel(call_overhead=0, per_image=0), max_batch_size=4)
+    server = serve(batcher, port=0, min_conf=0.05)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        request = urllib.request.Request(f"{url}/predict", data=sample_image_bytes((64, 64)),
+                                         headers={"Content-Type": "image/jpeg"})
+        with urllib.request.urlopen(request) as response:
+            body = json.loads(response.read())
+        assert body["has_solar"] and body["detections"][0]["bbox"] == [10.0, 10.0, 50.0, 40.0]
+
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert json.loads(response.read())["latency"]["count"] == 1
+
+        low = urllib.request.Request(f"{url}/predict", headers={"Content-Type": "application/json"}, data=json.dumps(
+            {"image": base64.b64encode(sample_image_bytes((64, 64))).decode(), "conf": 0.01}).encode())
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(low)
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        batcher.close()
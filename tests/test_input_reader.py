@@ -0,0 +1,45 @@
+import pytest
+
+from pipeline.input_reader import iter_records, normalize_sample_id
+from pipeline.output_builder import make_record
+
+
+def test_csv_records_are_validated_and_normalized(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text(
+        " Sample_ID ,Latitude,Longitude\n"
+        "1,12.97,77.59\n"
+        "abc,-10.5,20\n"
+        "2,,77.59\n"
+        "3,95,10\n"
+        ",1,1\n"
+    )
+    assert list(iter_records(str(path))) == [(1, 12.97, 77.59), ("abc", -10.5, 20.0)]
+
+
+def test_sample_ids_keep_leading_zeros():
+    assert [normalize_sample_id(v) for v in ("7", " 7 ", 7.0, "7.0", "007", "0", "0.5", 2.5, " a ")] == \
+        [7, 7, 7, 7, "007", 0, "0.5", "2.5", "a"]
+    # the reader, the output records and the checkpoint all see the same id
+    record = make_record(" 007", 0.0, 0.0, [], [], [], 0.0)
+    assert record["sample_id"] == "007" != normalize_sample_id("7")
+
+
+def test_xlsx_records_stream_in_read_only_mode(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["id", "lat", "lng"])
+    ws.append([1.0, 12.97, 77.59])
+    ws.append([2, None, 77.59])
+    path = tmp_path / "in.xlsx"
+    wb.save(path)
+
+    assert list(iter_records(str(path))) == [(1, 12.97, 77.59)]
+
+
+def test_missing_columns_raise(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("name,x,y\na,1,2\n")
+    with pytest.raises(ValueError, match="Required columns not found"):
+        list(iter_records(str(path)))
@@ -0,0 +1,79 @@
+import json
+import pstats
+import time
+
+import pytest
+
+from pipeline import instrumentation
+from pipeline import main as pipeline_main
+
+
+@pytest.fixture(autouse=True)
+def clean_instrumentation():
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_timers_record_nothing_and_cost_little():
+    start = time.perf_counter()
+    for _ in range(100000):
+        with instrumentation.timer("noop"):
+            pass
+        instrumentation.count("noop")
+    assert time.perf_counter() - start < 0.5  # ~1 µs per call on a slow box
+    assert instrumentation.summary() == {"timers": {}, "counters": {}}
+
+
+def test_timers_counters_and_trace(tmp_path):
+    instrumentation.enable(trace=True)
+    for ms in range(1, 101):
+        instrumentation.observe("stage", ms / 1000)
+    with instrumentation.timer("block"):
+        pass
+    instrumentation.count("fetch.bytes", 100)
+    instrumentation.count("fetch.bytes", 23)
+    assert list(instrumentation.timed_iter("parse", iter([1, 2]))) == [1, 2]
+
+    data = instrumentation.summary()
+    assert data["timers"]["stage"]["count"] == 100
+    assert data["timers"]["stage"]["p50"] == pytest.approx(0.051) and data["timers"]["stage"]["p99"] == pytest.approx(0.1)
+    assert data["timers"]["parse"]["count"] == 3  # two rows and the final StopIteration
+    assert data["counters"] == {"fetch.bytes": 123}
+
+    instrumentation.write_trace(str(tmp_path / "trace.json"))
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert len(events) == 104 and all(e["ph"] == "X" for e in events)
+
+
+class SpeedModel:
+    def predict(self, source):
+        class Boxes:
+            xyxy = [[0, 0, 10, 10]]
+            conf = [0.5]
+            cls = [0]
+
+        class Result:
+            boxes = Boxes()
+            speed = {"preprocess": 1.0, "inference": 5.0, "postprocess": 0.5}
+
+        sources = source if isinstance(source, list) else [source]
+        return [Result() for _ in sources]
+
+
+def test_main_reports_stages_and_writes_trace_and_profile(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.csv").write_text("sample_id,lat,lon\n1,1.0,1.0\n2,2.0,2.0\n")
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: SpeedModel())
+    monkeypatch.setattr("pipeline.main.fetch_image_bytes", lambda lat, lon, *args: b"img")
+    monkeypatch.setattr("pipeline.detector.decode_image", lambda data: data)
+
+    summary = pipeline_main.main("in.csv", batch_size=2, trace_path="trace.json", profile_path="run.prof")
+    timers = summary["instrumentation"]["timers"]
+    assert timers["input.parse"]["count"] == 3 and timers["write"]["count"] == 2
+    assert timers["predict"]["count"] == 1
+    assert timers["predict.inference"]["count"] == 2 and timers["predict.inference"]["p50"] == pytest.approx(0.005)
+    assert (tmp_path / "trace.json").exists()
+    assert "predict" in str(pstats.Stats(str(tmp_path / "run.prof")).stats)
+    assert not instrumentation.enabled()
@@ -0,0 +1,45 @@
+import os
+
+from pipeline.model_registry import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, path):
+        self.path = path
+        self.predictions = 0
+
+    def predict(self, source):
+        self.predictions += 1
+        return []
+
+
+def test_registry_loads_once_and_reloads_on_weight_change(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"v1" * 1000)
+    loads = []
+    registry = ModelRegistry(lambda path: loads.append(path) or FakeModel(path))
+
+    first = registry.get(str(weights), warmup_runs=2, warmup_size=8)
+    assert registry.get(str(weights)) is first
+    assert registry.get(os.path.relpath(weights)) is first
+    assert len(loads) == 1
+    assert first.predictions == 2
+
+    weights.write_bytes(b"v2" * 1001)
+    second = registry.get(str(weights))
+    assert second is not first
+    assert len(loads) == 2
+
+    metrics = registry.metrics()
+    assert len(metrics) == 1  # the stale v1 model was dropped
+    assert metrics[0]["checksum"] != "missing"
+    assert metrics[0]["load_seconds"] >= 0 and "warmup_seconds" in metrics[0]
+
+
+def test_missing_weights_are_cached_too(tmp_path):
+    loads = []
+    registry = ModelRegistry(lambda path: loads.append(path) or FakeModel(path))
+    path = str(tmp_path / "absent.pt")
+    assert registry.get(path) is registry.get(path)
+    assert len(loads) == 1
+    assert registry.metrics()[0]["hits"] == 1
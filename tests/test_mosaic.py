@@ -0,0 +1,146 @@
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pipeline import main as pipeline_main
+from pipeline.mosaic import TileMosaic
+from pipeline.tile_planner import pixel_to_lat_lon
+from pipeline.tile_providers import TilePyramidProvider, write_mbtiles
+
+ZOOM = 18
+X0, Y0 = 131000, 90000
+# a 4x4 block of tiles cut from one noisy image, stored losslessly
+SOURCE = np.random.default_rng(0).integers(0, 255, (1024, 1024, 3), dtype=np.uint8)  # BGR
+
+
+def _png(array_bgr):
+    buf = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(array_bgr[..., ::-1])).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+TILES = {(X0 + i, Y0 + j): _png(SOURCE[256 * j:256 * j + 256, 256 * i:256 * i + 256])
+         for i in range(4) for j in range(4)}
+
+
+class SlowTiles(TilePyramidProvider):
+    """In-memory pyramid that takes 20 ms per tile and records how often each tile was read."""
+
+    def __init__(self):
+        super().__init__(zoom=ZOOM)
+        self.reads = []
+        self.concurrent = self.max_concurrent = 0
+        self.lock = threading.Lock()
+
+    def read_tile(self, z, x, y, rate_limiter=None):
+        with self.lock:
+            self.reads.append((x, y))
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        time.sleep(0.02)
+        with self.lock:
+            self.concurrent -= 1
+        return TILES.get((x, y))
+
+
+def _lat_lon(sx, sy):
+    """lat/lon of pixel (sx, sy) of SOURCE."""
+    lat, lon = pixel_to_lat_lon(X0 * 256 + sx, Y0 * 256 + sy, ZOOM)
+    return float(lat), float(lon)
+
+
+def test_view_is_an_exact_crop_of_the_tiles():
+    mosaic = TileMosaic(SlowTiles())
+    view = mosaic.view(*_lat_lon(500, 300), size=300)
+    assert view.shape == (300, 300, 3) and view.dtype == np.uint8
+    np.testing.assert_array_equal(view, SOURCE[150:450, 350:650])  # no lossy re-encoding anywhere
+
+    # part of the window lies outside the stored block: that part is black
+    edge = mosaic.view(*_lat_lon(40, 512), size=200)
+    np.testing.assert_array_equal(edge[:, 60:], SOURCE[412:612, 0:140])
+    assert not edge[:, :60].any()
+    assert mosaic.view(*_lat_lon(-3000, 0), size=200) is None
+
+
+def test_neighbours_share_tiles_fetched_concurrently():
+    provider = SlowTiles()
+    mosaic = TileMosaic(provider, workers=8)
+    points = [_lat_lon(300 + 40 * i, 400 + 30 * i) for i in range(10)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        views = list(pool.map(lambda p: mosaic.view(*p, size=400), points))
+    elapsed = time.perf_counter() - start
+    assert all(v is not None for v in views)
+    assert len(provider.reads) == len(set(provider.reads))  # every tile read once
+    assert mosaic.stats["tiles_fetched"] == len(provider.reads) <= 16
+    assert mosaic.stats["tile_hits"] > 0 and mosaic.stats["views"] == 10
+    assert provider.max_concurrent > 1 and elapsed < 0.02 * len(provider.reads)
+    mosaic.close()
+
+
+def test_failed_tiles_fail_the_view_and_are_fetched_again():
+    class FlakyTiles(SlowTiles):
+        def read_tile(self, z, x, y, rate_limiter=None):
+            data = super().read_tile(z, x, y, rate_limiter)
+            if (x, y) == (X0 + 1, Y0 + 1) and self.reads.count((x, y)) == 1:
+                raise ConnectionError("download failed (status 503)")
+            return data
+
+    provider = FlakyTiles()
+    mosaic = TileMosaic(provider)
+    point = _lat_lon(256, 256)  # the corner of four tiles, one of them failing
+    with pytest.raises(ConnectionError):
+        mosaic.view(*point, size=200)
+    assert mosaic.stats["tiles_failed"] == 1 and mosaic.stats["tiles_missing"] == 0
+    np.testing.assert_array_equal(mosaic.view(*point, size=200), SOURCE[156:356, 156:356])
+    assert provider.reads.count((X0 + 1, Y0 + 1)) == 2 and len(provider.reads) == 5  # only the failed tile again
+    mosaic.close()
+
+
+def test_view_size_follows_the_buffer():
+    small, large = TileMosaic(SlowTiles()), TileMosaic(SlowTiles(), buffer_sqft=20000, min_size=0)
+    assert small.size_for(0.0) == 148  # 2 * (10 px radius at zoom 18 + 64 px context)
+    assert large.size_for(0.0) > small.size_for(0.0) and large.size_for(60.0) > large.size_for(0.0)
+
+
+class ShapeModel:
+    def __init__(self):
+        self.shapes = []
+
+    def predict(self, source):
+        from pipeline.tiling import Boxes, Result
+
+        images = source if isinstance(source, list) else [source]
+        self.shapes.extend(image.shape for image in images)
+        return [Result(Boxes([], [], []), image.shape[:2]) for image in images]
+
+
+def test_pipeline_runs_on_mosaics(tmp_path, monkeypatch):
+    mbtiles = write_mbtiles(str(tmp_path / "tiles.mbtiles"), {(ZOOM, x, y): data for (x, y), data in TILES.items()})
+    monkeypatch.setenv("SAT_API_PROVIDER", "local")
+    monkeypatch.setenv("SAT_TILES_PATH", mbtiles)
+    model = ShapeModel()
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: model)
+    input_csv = tmp_path / "input.csv"
+    rows = [(i, *_lat_lon(200 + 60 * i, 500)) for i in range(8)]
+    input_csv.write_text("sample_id,latitude,longitude\n" + "".join(f"{i},{lat},{lon}\n" for i, lat, lon in rows))
+    output = tmp_path / "out.jsonl"
+
+    summary = pipeline_main.main(str(input_csv), output_format="jsonl", output_path=str(output),
+                                 checkpoint_path=str(tmp_path / "ckpt.log"), mosaic=True)
+    assert summary["failed"] == 0 and len(output.read_text().splitlines()) == 8
+    assert all(json.loads(line)["qc_status"] == "VERIFIABLE" for line in output.read_text().splitlines())
+    size = TileMosaic(SlowTiles()).size_for(rows[0][1])
+    assert size == 160 and model.shapes == [(size, size, 3)] * 8  # ~48 degrees north: finer pixels, wider buffer
+    assert summary["mosaic"]["views"] == 8 and summary["mosaic"]["tiles_fetched"] <= 8
+
+    monkeypatch.setenv("SAT_API_PROVIDER", "url")
+    monkeypatch.setenv("SAT_API_URL_TEMPLATE", "http://tiles.invalid/{lat}/{lon}.jpg")
+    with pytest.raises(ValueError, match="tile pyramid"):
+        pipeline_main.main(str(input_csv), checkpoint_path=str(tmp_path / "ckpt2.log"), mosaic=True)
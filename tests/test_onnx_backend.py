@@ -0,0 +1,109 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from pipeline import detector
+from pipeline.onnx_backend import letterbox, postprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_backends import matched_fraction, synthetic_yolo_onnx  # noqa: E402
+
+
+def test_postprocess_undoes_letterbox_and_suppresses_duplicates():
+    image = np.zeros((320, 640, 3), dtype=np.uint8)  # wide: padded top and bottom
+    padded, gain, pad = letterbox(image, 640)
+    assert padded.shape == (640, 640, 3) and gain == 1.0 and pad == (0, 160)
+    assert padded[0, 0, 0] == 114 and padded[200, 0, 0] == 0
+
+    # (4 + 2 classes, 4 anchors): two overlapping class-0 boxes, one class-1 box, one below the threshold
+    output = np.array([
+        [100, 102, 300, 500],     # cx
+        [260, 260, 400, 300],     # cy (letterboxed: +160)
+        [40, 40, 20, 20],         # w
+        [20, 20, 10, 10],         # h
+        [0.9, 0.8, 0.1, 0.1],     # class 0
+        [0.0, 0.1, 0.7, 0.2],     # class 1
+    ], dtype=np.float32)
+    boxes = postprocess(output, gain, pad, (320, 640), conf=0.25, iou=0.5)
+    np.testing.assert_allclose(boxes.xyxy, [[80, 90, 120, 110], [290, 235, 310, 245]])
+    np.testing.assert_allclose(boxes.conf, [0.9, 0.7])
+    assert boxes.cls.tolist() == [0.0, 1.0]
+
+
+def test_onnx_and_int8_backends_match_the_results_contract(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    from pipeline.onnx_backend import OnnxDetector, quantize_int8
+
+    fp32 = synthetic_yolo_onnx(str(tmp_path / "best.onnx"))
+    int8 = quantize_int8(fp32, str(tmp_path / "best.int8.onnx"))
+    assert os.path.getsize(int8) < os.path.getsize(fp32)
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(3)]
+    outputs = {}
+    for name, path in (("fp32", fp32), ("int8", int8)):
+        model = OnnxDetector(path, conf=0.6)
+        assert model.batched
+        outputs[name] = detector.run_batch_inference(model, images, batch_size=2)
+        for (result,) in outputs[name]:
+            assert result.orig_shape == (480, 640)
+            assert result.boxes.xyxy.dtype == np.float32 and result.boxes.xyxy.shape[1] == 4
+            assert len(result.boxes.conf) == len(result.boxes.cls) == len(result.boxes)
+            assert (result.boxes.xyxy[:, 2] <= 640).all() and (result.boxes.xyxy[:, 3] <= 480).all()
+            assert set(result.speed) == {"preprocess", "inference", "postprocess"}
+    assert sum(len(r[0].boxes) for r in outputs["fp32"]) > 0
+    # int8 weights move scores and boxes a little; nearly every fp32 detection must survive
+    assert matched_fraction(outputs["fp32"], outputs["int8"]) >= 0.9
+
+
+def test_torch_and_onnx_backends_agree(tmp_path):
+    pytest.importorskip("ultralytics")
+    pytest.importorskip("onnxruntime")
+    from generate_sample_image import make_sample_image  # on the path via bench_backends
+
+    weights = str(tmp_path / "best.pt")
+    images = [np.asarray(make_sample_image(seed=seed))[..., ::-1].copy() for seed in range(4)]
+    torch_out = detector.run_batch_inference(detector.load_model(weights, backend="torch"), images)
+    onnx_out = detector.run_batch_inference(detector.load_model(weights, backend="onnx"), images)
+    assert matched_fraction(torch_out, onnx_out) >= 0.95
+    for (t,), (o,) in zip(torch_out, onnx_out):
+        assert abs(len(t.boxes) - len(o.boxes)) <= max(1, len(t.boxes) // 10)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="onnx-int8"):
+        detector.backend_path("model/best.pt", "tensorrt")
+    assert detector.backend_path("model/best.pt", "torch") == "model/best.pt"
+
+
+def test_exports_are_tagged_by_the_weights_they_came_from(tmp_path, monkeypatch):
+    exported = []
+
+    def export_onnx(model, output_path, imgsz=640):
+        exported.append(model)
+        with open(output_path, "w") as f:
+            f.write(f"onnx of {model}")
+
+    monkeypatch.setattr("pipeline.onnx_backend.export_onnx", export_onnx)
+    monkeypatch.setattr("pipeline.onnx_backend.quantize_int8", lambda fp32, out: open(out, "w").close())
+    monkeypatch.setattr(detector, "_load_yolo", lambda path, fallback=True: open(path).read()[:2])
+    weights = tmp_path / "best.pt"
+    with pytest.raises(RuntimeError, match="missing"):  # never export the pretrained fallback as these weights
+        detector.backend_path(str(weights), "onnx")
+
+    weights.write_text("v1" * 1000)
+    first = detector.backend_path(str(weights), "onnx-int8")
+    assert detector.backend_path(str(weights), "onnx-int8") == first and exported == ["v1"]
+    key = detector.model_checksum(str(weights), backend="onnx")
+    assert key != detector.model_checksum(str(weights), backend="torch")
+
+    weights.write_text("v2" * 1000)
+    os.utime(weights, (0, 0))  # same size as before: only the mtime tells the registry to re-hash
+    second = detector.backend_path(str(weights), "onnx")
+    assert second != detector.backend_path(str(weights), "onnx-int8") and exported == ["v1", "v2"]
+    assert open(second).read() == "onnx of v2" and detector.model_checksum(str(weights), backend="onnx") != key
+    assert len(os.listdir(tmp_path)) == 5  # the weights and both exports of each, no leftover temp directories
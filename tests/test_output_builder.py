@@ -32,3 +32,39 @@ def test_save_output_creates_json(tmp_path, monkeypatch):
         assert len(data["detections"]) == 1
     finally:
         os.chdir(cwd)
+
+
+def test_jsonl_sink_buffers_and_reports_durable_records(tmp_path):
+    from pipeline.output_builder import JsonlSink, build_record
+
+    path = tmp_path / "out.jsonl"
+    durable = []
+    with JsonlSink(str(path), flush_every=2) as sink:
+        for i in range(3):
+            sink.write(build_record(i, 1.0, 2.0, [DummyResult()]), done=lambda i=i: durable.append(i))
+            if i == 0:
+                assert durable == [] and path.read_text() == ""
+        assert durable == [0, 1]
+    assert durable == [0, 1, 2]
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["sample_id"] for r in rows] == [0, 1, 2]
+    assert rows[0]["detections"][0]["bbox"] == [10.0, 10.0, 50.0, 30.0]
+    assert "bbox_or_mask" not in rows[0]
+
+
+def test_parquet_sink_stores_detections_as_nested_columns(tmp_path):
+    import pytest
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    from pipeline.output_builder import build_record, make_sink
+
+    path = tmp_path / "out.parquet"
+    with make_sink("parquet", str(path), flush_every=1) as sink:
+        sink.write(build_record("a", 1.0, 2.0, [DummyResult()]))
+        sink.write(build_record(7, 3.0, 4.0, [DummyResult()]))
+
+    table = pq.read_table(path)
+    assert table.column("sample_id").to_pylist() == ["a", "7"]
+    assert str(table.schema.field("detections").type).startswith("list<")
+    assert table.column("detections").to_pylist()[0][0]["bbox"] == [10.0, 10.0, 50.0, 30.0]
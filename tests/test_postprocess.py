@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from pipeline import area
+from pipeline.output_builder import build_record, make_record
+from pipeline.postprocess import DetectionBatch
+from pipeline.tiling import Boxes, Result
+
+
+def _results(n, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    for _ in range(n):
+        k = int(rng.integers(0, 5))
+        corner = rng.uniform(250, 380, (k, 2))
+        results.append(Result(Boxes(np.hstack([corner, corner + rng.uniform(5, 40, (k, 2))]), rng.uniform(0, 1, k),
+                                    rng.integers(0, 3, k)), (640, 640)))
+    return results
+
+
+def test_batch_matches_per_sample_records():
+    results = _results(60)
+    lats = np.linspace(-60, 60, 60)
+    detections = DetectionBatch.from_results(results)
+    areas = detections.areas(lats, 18)
+    np.testing.assert_allclose(areas, area.estimate_result_areas(results, lats, 18))
+
+    records = [make_record(i, lats[i], 1.0, *split, areas[i]) for i, split in enumerate(detections.split())]
+    assert records == [build_record(i, lats[i], 1.0, [r]) for i, r in enumerate(results)]
+
+
+def test_select_and_summary():
+    results = _results(40, seed=1)
+    detections = DetectionBatch.from_results(results)
+    kept = detections.select(min_conf=0.5, classes=[0, 2])
+    count, confidence = kept.summary()
+    for r, n, best in zip(results, count, confidence):
+        mask = (r.boxes.conf >= 0.5) & np.isin(r.boxes.cls, [0, 2])
+        assert n == mask.sum() and best == pytest.approx(r.boxes.conf[mask].max() if mask.any() else 0.0)
+    splits = list(kept.split())
+    assert len(splits) == 40 and all(set(classes) <= {0, 2} for _, _, classes in splits)
+    assert len(DetectionBatch.from_results([])) == 0 and list(DetectionBatch.from_results([]).split()) == []
@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pipeline import detector, image_fetcher
+from pipeline import main as pipeline_main
+from pipeline.prefilter import QC_EMPTY, QC_INVALID, TilePrefilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from generate_sample_image import make_sample_image  # noqa: E402
+
+
+def _jpeg(array_bgr):
+    buf = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(array_bgr[..., ::-1])).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _textured(bgr, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.clip(np.array(bgr) + rng.normal(0, noise, (640, 640, 3)), 0, 255).astype(np.uint8)
+
+
+def test_placeholder_water_and_forest_are_skipped_but_scenes_are_not():
+    prefilter = TilePrefilter()
+    placeholder = detector.decode_image(image_fetcher._placeholder_image_bytes())
+    water = detector.decode_image(_jpeg(_textured((90, 60, 30), 6)))
+    forest = detector.decode_image(_jpeg(_textured((30, 110, 40), 20)))
+    scene = np.asarray(make_sample_image(seed=3))[..., ::-1]
+
+    assert prefilter.check(placeholder) == QC_INVALID
+    assert prefilter.check(np.zeros((8, 8, 3), dtype=np.uint8)) == QC_INVALID
+    assert prefilter.check(water) == QC_EMPTY
+    assert prefilter.check(forest) == QC_EMPTY
+    assert prefilter.check(scene) is None
+    sample = os.path.join(os.path.dirname(image_fetcher.__file__), "examples", "sample_satellite.jpg")
+    assert prefilter.check(detector.decode_image(sample)) is None
+
+    # an optional classifier can only skip more tiles
+    strict = TilePrefilter(classifier=lambda stats: 0.0)
+    assert strict.check(scene) == QC_EMPTY
+
+    report = prefilter.report()
+    assert (report["checked"], report["empty"], report["invalid"]) == (6, 2, 2)
+    assert report["skip_rate"] == 4 / 6 and "recall" not in report
+
+
+class CountingModel:
+    def __init__(self):
+        self.images = 0
+
+    def predict(self, source):
+        from pipeline.tiling import Boxes, Result
+
+        images = source if isinstance(source, list) else [source]
+        self.images += len(images)
+        return [Result(Boxes([[0, 0, 10, 10]], [0.5], [0]), image.shape[:2]) for image in images]
+
+
+def _run(tmp_path, monkeypatch, **kwargs):
+    images = {1: _jpeg(np.asarray(make_sample_image(seed=1))[..., ::-1]),
+              2: image_fetcher._placeholder_image_bytes(),
+              3: _jpeg(_textured((90, 60, 30), 6))}
+    monkeypatch.setattr(pipeline_main, "fetch_image_bytes", lambda lat, lon, rate_limiter=None: images[int(lat)])
+    model = CountingModel()
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: model)
+    input_csv = tmp_path / "input.csv"
+    input_csv.write_text("sample_id,latitude,longitude\n1,1,0\n2,2,0\n3,3,0\n")
+    output = tmp_path / "out.jsonl"
+    summary = pipeline_main.main(str(input_csv), output_format="jsonl", output_path=str(output),
+                                 checkpoint_path=str(tmp_path / "ckpt.log"), **kwargs)
+    records = {r["sample_id"]: r for r in map(json.loads, output.read_text().splitlines())}
+    return model, summary, records
+
+
+def test_pipeline_skips_the_model_for_prefiltered_tiles(tmp_path, monkeypatch):
+    model, summary, records = _run(tmp_path, monkeypatch, prefilter=True)
+    assert model.images == 1
+    assert [records[i]["qc_status"] for i in (1, 2, 3)] == ["VERIFIABLE", QC_INVALID, QC_EMPTY]
+    assert records[1]["has_solar"] and not records[2]["has_solar"] and not records[3]["has_solar"]
+    assert records[3]["detections"] == [] and records[3]["pv_area_sqm_est"] == 0.0
+    assert summary["prefilter"]["skip_rate"] == 2 / 3
+
+
+def test_audit_runs_the_model_everywhere_and_measures_recall(tmp_path, monkeypatch):
+    model, summary, records = _run(tmp_path, monkeypatch, prefilter_audit=True)
+    assert model.images == 3
+    assert all(r["qc_status"] == "VERIFIABLE" and r["has_solar"] for r in records.values())
+    report = summary["prefilter"]
+    assert (report["positives"], report["missed"]) == (3, 2)  # the mock "detects" panels everywhere
+    assert report["recall"] == pytest.approx(1 / 3)
@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "Solar-Panel-Detector-master", "deployment"))
+
+import SolarPanelDetector  # noqa: E402
+from result_cache import ResultCache, address_key, image_key  # noqa: E402
+
+
+def test_lru_bounds_and_ttl(monkeypatch):
+    cache = ResultCache(max_entries=3, max_bytes=100, ttl=10)
+    for key in "abc":
+        cache.put(key, b"x" * 10)
+    assert cache.get("a") == b"x" * 10  # "b" is now the least recently used
+    cache.put("d", b"y" * 10)
+    assert cache.get("b") is None and cache.get("a") is not None
+    cache.put("e", b"z" * 91)  # over the byte budget: evicts until it fits
+    assert cache.get("e") is not None and cache.get("a") is None
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["bytes"] == 91 and stats["evictions"] == 4
+    assert stats["hits"] == 3 and stats["misses"] == 2 and stats["hit_rate"] == 0.6
+
+    now = time.time()
+    monkeypatch.setattr("result_cache.time.time", lambda: now + 11)
+    assert cache.get("e") is None and cache.stats()["expired"] == 1 and cache.stats()["bytes"] == 0
+
+
+def test_disk_store_is_shared_between_workers(tmp_path):
+    first, second = (ResultCache(directory=str(tmp_path)) for _ in range(2))
+    first.put("k", b"result")
+    assert second.get("k") == b"result" and second.stats()["disk_hits"] == 1
+    assert second.get("k") == b"result" and second.stats()["hits"] == 1  # now held in memory too
+    assert ResultCache(directory=str(tmp_path), ttl=-1).get("missing") is None
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return b"value"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(cache.get_or_compute, "k", compute) for _ in range(8)]
+        time.sleep(0.05)
+        release.set()
+        assert [f.result(5) for f in futures] == [b"value"] * 8
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 7  # the waiters count as hits
+    assert cache.get_or_compute("k", lambda: pytest.fail("computed a cached key")) == b"value"
+    assert cache.get_or_compute("none", lambda: None) is None and cache.get("none") is None
+
+
+def test_stats_are_logged_periodically(capsys):
+    cache = ResultCache(max_entries=4, max_bytes=1024 ** 2)
+    cache.put("k", b"value")
+    cache.get("k")
+    stop = threading.Event()
+    thread = cache.log_stats(0.01, stop)
+    time.sleep(0.05)
+    stop.set()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert "Result cache: hit rate 100.0% (1 memory, 0 disk, 0 misses), 1/4 entries" in capsys.readouterr().out
+
+
+def test_keys_normalize_equivalent_inputs(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 255, (32, 32, 3), dtype=np.uint8)
+    path = str(tmp_path / "im.png")
+    Image.fromarray(pixels).save(path)
+    assert image_key(path, 0.45) == image_key(Image.fromarray(pixels), 0.45) == image_key(pixels, 0.45)
+    assert image_key(pixels, 0.45) != image_key(pixels, 0.5)
+    assert address_key("10 Downing  Street, London", 18, "640x640") == address_key("10 downing street, london", 18,
+                                                                                    "640X640")
+    assert address_key("48.1234561, 11.5", 18, 640) == address_key("48.123456,11.500001", "18", "640x640")
+    assert address_key("48.12345, 11.5", 18, 640) != address_key("48.12345, 11.5", 19, 640)
+
+
+class FakeBoxes:
+    def __init__(self, conf):
+        self.conf = np.asarray(conf)
+
+
+class FakeResult:
+    def __init__(self, image, conf):
+        self.image, self.boxes = image, FakeBoxes(conf)
+
+    def __getitem__(self, keep):
+        return FakeResult(self.image, self.boxes.conf[keep])
+
+    def plot(self):
+        return self.image[..., ::-1]  # BGR, like ultralytics
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, image):
+        self.calls += 1
+        if isinstance(image, str):
+            image = Image.open(image)
+        return FakeResult(np.asarray(image), [0.3, 0.6])
+
+
+def test_predict_and_detector_reuse_cached_results(tmp_path, monkeypatch):
+    batcher = FakeBatcher()
+    monkeypatch.setattr(SolarPanelDetector, "_batcher", batcher)
+    monkeypatch.setattr(SolarPanelDetector, "_result_cache", ResultCache())
+    monkeypatch.setattr(SolarPanelDetector, "_model_version", "v1")
+    image = Image.fromarray(np.random.default_rng(1).integers(0, 255, (64, 64, 3), dtype=np.uint8))
+
+    im, text = SolarPanelDetector.solar_panel_predict(image)
+    assert im.size == (64, 64) and text and batcher.calls == 1
+    again, _ = SolarPanelDetector.solar_panel_predict(image.copy())
+    assert batcher.calls == 1 and np.array_equal(np.asarray(again), np.asarray(im))
+    SolarPanelDetector.solar_panel_predict(image, conf=0.9)  # another threshold is another result
+    assert batcher.calls == 2
+
+    fetched = []
+    path = str(tmp_path / "fetched.png")
+    image.save(path)
+    monkeypatch.setattr(SolarPanelDetector, "fetch_satellite_image",
+                        lambda address, api_key, zoom, size: fetched.append(address) or path)
+    SolarPanelDetector.detector("1 Main St", "key")
+    SolarPanelDetector.detector(" 1 main st ", "key")
+    assert fetched == ["1 Main St"] and batcher.calls == 3
+    assert SolarPanelDetector.get_result_cache().stats()["hits"] == 2
+
+    monkeypatch.setattr(FakeResult, "plot", None)  # nothing may be drawn without `render`
+    im, text = SolarPanelDetector.solar_panel_predict(image, render=False)
+    assert im is None and text and batcher.calls == 4
+    with pytest.raises(ValueError, match="at least"):
+        SolarPanelDetector.solar_panel_predict(image, conf=SolarPanelDetector.BATCH_CONF / 2)
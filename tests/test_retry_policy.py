@@ -0,0 +1,138 @@
+import email.utils
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pipeline import image_fetcher
+from pipeline.retry_policy import CircuitBreaker, RetryPolicy, parse_retry_after
+
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    """Replies to each path with the next scripted `(status, headers)`, then 200 once the script runs out."""
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append(self.path)
+            script = server.scripts.get(self.path, [])
+            status, headers = script.pop(0) if script else (200, {})
+        body = b"tile" if status == 200 else b"error"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ScriptedHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = []
+    server.scripts = {}
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    image_fetcher._breakers.clear()
+
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0.05, max_delay=1.0, rng=random.Random(0))
+
+
+def test_client_errors_fail_at_once_and_transient_errors_retry(stub):
+    stub.scripts["/bad-key"] = [(403, {})] * 3
+    start = time.perf_counter()
+    assert image_fetcher._download_with_retries(stub.url + "/bad-key", policy=FAST) is None
+    assert time.perf_counter() - start < 0.2 and stub.hits == ["/bad-key"]
+
+    stub.scripts["/flaky"] = [(503, {}), (502, {})]
+    assert image_fetcher._download_with_retries(stub.url + "/flaky", policy=FAST) == b"tile"
+    assert stub.hits.count("/flaky") == 3
+
+
+def test_retry_after_is_honoured_and_too_long_gives_up(stub):
+    stub.scripts["/limited"] = [(429, {"Retry-After": "0.3"})]
+    start = time.perf_counter()
+    assert image_fetcher._download_with_retries(stub.url + "/limited", policy=FAST) == b"tile"
+    assert time.perf_counter() - start >= 0.3
+
+    stub.scripts["/later"] = [(503, {"Retry-After": "120"})]
+    start = time.perf_counter()
+    assert image_fetcher._download_with_retries(stub.url + "/later", policy=FAST) is None
+    assert time.perf_counter() - start < 0.2 and stub.hits.count("/later") == 1
+
+
+def test_no_wait_after_the_last_attempt(stub):
+    stub.scripts["/down"] = [(500, {})] * 5
+    policy = RetryPolicy(max_attempts=2, base_delay=0.0, max_delay=0.0)
+    start = time.perf_counter()
+    assert image_fetcher._download_with_retries(stub.url + "/down", policy=policy) is None
+    assert stub.hits.count("/down") == 2 and time.perf_counter() - start < 0.2
+
+
+def test_circuit_breaker_fails_fast_once_provider_is_down(stub):
+    stub.scripts["/tile"] = [(500, {})] * 100
+    policy = RetryPolicy(max_attempts=1)
+    for _ in range(10):
+        assert image_fetcher._download_with_retries(stub.url + "/tile", policy=policy) is None
+    assert len(stub.hits) == 5  # the default breaker opens after 5 consecutive failures
+    assert image_fetcher.get_circuit_breaker(stub.url).state == CircuitBreaker.OPEN
+
+
+def test_failures_can_raise_while_missing_resources_return_none(stub):
+    stub.scripts["/outside"] = [(404, {})]
+    stub.scripts["/down"] = [(500, {})] * 5
+    policy = RetryPolicy(max_attempts=2, base_delay=0.0, max_delay=0.0)
+    assert image_fetcher._download_with_retries(stub.url + "/outside", policy=policy, raise_on_failure=True) is None
+    with pytest.raises(ConnectionError, match="status 500"):
+        image_fetcher._download_with_retries(stub.url + "/down", policy=policy, raise_on_failure=True)
+
+
+def test_breaker_half_opens_after_timeout():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    assert not breaker.record_failure() and breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 11
+    assert breaker.allow() and not breaker.allow()  # a single trial request
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_waiting_retry_does_not_block_other_downloads(stub):
+    stub.scripts["/slow"] = [(503, {"Retry-After": "0.5"})]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        waiting = pool.submit(image_fetcher._download_with_retries, stub.url + "/slow", policy=FAST)
+        time.sleep(0.05)
+        start = time.perf_counter()
+        others = list(pool.map(lambda i: image_fetcher._download_with_retries(f"{stub.url}/ok/{i}", policy=FAST),
+                               range(20)))
+        assert time.perf_counter() - start < 0.4 and all(o == b"tile" for o in others)
+        assert not waiting.done()
+        assert waiting.result() == b"tile"
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=4.0, rng=random.Random(1))
+    delays = [policy.delay(attempt) for attempt in range(1, 10)]
+    assert all(0 <= d <= min(4.0, 2 ** (a - 1)) for a, d in zip(range(1, 10), delays))
+    assert len(set(delays)) == len(delays)
+    assert policy.delay(10) is None
+
+    assert parse_retry_after("7") == 7.0
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(in_a_minute) <= 60
+    assert parse_retry_after("soon") is None
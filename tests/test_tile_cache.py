@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import image_fetcher
+from pipeline.tile_cache import TileCache
+
+
+def test_key_normalizes_and_rounds_coordinates(tmp_path):
+    cache = TileCache(str(tmp_path), precision=4)
+    base = cache.key("Mapbox ", 12.97161, 77.59459, 16, "512x512")
+    assert cache.key("mapbox", 12.971612, 77.594588, 16, (512, 512)) == base
+    assert cache.key("mapbox", 12.9716, 77.5946, 17, "512x512") != base
+    assert cache.address_key("google", "12.97161, 77.59459", 16, 512) == cache.key("google", 12.9716, 77.5946, 16, 512)
+
+
+def test_hit_miss_counters_and_lru_eviction(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=250)
+    keys = [cache.key("p", i, i, 18, 640) for i in range(3)]
+    cache.put(keys[0], b"a" * 100)
+    cache.put(keys[1], b"b" * 100)
+    # touch the first entry so the second becomes least recently used
+    past = time.time() - 60
+    os.utime(cache._path(keys[1]), (past, past))
+    assert cache.get(keys[0]) == b"a" * 100
+    cache.put(keys[2], b"c" * 100)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == b"c" * 100
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 250
+
+
+def test_eviction_goes_below_the_low_water_mark(tmp_path, monkeypatch):
+    cache = TileCache(str(tmp_path), max_bytes=1000)
+    for i in range(10):
+        cache.put(cache.key("p", i, i, 18, 640), b"x" * 100)
+        os.utime(cache._path(cache.key("p", i, i, 18, 640)), (i, i))
+    cache.put(cache.key("p", 0, 0, 18, 640), b"y" * 100)  # overwriting an entry doesn't grow the cache
+    assert cache.stats()["bytes"] == 1000 and cache.stats()["evictions"] == 0
+
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+    for i in range(10, 20):
+        cache.put(cache.key("p", i, i, 18, 640), b"x" * 100)
+    assert len(scans) == 5  # one scan frees room for the next writes instead of one scan per write
+    assert cache.stats()["bytes"] <= 1000 and cache.stats()["evictions"] == 10
+
+
+def test_parallel_writers_share_cache(tmp_path):
+    cache = TileCache(str(tmp_path))
+    key = cache.key("p", 1, 2, 18, 640)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: cache.put(key, bytes([i % 256]) * 1000), range(64)))
+    data = cache.get(key)
+    assert len(data) == 1000 and len(set(data)) == 1
+    assert not [n for n in os.listdir(os.path.dirname(cache._path(key))) if n.startswith(".tmp-")]
+
+
+def test_fetch_image_checks_cache_before_network(tmp_path, monkeypatch):
+    monkeypatch.setenv("SAT_API_PROVIDER", "url")
+    monkeypatch.setenv("SAT_API_URL_TEMPLATE", "http://tiles.invalid/{lat}/{lon}.jpg")
+    calls = []
+    monkeypatch.setattr(image_fetcher, "_download_with_retries", lambda url, **kw: calls.append(url) or b"tile")
+    cache = TileCache(str(tmp_path / "cache"), precision=3)
+
+    image_fetcher.fetch_image(1.00001, 2.00001, str(tmp_path / "a.jpg"), cache=cache)
+    image_fetcher.fetch_image(1.00002, 2.00002, str(tmp_path / "b.jpg"), cache=cache)
+
+    assert len(calls) == 1
+    assert (tmp_path / "b.jpg").read_bytes() == b"tile"
+    assert cache.stats()["hits"] == 1
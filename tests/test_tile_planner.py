@@ -0,0 +1,79 @@
+import numpy as np
+
+from pipeline import main as pipeline_main
+from pipeline.checkpoint import CompletionIndex
+from pipeline.tile_planner import TilePlanner, assign_detections, lat_lon_to_pixel, pixel_to_lat_lon
+from pipeline.tiling import Boxes, Result
+
+
+def test_pixel_round_trip():
+    x, y = lat_lon_to_pixel([37.7749, -33.86], [-122.4194, 151.21], 18)
+    lat, lon = pixel_to_lat_lon(x, y, 18)
+    assert np.allclose(lat, [37.7749, -33.86]) and np.allclose(lon, [-122.4194, 151.21])
+
+
+def test_nearby_points_share_an_image_and_keep_their_positions():
+    planner = TilePlanner(zoom=18, image_size=640)
+    records = [(1, 37.77490, -122.41940), (2, 37.77495, -122.41930), (3, 40.0, -100.0)]
+    jobs = list(planner.plan(records))
+
+    assert len(jobs) == 2
+    shared, single = jobs
+    assert [s[0] for s in shared.samples] == [1, 2]
+    assert single.positions is None and (single.lat, single.lon) == (40.0, -100.0)
+    assert planner.stats == {"samples": 3, "images": 2} and planner.dedup_ratio == 1.5
+
+    # each member's position in the shared image matches its offset from the image centre
+    cx, cy = lat_lon_to_pixel(shared.lat, shared.lon, 18)
+    for (_, lat, lon), (px, py) in zip(shared.samples, shared.positions):
+        x, y = lat_lon_to_pixel(lat, lon, 18)
+        assert np.allclose([px - 320, py - 320], [x - cx, y - cy])
+        margin = planner.radius_px(lat)
+        assert margin <= px <= 640 - margin and margin <= py <= 640 - margin
+
+
+def test_detections_are_assigned_by_buffer_and_shifted_to_sample_frame():
+    result = Result(Boxes([[100, 100, 110, 110], [300, 300, 320, 320]], [0.9, 0.8], [0, 0]), (640, 640))
+    per_sample = assign_detections(result, [[105, 120], [500, 500]], radius_px=15, image_shape=(640, 640))
+
+    assert len(per_sample[0].boxes) == 1 and len(per_sample[1].boxes) == 0
+    # the sample at (105, 120) ends up at the image centre, so its box moves by (215, 200)
+    assert np.allclose(per_sample[0].boxes.xyxy, [[315, 300, 325, 310]])
+
+
+def test_main_fetches_shared_images_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.csv").write_text("sample_id,lat,lon\n1,37.77490,-122.41940\n2,37.77495,-122.41930\n"
+                                     "3,40.0,-100.0\n")
+    fetched = []
+
+    class Model:
+        def predict(self, source):
+            sources = source if isinstance(source, list) else [source]
+            return [Result(Boxes(np.empty((0, 4)), [], []), (640, 640)) for _ in sources]
+
+    def fetch(lat, lon, *args):
+        fetched.append((lat, lon))
+        return b"img"
+
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: Model())
+    monkeypatch.setattr("pipeline.main.fetch_image_bytes", fetch)
+    monkeypatch.setattr("pipeline.detector.decode_image", lambda data: np.zeros((640, 640, 3), dtype=np.uint8))
+
+    pipeline_main.main("in.csv", batch_size=2, dedup=True)
+    assert len(fetched) == 2
+    assert sorted(p.name for p in (tmp_path / "predictions").glob("*.json")) == ["1.json", "2.json", "3.json"]
+
+    # a sample that fails to write fails alone, not the samples sharing its image that were already written
+    make_record = pipeline_main.make_record
+
+    def flaky(sample_id, *args, **kwargs):
+        if sample_id == 2:
+            raise OSError("disk full")
+        return make_record(sample_id, *args, **kwargs)
+
+    monkeypatch.setattr("pipeline.main.make_record", flaky)
+    summary = pipeline_main.main("in.csv", batch_size=2, dedup=True, checkpoint_path="write.log")
+    index = CompletionIndex("write.log")
+    assert summary["failed"] == 1 and index.is_failed(2, 37.77495, -122.41930)
+    assert index.is_done(1, 37.77490, -122.41940) and not index.is_failed(1, 37.77490, -122.41940)
@@ -0,0 +1,174 @@
+import io
+import socket
+
+import numpy as np
+import pytest
+import requests
+from PIL import Image
+
+from pipeline import image_fetcher, tile_providers
+from pipeline.tile_cache import TileCache
+from pipeline.tile_planner import pixel_to_lat_lon
+from pipeline.tile_providers import (DirectoryTileProvider, GoogleStaticMapsProvider, MBTilesProvider, is_image,
+                                     tile_for, write_mbtiles)
+from pipeline.tile_server import serve
+
+ZOOM = 18
+X0, Y0 = 131000, 90000
+
+
+def _tile(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (256, 256), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# a 3x3 block of solid tiles, each a different colour
+COLORS = {(X0 + i, Y0 + j): (40 * i + 20, 40 * j + 20, 200) for i in range(3) for j in range(3)}
+TILES = {(ZOOM, x, y): _tile(color) for (x, y), color in COLORS.items()}
+
+
+def _point(px, py):
+    """lat/lon of global pixel (px, py)."""
+    lat, lon = pixel_to_lat_lon(px, py, ZOOM)
+    return float(lat), float(lon)
+
+
+@pytest.fixture(params=["mbtiles", "directory"])
+def provider(request, tmp_path):
+    if request.param == "mbtiles":
+        return MBTilesProvider(write_mbtiles(str(tmp_path / "t.mbtiles"), TILES), image_size=256)
+    for (z, x, y), data in TILES.items():
+        (tmp_path / str(z) / str(x)).mkdir(parents=True, exist_ok=True)
+        (tmp_path / str(z) / str(x) / f"{y}.png").write_bytes(data)
+    return DirectoryTileProvider(str(tmp_path), zoom=ZOOM, image_size=256)
+
+
+def _rgb(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB")).astype(int)
+
+
+def test_local_providers_cut_the_window_centred_on_a_point(provider):
+    assert provider.zoom == ZOOM and provider.geometry() == {"zoom": ZOOM, "tile_size": 256, "image_size": 256}
+    assert provider.read_tile(ZOOM, X0, Y0) == TILES[(ZOOM, X0, Y0)]
+    assert provider.read_tile(ZOOM, X0 - 1, Y0) is None
+
+    # centred on the corner shared by 4 tiles: each quadrant comes from a different tile
+    lat, lon = _point((X0 + 1) * 256, (Y0 + 1) * 256)
+    assert tile_for(lat + 1e-6, lon - 1e-6, ZOOM) == (X0, Y0)
+    image = _rgb(provider.fetch(lat, lon))
+    assert image.shape == (256, 256, 3)
+    for (qy, qx), (x, y) in {(0, 0): (X0, Y0), (0, 1): (X0 + 1, Y0), (1, 0): (X0, Y0 + 1),
+                             (1, 1): (X0 + 1, Y0 + 1)}.items():
+        pixel = image[64 + 128 * qy, 64 + 128 * qx]
+        assert np.abs(pixel - COLORS[(x, y)]).max() <= 3
+
+    # at the edge of the staged area the missing tiles are black; outside it there is no image at all
+    edge = _rgb(provider.fetch(*_point(X0 * 256, (Y0 + 1) * 256 + 128)))
+    assert edge[128, 10].max() <= 3 and np.abs(edge[128, 200] - COLORS[(X0, Y0 + 1)]).max() <= 3
+    assert provider.fetch(*_point((X0 - 5) * 256, Y0 * 256)) is None
+
+
+def test_pipeline_runs_offline_from_local_tiles(provider, monkeypatch, tmp_path):
+    path = provider.path if isinstance(provider, MBTilesProvider) else provider.root
+    monkeypatch.setenv("SAT_API_PROVIDER", "local")
+    monkeypatch.setenv("SAT_TILES_PATH", path)
+    monkeypatch.setenv("SAT_IMAGE_ZOOM", str(ZOOM))
+    monkeypatch.setattr(image_fetcher, "_download_with_retries", lambda *a, **kw: pytest.fail("went online"))
+
+    assert image_fetcher.image_geometry() == {"zoom": ZOOM, "tile_size": 256, "image_size": 640}
+    data = image_fetcher.fetch_image_bytes(*_point((X0 + 1.5) * 256, (Y0 + 1.5) * 256))
+    image = _rgb(data)
+    assert image.shape == (640, 640, 3)
+    assert np.abs(image[320, 320] - COLORS[(X0 + 1, Y0 + 1)]).max() <= 3
+    # a point the provider doesn't cover fails rather than being answered with sample imagery
+    with pytest.raises(FileNotFoundError, match="no image"):
+        image_fetcher.fetch_image_bytes(*_point((X0 - 5) * 256, Y0 * 256))
+
+
+def test_tile_server_serves_tiles_and_points(provider):
+    server = serve(provider, port=0)
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        tile = requests.get(f"{base}/{ZOOM}/{X0}/{Y0}.png", timeout=5)
+        assert tile.status_code == 200 and tile.content == TILES[(ZOOM, X0, Y0)]
+        assert tile.headers["Content-Type"] == "image/png"
+        assert requests.get(f"{base}/{ZOOM}/0/0.png", timeout=5).status_code == 404
+
+        lat, lon = _point((X0 + 1.5) * 256, (Y0 + 1.5) * 256)
+        point = requests.get(f"{base}/point/{lat}/{lon}.jpg", timeout=5)
+        assert point.status_code == 200 and is_image(point.content)
+        assert np.abs(_rgb(point.content)[128, 128] - COLORS[(X0 + 1, Y0 + 1)]).max() <= 3
+    finally:
+        server.shutdown()
+
+
+class EmptyModel:
+    def predict(self, source, conf=None):
+        from pipeline.tiling import Boxes, Result
+
+        images = source if isinstance(source, list) else [source]
+        return [Result(Boxes([], [], []), image.shape[:2]) for image in images]
+
+
+def test_failed_xyz_downloads_fail_their_samples(provider, monkeypatch, tmp_path):
+    from pipeline import main as pipeline_main
+    from pipeline.retry_policy import RetryPolicy
+
+    server = serve(provider, port=0)
+    monkeypatch.setenv("SAT_API_PROVIDER", "xyz")
+    monkeypatch.setenv("SAT_API_URL_TEMPLATE", f"http://127.0.0.1:{server.server_port}/{{z}}/{{x}}/{{y}}.png")
+    monkeypatch.setenv("SAT_IMAGE_ZOOM", str(ZOOM))
+    monkeypatch.setattr(image_fetcher, "DEFAULT_RETRY_POLICY", RetryPolicy(max_attempts=1))
+    monkeypatch.setattr(image_fetcher, "_local_sample_bytes", lambda: pytest.fail("used sample imagery"))
+    monkeypatch.setattr("pipeline.detector.load_model", lambda path=None: EmptyModel())
+    samples = [(i, *_point((X0 + 1.5) * 256, (Y0 + 1.5) * 256)) for i in range(2)]
+
+    def run(name):
+        output = tmp_path / f"{name}.jsonl"
+        summary = pipeline_main.main(None, samples=samples, output_format="jsonl", output_path=str(output),
+                                     checkpoint_path=str(tmp_path / f"{name}.log"))
+        return summary, output.read_text().splitlines()
+
+    try:
+        summary, lines = run("served")
+        assert summary["failed"] == 0 and len(lines) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    monkeypatch.setenv("SAT_API_URL_TEMPLATE", f"http://127.0.0.1:{port}/{{z}}/{{x}}/{{y}}.png")
+    try:
+        summary, lines = run("down")  # without --mosaic too, a failed tile download is not a finished sample
+        assert summary["failed"] == 2 and lines == []
+    finally:
+        image_fetcher._breakers.clear()
+
+
+def test_google_provider_builds_urls_and_rejects_error_pages(tmp_path, monkeypatch):
+    google = GoogleStaticMapsProvider("KEY", zoom=19, size="600x400")
+    assert google.params("Main St 1, Berlin") == {"center": "Main St 1, Berlin", "zoom": "19", "size": "600x400",
+                                                   "maptype": "satellite", "key": "KEY"}
+    url = google.url(52.5, 13.4)
+    assert url.startswith(google.BASE_URL + "?") and "center=52.5%2C13.4" in url and "key=KEY" in url
+
+    responses = [b"<html>quota exceeded</html>", b"\xff\xd8\xff\xe0jpeg"]
+    monkeypatch.setattr(image_fetcher, "_download_with_retries", lambda url, **kw: responses.pop(0))
+    cache = TileCache(str(tmp_path / "cache"))
+    assert google.fetch(52.5, 13.4, cache=cache) is None  # not cached either
+    assert google.fetch(52.5, 13.4, cache=cache) == b"\xff\xd8\xff\xe0jpeg"
+    assert google.fetch(52.5, 13.4, cache=cache) == b"\xff\xd8\xff\xe0jpeg"  # from the cache
+    assert cache.stats()["hits"] == 1
+
+
+def test_provider_is_chosen_by_environment(monkeypatch):
+    monkeypatch.setenv("SAT_API_PROVIDER", "mapbox")
+    monkeypatch.setenv("SAT_API_KEY", "token")
+    assert isinstance(tile_providers.get_provider(), tile_providers.MapboxProvider)
+    assert image_fetcher.image_geometry() == {"zoom": 16, "tile_size": 512, "image_size": 512}
+    monkeypatch.setenv("SAT_API_PROVIDER", "google")
+    assert tile_providers.get_provider().geometry() == {"zoom": 18, "tile_size": 256, "image_size": 640}
+    monkeypatch.delenv("SAT_API_KEY")
+    assert tile_providers.get_provider() is None
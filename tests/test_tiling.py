@@ -0,0 +1,65 @@
+import numpy as np
+
+from pipeline import detector
+from pipeline.tiling import Boxes, nms, tile_windows, weighted_box_fusion
+
+
+def test_tile_windows_cover_image_with_overlap():
+    windows = tile_windows(1000, 1500, tile_size=640, overlap=0.2)
+    assert windows[:, 2].max() == 1500 and windows[:, 3].max() == 1000
+    assert (windows[:, 2] - windows[:, 0] == 640).all() and (windows[:, 3] - windows[:, 1] == 640).all()
+    xs = np.unique(windows[:, 0])
+    assert (np.diff(xs) <= 512).all()
+    assert tile_windows(300, 200).tolist() == [[0, 0, 200, 300]]
+
+
+def test_nms_is_class_aware_and_wbf_averages():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10], [50, 50, 60, 60]], dtype=float)
+    scores = np.array([0.9, 0.6, 0.8, 0.7])
+    classes = np.array([0, 0, 1, 0])
+    assert nms(boxes, scores, classes, 0.5).tolist() == [0, 2, 3]
+
+    fused, conf, cls = weighted_box_fusion(boxes, scores, classes, 0.5)
+    assert len(fused) == 3
+    assert np.allclose(fused[0], (boxes[0] * 0.9 + boxes[1] * 0.6) / 1.5)
+    assert conf.tolist() == [0.9, 0.8, 0.7]
+    assert cls.tolist() == [0, 1, 0]
+
+
+class PanelModel:
+    """Reports every ground-truth panel fully visible in the tile, in tile coordinates."""
+
+    def __init__(self, panels):
+        self.panels = np.asarray(panels, dtype=float)
+        self.tiles = []
+
+    def predict(self, source):
+        sources = source if isinstance(source, list) else [source]
+        results = []
+        for tile in sources:
+            x0, y0 = tile[0, 0, :2]  # tiles encode their own offset in the first pixel
+            h, w = tile.shape[:2]
+            self.tiles.append((x0, y0))
+            local = self.panels - [x0, y0, x0, y0]
+            inside = (local[:, 0] >= 0) & (local[:, 1] >= 0) & (local[:, 2] <= w) & (local[:, 3] <= h)
+
+            class R:
+                boxes = Boxes(local[inside], np.full(inside.sum(), 0.9), np.zeros(inside.sum()))
+            results.append(R())
+        return results
+
+
+def test_tiled_inference_maps_boxes_to_global_coordinates_and_dedups():
+    image = np.zeros((1000, 1500, 3), dtype=np.uint16)
+    windows = tile_windows(1000, 1500, tile_size=640, overlap=0.2)
+    for x0, y0, x1, y1 in windows:
+        image[y0, x0, :2] = (x0, y0)
+    panels = [[600, 500, 620, 510], [10, 10, 30, 20], [1400, 900, 1450, 950]]
+    model = PanelModel(panels)
+
+    result = detector.run_tiled_inference(model, image, tile_size=640, overlap=0.2, batch_size=4)[0]
+
+    assert len(model.tiles) == len(windows)
+    got = sorted(map(tuple, result.boxes.xyxy.tolist()))
+    assert got == sorted(map(tuple, panels))
+    assert result.orig_shape == (1000, 1500)